@@ -0,0 +1,152 @@
+"""
+Semantic response cache for AI advice
+
+Người chơi cùng cảnh giới, tài nguyên xấp xỉ nhau nhận lời khuyên gần như giống hệt.
+Thay vì khóa theo prompt, cache khóa theo vector đặc trưng đã chuẩn hóa và làm tròn
+(cảnh giới, linh thạch làm tròn, dan dược, quy mô bang hội...), nên các yêu cầu "gần giống"
+dùng chung một câu trả lời.
+
+Hai tầng:
+- bộ nhớ: OrderedDict LRU + TTL trong từng worker (tra cứu vài micro giây)
+- đĩa: bảng SQLite dùng chung giữa các worker và giữ lại qua các lần khởi động lại
+"""
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def bucket(value, significant=1):
+    """Round a non-negative amount to `significant` significant digits (1234 -> 1000, 5600 -> 6000)"""
+    try:
+        value = float(value or 0)
+    except (TypeError, ValueError):
+        return 0
+    if value <= 0:
+        return 0
+    if value < 10:
+        return int(round(value))
+    magnitude = 10 ** (int(math.floor(math.log10(value))) - significant + 1)
+    return int(round(value / magnitude) * magnitude)
+
+
+def normalize_text(text):
+    """Case- and whitespace-insensitive form of free text"""
+    return ' '.join(str(text or '').lower().split())
+
+
+def make_key(kind, features):
+    """Stable digest of a canonicalized feature vector"""
+    canonical = json.dumps([kind, features], sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class AdviceCache:
+    """Two-tier (memory LRU + SQLite) TTL cache with hit-rate metrics"""
+
+    PURGE_EVERY = 200  # số lần ghi giữa hai lần dọn mục hết hạn trên đĩa
+
+    def __init__(self, max_entries=1024, ttl=3600, path=None, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._writes = 0
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=1.0, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS advice_cache '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    def get(self, key, record=True):
+        """Cached value or None; disk hits are promoted into memory.
+
+        record=False skips the hit/miss counters (used for re-checks after waiting on another caller).
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    if record:
+                        self.stats['hits'] += 1
+                    return entry[1]
+                del self._memory[key]
+
+            value = self._disk_get(key, now)
+            if value is None:
+                if record:
+                    self.stats['misses'] += 1
+                return None
+            if record:
+                self.stats['disk_hits'] += 1
+            self._remember(key, value[0], value[1])
+            return value[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = self._clock() + (ttl or self.ttl)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._disk_set(key, value, expires_at)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM advice_cache')
+
+    def get_stats(self):
+        """Counters plus overall hit rate"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._memory)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0.0
+        return stats
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _disk_get(self, key, now):
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                'SELECT expires_at, value FROM advice_cache WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return (row[0], json.loads(row[1])) if row else None
+
+    def _disk_set(self, key, value, expires_at):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                'INSERT OR REPLACE INTO advice_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._db.execute('DELETE FROM advice_cache WHERE expires_at <= ?', (self._clock(),))
+        except sqlite3.Error:
+            # Tầng đĩa chỉ là tối ưu; lỗi ghi (vd. đĩa bị khóa) không được làm hỏng request
+            pass
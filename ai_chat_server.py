@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Async AI chat server
+
+Máy chủ asyncio (aiohttp) riêng cho /api/ai/chat, chạy song song với app Flask. Mỗi phiên
+chat chỉ là một coroutine, nên một process giữ được hàng nghìn phiên đồng thời trong khi
+chờ Perplexity, thay vì mỗi phiên chiếm một worker/thread gunicorn.
+
+- sinh phản hồi: TuTienAIGirl.process_async_request
+- gọi Perplexity: PerplexityManager.get_general_advice_async (aiohttp, cùng cache và circuit breaker)
+- ghi ký ức: ConversationStore trong thread pool (asyncio.to_thread)
+- đăng nhập: đọc cookie phiên Flask (cùng SECRET_KEY), không cần truy vấn CSDL
+- giới hạn tần suất: 20 lần/60 giây mỗi người chơi như route Flask (cửa sổ trong process này)
+
+Chạy:
+    python ai_chat_server.py                     # cổng AI_CHAT_PORT (mặc định 5001)
+    gunicorn "ai_chat_server:create_app()" --worker-class aiohttp.GunicornWebWorker
+
+Chưa có gì định tuyến tới máy chủ này: /api/ai/chat trên web vẫn do route Flask phục vụ. Muốn dùng
+phải chạy nó như một process riêng và cấu hình reverse proxy chuyển /api/ai/chat sang cổng AI_CHAT_PORT;
+các route còn lại vẫn do Flask phục vụ.
+"""
+import os
+from aiohttp import web
+from flask import Flask
+from config import config
+from ai_tutien_girl import ai_girl, get_ai_status
+from perplexity_helper import perplexity_manager
+from rate_limit import RateLimiter
+
+# Cùng giới hạn với @rate_limiter.limit(20, per=60) của route Flask /api/ai/chat
+CHAT_RATE_LIMIT = 20
+CHAT_RATE_PERIOD = 60
+chat_limiter = RateLimiter()
+
+
+def make_session_reader():
+    """Decode the Flask session cookie the same way the Flask app signs it"""
+    flask_app = Flask(__name__)
+    flask_app.config.from_object(config[os.environ.get('FLASK_ENV', 'default')])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+    max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+    chat_limiter.enabled = flask_app.config.get('RATE_LIMIT_ENABLED', True)
+
+    def read_session(request):
+        cookie = request.cookies.get(cookie_name)
+        if not cookie or serializer is None:
+            return {}
+        try:
+            return serializer.loads(cookie, max_age=max_age) or {}
+        except Exception:
+            return {}
+
+    return read_session
+
+
+def session_user_id(session):
+    user_id = session.get('_user_id')
+    return int(user_id) if user_id and str(user_id).isdigit() else None
+
+
+def too_many_requests(retry_after):
+    """429 with the same body and Retry-After header as RateLimiter.too_many_requests"""
+    seconds = max(1, int(retry_after + 0.999))
+    return web.json_response({
+        'success': False,
+        'error': f'Thao tác quá nhanh, hãy thử lại sau {seconds} giây!',
+        'retry_after': seconds
+    }, status=429, headers={'Retry-After': str(seconds)})
+
+
+async def chat(request):
+    """POST /api/ai/chat: same request, rate limit and {'success', 'data'} response as the Flask route
+
+    Differences: `data.advice` carries Perplexity advice for cultivation/help/urgent questions when an
+    API key is configured (the Flask route never adds it), and there is no SSE variant (JSON only).
+    """
+    session = request.app['read_session'](request)
+    if chat_limiter.enabled:
+        identity = RateLimiter.identity_for(session, request.remote)
+        retry_after = chat_limiter.hit('api_ai_chat', identity, CHAT_RATE_LIMIT, CHAT_RATE_PERIOD)
+        if retry_after:
+            return too_many_requests(retry_after)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or not data.get('message'):
+        return web.json_response({'success': False, 'error': 'Message is required'}, status=400)
+
+    message = data['message']
+    context = data.get('context') or {}
+    user_id = session_user_id(session)
+
+    advisor = None
+    if perplexity_manager.api_key:
+        async def advisor(question):
+            return await perplexity_manager.get_general_advice_async(question, context)
+
+    response = await ai_girl.process_async_request(message, context, user_id, advisor=advisor)
+    return web.json_response({'success': True, 'data': response})
+
+
+async def status(request):
+    """GET /api/ai/status"""
+    data = get_ai_status(session_user_id(request.app['read_session'](request)))
+    if perplexity_manager.async_client is not None:
+        data['perplexity'] = perplexity_manager.async_client.get_status()
+        data['perplexity']['single_flight'] = perplexity_manager.async_flight.get_stats()
+    return web.json_response({'success': True, 'data': data})
+
+
+async def health(request):
+    return web.json_response({'status': 'ok'})
+
+
+async def close_clients(app):
+    await perplexity_manager.close_async()
+
+
+def create_app():
+    """aiohttp application factory (also the gunicorn entry point)"""
+    app = web.Application(client_max_size=64 * 1024)
+    app['read_session'] = make_session_reader()
+    app.router.add_post('/api/ai/chat', chat)
+    app.router.add_get('/api/ai/status', status)
+    app.router.add_get('/healthz', health)
+    app.on_cleanup.append(close_clients)
+    return app
+
+
+if __name__ == '__main__':
+    web.run_app(create_app(), host='0.0.0.0', port=int(os.environ.get('AI_CHAT_PORT', 5001)))
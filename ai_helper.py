@@ -1,9 +1,46 @@
 import random
 import os
+import hashlib
 from datetime import datetime, timedelta
 
+# Hạt giống của thế giới: mọi worker cùng hạt giống cho ra cùng thời tiết/vận mệnh mỗi ngày
+WORLD_SEED = os.environ.get('WORLD_SEED', 'tu-tien-cong-dong')
+
+# Thời tiết thuận lợi cho tu luyện (chỉ số trong weather_conditions)
+FAVORABLE_WEATHER = (0, 2, 4)
+
+# Vận mệnh tốt / xấu (chỉ số trong CultivationAI.FORTUNES); nghiệp lực nghiêng tỉ lệ giữa hai nhóm
+FAVORABLE_FORTUNES = (0, 2, 4, 5, 6)
+UNFAVORABLE_FORTUNES = (1, 3, 7)
+KARMA_TIER_POINTS = 100  # nghiệp lực gom theo bậc để vận mệnh không đổi sau mỗi điểm nhỏ
+
+def daily_fraction(kind, subject, day):
+    """Deterministic float in [0, 1) for (kind, subject, day); same on every worker"""
+    digest = hashlib.sha256(f'{WORLD_SEED}:{kind}:{subject}:{day}'.encode()).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+def daily_pick(kind, subject, day, size):
+    """Deterministic index in range(size) for (kind, subject, day); same on every worker"""
+    return int(daily_fraction(kind, subject, day) * size)
+
 class CultivationAI:
-    def __init__(self):
+    FORTUNES = (
+        "Hôm nay là ngày tốt lành cho việc đột phá cảnh giới!",
+        "Nên tránh tu luyện công pháp mạnh trong 3 ngày tới.",
+        "Có cơ hội gặp được cao nhân chỉ điểm đạo pháp.",
+        "Thiên kiếp sắp tới, cần chuẩn bị tâm lý và tài nguyên.",
+        "Vận mệnh thuận lợi cho việc luyện đan dược.",
+        "Thích hợp khám phá bí cảnh tìm kiếm cơ duyên.",
+        "Nên tập trung vào tu luyện thần thức.",
+        "Có thể gặp phải tiểu nhân, cần cảnh giác.",
+    )
+
+    MEMO_TIMEOUT = 2 * 86400  # giây; một ngày game cộng dư cho lệch giờ giữa các worker
+
+    def __init__(self, cache=None):
+        # Memo dùng chung (Flask-Caching): mọi worker đọc cùng một giá trị cho mỗi ngày
+        self.cache = cache
+
         # Hệ thống cảnh giới chi tiết với 9 tầng + viên mãn cho mỗi cấp
         self.cultivation_stages = self._build_detailed_stages()
 
@@ -86,28 +123,59 @@ class CultivationAI:
 
         return stages
 
-    def predict_cultivation_fortune(self, user):
-        """Dự đoán vận mệnh tu luyện của người dùng"""
-        fortunes = [
-            "Hôm nay là ngày tốt lành cho việc đột phá cảnh giới!",
-            "Nên tránh tu luyện công pháp mạnh trong 3 ngày tới.",
-            "Có cơ hội gặp được cao nhân chỉ điểm đạo pháp.",
-            "Thiên kiếp sắp tới, cần chuẩn bị tâm lý và tài nguyên.",
-            "Vận mệnh thuận lợi cho việc luyện đan dược.",
-            "Thích hợp khám phá bí cảnh tìm kiếm cơ duyên.",
-            "Nên tập trung vào tu luyện thần thức.",
-            "Có thể gặp phải tiểu nhân, cần cảnh giác.",
-        ]
+    def init_app(self, app, cache):
+        self.cache = cache
+        self.MEMO_TIMEOUT = app.config.get('DAILY_MEMO_TIMEOUT', self.MEMO_TIMEOUT)
+
+    @staticmethod
+    def today():
+        """The current game date (UTC, like every other timestamp in the game)"""
+        return datetime.utcnow().date()
+
+    @classmethod
+    def game_day(cls, day=None):
+        """The game day (UTC date) as an ISO string"""
+        return (day or cls.today()).isoformat()
+
+    def fortune_inputs(self, user):
+        """The user stats a fortune depends on: level, realm and karma tier"""
+        level = user.cultivation_level or 'Luyện Khí Tầng 1'
+        realm = self.cultivation_stages.get(level, {}).get('major_stage', level.split(' Tầng')[0])
+        karma_tier = max(-5, min(5, (user.karma_points or 0) // KARMA_TIER_POINTS))
+        return level, realm, karma_tier
 
-        # Tính toán dựa trên nhiều yếu tố (handle None values)
-        user_factors = (
-            (user.spiritual_power or 0) % 7 +
-            (user.karma_points or 0) % 5 +
-            (user.reputation or 0) % 3 +
-            datetime.now().day % 8
-        ) % len(fortunes)
+    def predict_cultivation_fortune(self, user, day=None):
+        """Dự đoán vận mệnh tu luyện: hàm thuần của (người chơi, cảnh giới, nghiệp lực, ngày)"""
+        day = self.game_day(day)
+        level, realm, karma_tier = self.fortune_inputs(user)
+        subject = f'{user.id}:{level}:{karma_tier}'
+        return self._memo(f'daily_fortune:{day}:{subject}', lambda: self._fortune(subject, realm, karma_tier, day))
 
-        return fortunes[user_factors]
+    def _fortune(self, subject, realm, karma_tier, day):
+        # Nghiệp lực cao nghiêng về vận tốt; cảnh giới càng cao thiên kiếp càng hay ghé
+        favorable_chance = min(0.85, max(0.2, 0.5 + 0.07 * karma_tier))
+        unfavorable = UNFAVORABLE_FORTUNES
+        if realm in self.major_stages and list(self.major_stages).index(realm) >= 3:
+            unfavorable = unfavorable + (3,)
+        group = FAVORABLE_FORTUNES if daily_fraction('fortune', subject, day) < favorable_chance else unfavorable
+        return self.FORTUNES[group[daily_pick('fortune_pick', subject, day, len(group))]]
+
+    def _memo(self, key, compute):
+        """Read-through memo in the shared cache (computed locally when the cache is unavailable)"""
+        if self.cache is not None:
+            try:
+                value = self.cache.get(key)
+                if value is not None:
+                    return value
+            except Exception:
+                pass
+        value = compute()
+        if self.cache is not None:
+            try:
+                self.cache.set(key, value, timeout=self.MEMO_TIMEOUT)
+            except Exception:
+                pass
+        return value
 
     def get_cultivation_advice(self, user):
         """Đưa ra lời khuyên tu luyện thông minh"""
@@ -171,12 +239,22 @@ class CultivationAI:
             "casualty_estimate": "Trung bình" if abs(guild1_power - guild2_power) < guild1_power * 0.2 else "Cao"
         }
 
-    def get_weather_forecast(self):
-        """Dự báo thời tiết linh khí"""
+    def weather_index(self, day):
+        return daily_pick('weather', 'world', day.isoformat(), len(self.weather_conditions))
+
+    def get_weather_forecast(self, day=None):
+        """Dự báo thời tiết linh khí: một giá trị mỗi ngày cho cả server, tính trước được cho ngày bất kỳ"""
+        day = day or self.today()
+        return self._memo(f'daily_weather:{day.isoformat()}', lambda: self._weather_forecast(day))
+
+    def _weather_forecast(self, day):
+        week = [self.weather_index(day + timedelta(days=i)) for i in range(1, 8)]
+        favorable = sum(1 for index in week if index in FAVORABLE_WEATHER)
         return {
-            "current": random.choice(self.weather_conditions),
-            "tomorrow": random.choice(self.weather_conditions),
-            "weekly_trend": "Linh khí sẽ dồi dào trong tuần tới"
+            "current": self.weather_conditions[self.weather_index(day)],
+            "tomorrow": self.weather_conditions[week[0]],
+            "weekly_trend": "Linh khí sẽ dồi dào trong tuần tới" if favorable >= 4
+                            else "Linh khí bất ổn trong tuần tới, nên tu luyện thận trọng"
         }
 
     def generate_expedition_route(self, difficulty, destination):
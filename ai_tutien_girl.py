@@ -1,15 +1,44 @@
 #!/usr/bin/env python3
 # AI Tu Tiên Girl - Python Core AI System
+import os
 import json
 import random
 import asyncio
 import aiohttp
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional
 import logging
+import threading
+import time
+from collections import OrderedDict
+from keyword_matcher import KeywordMatcher
+from conversation_store import ConversationStore
+
+class PersonaState:
+    """Mutable per-user persona state; everything else on TuTienAIGirl is shared read-only"""
+    __slots__ = ('mood', 'last_seen')
+
+    def __init__(self, mood="happy"):
+        self.mood = mood
+        self.last_seen = time.time()
+
 
 class TuTienAIGirl:
-    def __init__(self, name="Linh Nhi", cultivation_level="Nguyên Anh Tầng 3"):
+    # Từ khóa phân tích tin nhắn: ý định, cảm xúc và mức khẩn cấp
+    MESSAGE_KEYWORDS = {
+        "cultivation": ["tu luyện", "cảnh giới", "linh lực", "đan dược", "pháp bảo"],
+        "help": ["giúp", "hỗ trợ", "làm sao", "cách nào", "hướng dẫn"],
+        "emotion": ["buồn", "vui", "lo lắng", "sợ hãi", "tức giận", "hạnh phúc"],
+        "greeting": ["chào", "xin chào", "hello", "hi", "chào bạn"],
+        "positive": ["vui", "hạnh phúc", "tuyệt", "tốt", "hay", "thích", "yêu"],
+        "negative": ["buồn", "tức giận", "lo lắng", "sợ", "xấu", "ghét", "khó"],
+        "urgent": ["khẩn cấp", "gấp", "ngay", "nhanh", "cứu", "giúp"]
+    }
+    # Biên dịch một lần cho mọi instance
+    keyword_matcher = KeywordMatcher(MESSAGE_KEYWORDS)
+
+    def __init__(self, name="Linh Nhi", cultivation_level="Nguyên Anh Tầng 3", memory_store: ConversationStore = None,
+                 max_states: int = 1000):
         self.name = name
         self.cultivation_level = cultivation_level
         self.personality = {
@@ -19,8 +48,12 @@ class TuTienAIGirl:
             "mysteriousness": 80,
             "helpfulness": 92
         }
-        self.memories = []
-        self.current_mood = "happy"
+        # Ký ức hội thoại theo từng người chơi
+        self.memory = memory_store or ConversationStore(max_turns=100)
+        # Tâm trạng riêng của từng người chơi (LRU), thay cho một current_mood dùng chung
+        self.max_states = max_states
+        self._states = OrderedDict()
+        self._states_lock = threading.Lock()
         self.special_abilities = [
             "Đọc tâm ý người khác",
             "Dự đoán tương lai",
@@ -43,6 +76,16 @@ class TuTienAIGirl:
             "Tản Tiên": {"power": 100000000, "wisdom": 100, "mystery": 100}
         }
         
+        # Mẫu câu trả lời dựng một lần, dùng chung chỉ đọc giữa các request
+        self.response_templates = {
+            "greeting": tuple(self.get_greeting_responses()),
+            "cultivation_advice": tuple(self.get_cultivation_responses()),
+            "helpful_guidance": tuple(self.get_guidance_responses()),
+            "emotional_support": tuple(self.get_emotional_responses()),
+            "urgent_help": tuple(self.get_urgent_responses()),
+            "general_chat": tuple(self.get_general_responses())
+        }
+
         self.setup_logging()
     
     def setup_logging(self):
@@ -68,9 +111,27 @@ class TuTienAIGirl:
             }
         return {"wisdom_level": 50, "mystery_level": 50, "power_level": 100}
     
-    def generate_response(self, user_message: str, user_context: Dict = None) -> Dict:
+    def get_state(self, user_id=None) -> PersonaState:
+        """Persona state for a user, created lazily; guests get a throwaway state"""
+        if user_id is None:
+            return PersonaState()
+        # Khóa chỉ bao quanh thao tác trên LRU, không bao quanh việc tạo phản hồi
+        with self._states_lock:
+            state = self._states.get(user_id)
+            if state is None:
+                state = self._states[user_id] = PersonaState()
+                while len(self._states) > self.max_states:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(user_id)
+        state.last_seen = time.time()
+        return state
+
+    def generate_response(self, user_message: str, user_context: Dict = None, user_id=None) -> Dict:
         """Tạo phản hồi dựa trên tin nhắn của người dùng"""
         try:
+            state = self.get_state(user_id)
+
             # Phân tích tin nhắn
             message_analysis = self.analyze_message(user_message)
             
@@ -78,11 +139,11 @@ class TuTienAIGirl:
             response_type = self.determine_response_type(message_analysis)
             
             # Tạo phản hồi
-            response = self.create_response(user_message, message_analysis, response_type, user_context)
+            response = self.create_response(user_message, message_analysis, response_type, user_context, state)
             
             # Cập nhật trạng thái
-            self.update_mood(message_analysis)
-            self.add_memory(user_message, response)
+            self.update_mood(message_analysis, state)
+            self.add_memory(user_message, response, user_id, state)
             
             return response
             
@@ -91,54 +152,46 @@ class TuTienAIGirl:
             return self.get_error_response()
     
     def analyze_message(self, message: str) -> Dict:
-        """Phân tích tin nhắn để hiểu ý định"""
-        message_lower = message.lower()
-        
-        # Keywords cho các loại câu hỏi
-        cultivation_keywords = ["tu luyện", "cảnh giới", "linh lực", "đan dược", "pháp bảo"]
-        help_keywords = ["giúp", "hỗ trợ", "làm sao", "cách nào", "hướng dẫn"]
-        emotion_keywords = ["buồn", "vui", "lo lắng", "sợ hãi", "tức giận", "hạnh phúc"]
-        greeting_keywords = ["chào", "xin chào", "hello", "hi", "chào bạn"]
-        
+        """Phân tích tin nhắn để hiểu ý định (một lượt quét cho cả ý định, cảm xúc, khẩn cấp)"""
+        counts = self.keyword_matcher.scan(message)
+
         analysis = {
-            "is_cultivation_question": any(keyword in message_lower for keyword in cultivation_keywords),
-            "is_help_request": any(keyword in message_lower for keyword in help_keywords),
-            "is_emotional": any(keyword in message_lower for keyword in emotion_keywords),
-            "is_greeting": any(keyword in message_lower for keyword in greeting_keywords),
-            "sentiment": self.analyze_sentiment(message),
-            "urgency": self.analyze_urgency(message)
+            "is_cultivation_question": counts["cultivation"] > 0,
+            "is_help_request": counts["help"] > 0,
+            "is_emotional": counts["emotion"] > 0,
+            "is_greeting": counts["greeting"] > 0,
+            "sentiment": self.analyze_sentiment(message, counts),
+            "urgency": self.analyze_urgency(message, counts)
         }
-        
+
         return analysis
-    
-    def analyze_sentiment(self, message: str) -> str:
+
+    def analyze_sentiment(self, message: str, counts: Optional[Dict[str, int]] = None) -> str:
         """Phân tích cảm xúc của tin nhắn"""
-        positive_words = ["vui", "hạnh phúc", "tuyệt", "tốt", "hay", "thích", "yêu"]
-        negative_words = ["buồn", "tức giận", "lo lắng", "sợ", "xấu", "ghét", "khó"]
-        
-        message_lower = message.lower()
-        positive_count = sum(1 for word in positive_words if word in message_lower)
-        negative_count = sum(1 for word in negative_words if word in message_lower)
-        
+        if counts is None:
+            counts = self.keyword_matcher.scan(message)
+        positive_count = counts["positive"]
+        negative_count = counts["negative"]
+
         if positive_count > negative_count:
             return "positive"
         elif negative_count > positive_count:
             return "negative"
         else:
             return "neutral"
-    
-    def analyze_urgency(self, message: str) -> str:
+
+    def analyze_urgency(self, message: str, counts: Optional[Dict[str, int]] = None) -> str:
         """Phân tích mức độ khẩn cấp"""
-        urgent_words = ["khẩn cấp", "gấp", "ngay", "nhanh", "cứu", "giúp"]
-        message_lower = message.lower()
-        
-        if any(word in message_lower for word in urgent_words):
+        if counts is None:
+            counts = self.keyword_matcher.scan(message)
+
+        if counts["urgent"]:
             return "high"
         elif "?" in message or "!" in message:
             return "medium"
         else:
             return "low"
-    
+
     def determine_response_type(self, analysis: Dict) -> str:
         """Xác định loại phản hồi"""
         if analysis["is_greeting"]:
@@ -154,21 +207,14 @@ class TuTienAIGirl:
         else:
             return "general_chat"
     
-    def create_response(self, user_message: str, analysis: Dict, response_type: str, user_context: Dict = None) -> Dict:
+    def create_response(self, user_message: str, analysis: Dict, response_type: str, user_context: Dict = None,
+                        state: PersonaState = None) -> Dict:
         """Tạo phản hồi phù hợp"""
         traits = self.get_personality_traits()
-        
-        response_templates = {
-            "greeting": self.get_greeting_responses(),
-            "cultivation_advice": self.get_cultivation_responses(),
-            "helpful_guidance": self.get_guidance_responses(),
-            "emotional_support": self.get_emotional_responses(),
-            "urgent_help": self.get_urgent_responses(),
-            "general_chat": self.get_general_responses()
-        }
+        state = state or PersonaState()
         
         # Chọn template phù hợp
-        templates = response_templates.get(response_type, response_templates["general_chat"])
+        templates = self.response_templates.get(response_type, self.response_templates["general_chat"])
         response_text = random.choice(templates)
         
         # Cá nhân hóa phản hồi
@@ -178,7 +224,7 @@ class TuTienAIGirl:
         response = {
             "text": response_text,
             "type": response_type,
-            "mood": self.current_mood,
+            "mood": state.mood,
             "cultivation_level": self.cultivation_level,
             "special_ability": random.choice(self.special_abilities),
             "wisdom_level": traits["wisdom_level"],
@@ -281,30 +327,33 @@ class TuTienAIGirl:
         ]
         return random.choice(advice_list)
     
-    def update_mood(self, analysis: Dict):
+    def update_mood(self, analysis: Dict, state: PersonaState):
         """Cập nhật tâm trạng"""
         if analysis["sentiment"] == "positive":
-            self.current_mood = "happy"
+            state.mood = "happy"
         elif analysis["sentiment"] == "negative":
-            self.current_mood = "concerned"
+            state.mood = "concerned"
         elif analysis["urgency"] == "high":
-            self.current_mood = "alert"
+            state.mood = "alert"
         else:
-            self.current_mood = "calm"
+            state.mood = "calm"
     
-    def add_memory(self, user_message: str, response: Dict):
-        """Thêm ký ức"""
+    def add_memory(self, user_message: str, response: Dict, user_id=None, state: PersonaState = None):
+        """Thêm ký ức vào cuộc hội thoại của người chơi (khách vãng lai không được ghi nhớ)"""
+        if user_id is None:
+            return
         memory = {
             "timestamp": datetime.now().isoformat(),
             "user_message": user_message,
             "ai_response": response["text"],
-            "mood": self.current_mood
+            "mood": state.mood if state else response.get("mood")
         }
-        self.memories.append(memory)
-        
-        # Giới hạn số lượng ký ức
-        if len(self.memories) > 100:
-            self.memories = self.memories[-100:]
+        # Bộ đệm vòng tự bỏ lượt cũ nhất khi đầy
+        self.memory.append(user_id, memory)
+
+    def get_memories(self, user_id, n: int = None) -> List[Dict]:
+        """N lượt hội thoại gần nhất của người chơi"""
+        return self.memory.recent(user_id, n)
     
     def get_error_response(self) -> Dict:
         """Phản hồi lỗi"""
@@ -317,38 +366,67 @@ class TuTienAIGirl:
             "ai_name": self.name
         }
     
-    def get_status(self) -> Dict:
+    def get_status(self, user_id=None) -> Dict:
         """Lấy trạng thái hiện tại"""
+        with self._states_lock:
+            state = self._states.get(user_id)
+            active_states = len(self._states)
         return {
             "name": self.name,
             "cultivation_level": self.cultivation_level,
-            "current_mood": self.current_mood,
+            "current_mood": state.mood if state else "happy",
+            "active_personas": active_states,
             "personality": self.personality,
-            "memories_count": len(self.memories),
+            "memories_count": self.memory.count(user_id) if user_id is not None else 0,
             "special_abilities": self.special_abilities,
             "traits": self.get_personality_traits()
         }
     
-    async def process_async_request(self, user_message: str, user_context: Dict = None) -> Dict:
-        """Xử lý yêu cầu bất đồng bộ"""
+    # Loại câu hỏi được bổ sung lời khuyên từ advisor (Perplexity) ở đường bất đồng bộ
+    ADVISED_RESPONSE_TYPES = ("cultivation_advice", "helpful_guidance", "urgent_help")
+
+    async def process_async_request(self, user_message: str, user_context: Dict = None, user_id=None,
+                                    advisor: Optional[Callable[[str], Awaitable[str]]] = None) -> Dict:
+        """Xử lý yêu cầu bất đồng bộ: gọi advisor và ghi ký ức mà không chặn event loop"""
         try:
-            # Simulate async processing
-            await asyncio.sleep(0.1)
-            return self.generate_response(user_message, user_context)
+            state = self.get_state(user_id)
+            message_analysis = self.analyze_message(user_message)
+            response_type = self.determine_response_type(message_analysis)
+            response = self.create_response(user_message, message_analysis, response_type, user_context, state)
+
+            if advisor is not None and response_type in self.ADVISED_RESPONSE_TYPES:
+                response["advice"] = await advisor(user_message)
+
+            self.update_mood(message_analysis, state)
+            # Ghi SQLite trong thread pool để event loop tiếp tục phục vụ các phiên khác
+            await asyncio.to_thread(self.add_memory, user_message, response, user_id, state)
+            return response
         except Exception as e:
             self.logger.error(f"Error in async processing: {e}")
             return self.get_error_response()
 
-# Global instance
-ai_girl = TuTienAIGirl()
+# Conversation memory shared by all workers through an append-only SQLite log
+conversation_store = ConversationStore(
+    max_turns=int(os.environ.get("AI_MEMORY_TURNS", 20)),
+    max_users=int(os.environ.get("AI_MEMORY_USERS", 1000)),
+    path=os.environ.get("AI_MEMORY_PATH", os.path.join("instance", "ai_memory.db")) or None
+)
+
+# Global instance: shared templates and config, per-user mood and memory
+ai_girl = TuTienAIGirl(
+    memory_store=conversation_store,
+    max_states=int(os.environ.get("AI_PERSONA_USERS", 1000))
+)
 
-def get_ai_response(user_message: str, user_context: Dict = None) -> Dict:
+def get_ai_response(user_message: str, user_context: Dict = None, user_id=None) -> Dict:
     """Hàm chính để lấy phản hồi từ AI"""
-    return ai_girl.generate_response(user_message, user_context)
+    return ai_girl.generate_response(user_message, user_context, user_id)
 
-def get_ai_status() -> Dict:
+def get_ai_status(user_id=None) -> Dict:
     """Lấy trạng thái AI"""
-    return ai_girl.get_status()
+    status = ai_girl.get_status(user_id)
+    status["memory"] = conversation_store.get_stats()
+    return status
 
 if __name__ == "__main__":
     # Test AI
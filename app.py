@@ -1,6 +1,6 @@
 import os
 import logging
-from flask import Flask
+from flask import Flask, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
@@ -27,7 +27,7 @@ config_name = os.environ.get('FLASK_ENV', 'default')
 app.config.from_object(config[config_name])
 
 # Apply proxy fix for production
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
 # Configure caching
 cache = Cache(app)
@@ -38,12 +38,70 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'auth'  # type: ignore
 
+# Fast JSON provider (orjson khi có) và nén gzip/br cho response.
+# Đăng ký sớm: after_request chạy ngược thứ tự đăng ký, nên nén luôn là bước cuối cùng.
+import json_provider
+from compression import compressor
+json_provider.init_app(app)
+compressor.init_app(app)
+
 with app.app_context():
     import models
     import routes
     db.create_all()
 
+# Background expedition lifecycle scheduler
+from expedition_scheduler import expedition_scheduler
+expedition_scheduler.init_app(app)
+
+# Background job queue for slow AI calls and bulk computations
+from job_queue import job_queue
+job_queue.init_app(app)
+
+# Password hashing policy and login throttling
+from login_security import password_policy, login_throttle
+password_policy.init_app(app)
+login_throttle.init_app(app, cache)
+
+# Per-route, per-user rate limits for game actions
+from rate_limit import rate_limiter
+rate_limiter.init_app(app, cache)
+
+# Cached template fragments (dashboard sections)
+from fragment_cache import fragment_cache
+fragment_cache.init_app(app, cache)
+
+# Full-page cache varying by user class (anon / user / admin)
+from page_cache import page_cache
+page_cache.init_app(app, cache)
+
+# Hashed, precompressed static bundles
+from assets import assets
+assets.init_app(app)
+
+# Change counters and the unified /api/sync endpoint
+from sync import change_counters, sync_hub
+change_counters.init_app(app, cache)
+sync_hub.init_app(app)
+
+# Cached, lazily-loaded current_user (no User SELECT on most requests)
+from principal import principal_cache
+principal_cache.init_app(app, cache)
+
+# Daily weather and fortune memoized in the shared cache
+from ai_helper import cultivation_ai
+cultivation_ai.init_app(app, cache)
+
+def start_background_workers():
+    """Start this process's job workers and expedition scheduler (server entrypoints only, never on plain import)"""
+    job_queue.start()
+    expedition_scheduler.start()
+
+if app.config.get('BACKGROUND_WORKERS'):
+    start_background_workers()
+
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    view = app.view_functions.get(request.endpoint)
+    writes = request.method not in ('GET', 'HEAD', 'OPTIONS') and not getattr(view, 'principal_read_only', False)
+    return principal_cache.load(int(user_id), fresh=writes)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Static asset bundles
+
+base.html trước đây tải 7 file JS chưa nén và style.css (~1.800 dòng) riêng lẻ ở mọi trang.
+Giờ các file được gom thành bundle theo trang:
+
+- build: nối file nguồn theo thứ tự, rút gọn (minify), đặt tên theo hash nội dung
+  (core.3f2a9c1e.js) vào static/dist/, kèm bản nén sẵn .gz (và .br nếu có module brotli),
+  cùng manifest.json ánh xạ tên bundle -> tên file
+- template: `{{ asset_tags('core.js') }}` in một thẻ cho bundle; khi tắt bundle
+  (ASSETS_BUNDLE=false) thì in từng file nguồn như trước để dễ debug
+- phục vụ: /static/dist/* trả bản .br/.gz theo Accept-Encoding với
+  `Cache-Control: immutable` một năm; nội dung đổi thì tên file đổi, nên lần tải trang
+  sau không cần request asset nào
+
+Chạy khi deploy: `python assets.py build` (app cũng tự build khi manifest thiếu hoặc cũ).
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+from flask import request, send_from_directory, url_for
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+
+# Tên bundle -> file nguồn (tương đối với static/), đúng thứ tự tải
+BUNDLES = {
+    'core.css': ['css/style.css'],
+    'core.js': [
+        'js/performance.js',
+        'js/sync.js',
+        'js/ui-enhancements.js',
+        'js/enhanced-ui.js',
+        'js/guild-manager.js',
+        'js/world-manager.js',
+        'js/main.js',
+        'js/ai-assistant.js',
+    ],
+    'dashboard.js': ['js/dashboard.js'],
+    'guild.js': ['js/guild.js'],
+    'community.js': ['js/community.js'],
+    'expeditions.js': ['js/expeditions.js'],
+}
+
+MAX_AGE = 365 * 24 * 3600
+
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE_RE = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(source):
+    source = _CSS_COMMENT_RE.sub('', source)
+    source = re.sub(r'\s+', ' ', source)
+    return _CSS_SPACE_RE.sub(r'\1', source).replace(';}', '}').strip()
+
+
+def minify_js(source):
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+    # Không có rjsmin: chỉ bỏ thụt lề và dòng trống, không đụng vào cú pháp
+    return '\n'.join(line.strip() for line in source.splitlines() if line.strip())
+
+
+def build(static_dir=STATIC_DIR, bundles=BUNDLES):
+    """Write hashed, minified bundles (+ .gz/.br) into static/dist and return the manifest"""
+    dist_dir = os.path.join(static_dir, 'dist')
+    os.makedirs(dist_dir, exist_ok=True)
+    manifest = {}
+
+    for name, sources in bundles.items():
+        stem, ext = os.path.splitext(name)
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_dir, source), encoding='utf-8') as f:
+                parts.append(f.read())
+        if ext == '.css':
+            content = '\n'.join(minify_css(part) for part in parts)
+        else:
+            # ';' giữa các file để file trước thiếu dấu chấm phẩy không nối nhầm vào file sau
+            content = '\n;'.join(minify_js(part) for part in parts)
+        data = content.encode('utf-8')
+
+        filename = f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+        path = os.path.join(dist_dir, filename)
+        if not os.path.exists(path):
+            _write(path, data)
+            _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write(path + '.br', brotli.compress(data, quality=11))
+        manifest[name] = filename
+
+    _write(os.path.join(dist_dir, 'manifest.json'), json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+
+def _write(path, data):
+    # Ghi file tạm rồi rename: các worker cùng build không bao giờ đọc phải file dở
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class Assets:
+    """Jinja helper and immutable, precompressed serving for the built bundles"""
+
+    def __init__(self, static_dir=STATIC_DIR, bundles=BUNDLES):
+        self.static_dir = static_dir
+        self.dist_dir = os.path.join(static_dir, 'dist')
+        self.bundles = bundles
+        self.enabled = True
+        self.manifest = {}
+
+    def init_app(self, app):
+        self.enabled = app.config.get('ASSETS_BUNDLE', True)
+        if self.enabled:
+            if app.config.get('ASSETS_AUTO_BUILD', True) and self.is_stale():
+                build(self.static_dir, self.bundles)
+            self.manifest = self.load_manifest()
+        app.jinja_env.globals['asset_tags'] = self.tags
+        app.add_url_rule('/static/dist/<path:filename>', 'asset_bundle', self.serve)
+
+    def is_stale(self):
+        try:
+            built = os.path.getmtime(os.path.join(self.dist_dir, 'manifest.json'))
+        except OSError:
+            return True
+        return any(os.path.getmtime(os.path.join(self.static_dir, source)) > built
+                   for sources in self.bundles.values() for source in sources)
+
+    def load_manifest(self):
+        try:
+            with open(os.path.join(self.dist_dir, 'manifest.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def urls(self, name):
+        filename = self.manifest.get(name) if self.enabled else None
+        if filename:
+            return [url_for('asset_bundle', filename=filename)]
+        return [url_for('static', filename=source) for source in self.bundles[name]]
+
+    def tags(self, name):
+        """<script>/<link> tags for a bundle (one hashed file, or the sources when bundling is off)"""
+        if name.endswith('.css'):
+            template = '<link rel="stylesheet" href="{}">'
+        else:
+            template = '<script src="{}"></script>'
+        return Markup('\n    '.join(template.format(url) for url in self.urls(name)))
+
+    def serve(self, filename):
+        accepted = request.accept_encodings
+        response = None
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[encoding] and os.path.exists(os.path.join(self.dist_dir, filename + suffix)):
+                response = send_from_directory(self.dist_dir, filename + suffix, max_age=MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                response.mimetype = 'text/css' if filename.endswith('.css') else 'text/javascript'
+                break
+        if response is None:
+            response = send_from_directory(self.dist_dir, filename, max_age=MAX_AGE)
+        response.headers['Cache-Control'] = f'public, max-age={MAX_AGE}, immutable'
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+# Global assets instance
+assets = Assets()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] != ['build']:
+        print('Usage: python assets.py build')
+        sys.exit(1)
+    for bundle, built_name in build().items():
+        size = os.path.getsize(os.path.join(DIST_DIR, built_name))
+        print(f'{bundle:16} -> dist/{built_name} ({size:,} bytes)')
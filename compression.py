@@ -0,0 +1,90 @@
+"""
+Response compression
+
+Không có gì nén response: HTML các trang và JSON của /api/* (danh sách tin nhắn, chi tiết
+thế giới...) đi ra nguyên văn. Compressor nén trong after_request:
+
+- chỉ nén kiểu nội dung dạng text (HTML, JSON, JS, CSS...) từ COMPRESS_MIN_SIZE byte trở lên
+- chọn br (nếu có module brotli) hoặc gzip theo Accept-Encoding của client
+- bỏ qua response stream (SSE), file gửi thẳng (static) và response đã có Content-Encoding
+"""
+import gzip
+import threading
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'text/xml',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+}
+
+
+class Compressor:
+    """after_request gzip/brotli compression negotiated from Accept-Encoding"""
+
+    MIN_SIZE = 500
+    GZIP_LEVEL = 6
+    BROTLI_QUALITY = 4  # mức nhanh cho nén lúc chạy; asset tĩnh đã nén sẵn ở mức cao nhất
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {'compressed': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def init_app(self, app):
+        self.MIN_SIZE = app.config.get('COMPRESS_MIN_SIZE', self.MIN_SIZE)
+        self.GZIP_LEVEL = app.config.get('COMPRESS_GZIP_LEVEL', self.GZIP_LEVEL)
+        if app.config.get('COMPRESS_ENABLED', True):
+            app.after_request(self.compress_response)
+
+    def choose_encoding(self, accept_encodings):
+        if brotli is not None and accept_encodings['br']:
+            return 'br'
+        if accept_encodings['gzip']:
+            return 'gzip'
+        return None
+
+    def compress_response(self, response):
+        if (response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES
+                or not 200 <= response.status_code < 300):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding(request.accept_encodings)
+        data = response.get_data()
+        if encoding is None or len(data) < self.MIN_SIZE:
+            return response
+
+        compressed = self.compress(data, encoding)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if response.headers.get('ETag'):
+            # Biểu diễn khác thì ETag khác (ETag mạnh phải gắn với đúng các byte gửi đi)
+            etag, weak = response.get_etag()
+            response.set_etag(f'{etag}-{encoding}', weak)
+
+        with self._lock:
+            self.stats['compressed'] += 1
+            self.stats['bytes_in'] += len(data)
+            self.stats['bytes_out'] += len(compressed)
+        return response
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.BROTLI_QUALITY)
+        return gzip.compress(data, compresslevel=self.GZIP_LEVEL, mtime=0)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['ratio'] = round(stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else None
+        return stats
+
+
+# Global compressor instance
+compressor = Compressor()
@@ -8,8 +8,44 @@ class Config:
     # Cache configuration
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 300
+    PRINCIPAL_CACHE_TTL = float(os.environ.get('PRINCIPAL_CACHE_TTL', 5))  # giây, current_user cache
+    PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', 5000))
+    
+    # Background jobs. Thread nền (job worker, expedition scheduler) chỉ chạy khi BACKGROUND_WORKERS=true (Procfile/render.yaml
+    # bật cho web server, main.py tự bật); import app trong test/script không khởi động chúng
+    BACKGROUND_WORKERS = os.environ.get('BACKGROUND_WORKERS', 'false').lower() == 'true'
+    EXPEDITION_SCHEDULER_ENABLED = os.environ.get('EXPEDITION_SCHEDULER_ENABLED', 'true').lower() == 'true'
+    JOB_QUEUE_ENABLED = os.environ.get('JOB_QUEUE_ENABLED', 'true').lower() == 'true'
+    JOB_QUEUE_PATH = os.environ.get('JOB_QUEUE_PATH')  # mặc định instance/jobs.db
+    JOB_INTERACTIVE_WORKERS = int(os.environ.get('JOB_INTERACTIVE_WORKERS', 2))
+    JOB_BULK_WORKERS = int(os.environ.get('JOB_BULK_WORKERS', 1))
+    AI_ADVICE_ASYNC = os.environ.get('AI_ADVICE_ASYNC', 'true').lower() == 'true'  # route AI trả job_id để poll
+    
+    # Rate limits for game actions: 'memory' (per worker) or 'cache' (shared token bucket)
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    
+    # Client sync (/api/sync): khoảng poll gợi ý, giãn tối đa khi không có gì đổi, và giới hạn
+    # độ cũ khi cache không dùng chung giữa các worker (0 = tắt)
+    SYNC_INTERVAL = int(os.environ.get('SYNC_INTERVAL', 15))  # giây
+    SYNC_MAX_INTERVAL = int(os.environ.get('SYNC_MAX_INTERVAL', 60))
+    SYNC_RESYNC_AFTER = int(os.environ.get('SYNC_RESYNC_AFTER', 300))
+    
+    # Static bundles (static/dist, built by `python assets.py build` or on startup when stale)
+    ASSETS_BUNDLE = os.environ.get('ASSETS_BUNDLE', 'true').lower() == 'true'
+    ASSETS_AUTO_BUILD = os.environ.get('ASSETS_AUTO_BUILD', 'true').lower() == 'true'
+    
+    # JSON provider ('auto' = orjson khi có, 'orjson', 'default') và nén response
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))  # byte
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
     
     # Security settings
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')  # vd. 'pbkdf2:sha256:600000'
+    LOGIN_FAILURE_WINDOW = int(os.environ.get('LOGIN_FAILURE_WINDOW', 900))  # giây
+    LOGIN_MAX_FAILURES_PER_IP = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', 20))
+    LOGIN_MAX_FAILURES_PER_USER = int(os.environ.get('LOGIN_MAX_FAILURES_PER_USER', 5))
     SESSION_COOKIE_SECURE = os.environ.get('FLASK_ENV') == 'production'
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
@@ -0,0 +1,17 @@
+"""
+Pytest setup: run the test scripts against a throwaway SQLite database
+
+app.py tạo schema bằng db.create_all() lúc import, nên chỉ cần trỏ DATABASE_URL sang một file tạm
+TRƯỚC khi test nào import app: mọi bảng, cột và index mới nhất được tạo từ models, không phụ thuộc
+instance/tu_tien.db (file dev dùng chung, có thể chưa chạy migrate_*.py).
+"""
+import os
+import shutil
+import tempfile
+
+_test_dir = tempfile.mkdtemp(prefix='tu_tien_test_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_test_dir, 'tu_tien.db')
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_test_dir, ignore_errors=True)
@@ -0,0 +1,169 @@
+"""
+Per-user conversation memory for the AI girl
+
+Mỗi người chơi có một bộ đệm vòng (deque maxlen) chứa N lượt hội thoại gần nhất, nên
+thêm lượt mới là O(1) và không bao giờ phải cắt/copy danh sách. Bộ đệm của người chơi
+lâu không hoạt động bị loại theo LRU để bộ nhớ worker có giới hạn.
+
+Mỗi lượt cũng được ghi nối tiếp (append-only) vào một bảng SQLite dùng chung, nên
+ngữ cảnh đi theo người chơi sang worker khác và còn lại sau khi khởi động lại:
+- đọc: bộ đệm trong worker chỉ cần hỏi thêm các dòng mới hơn dòng cuối nó đã thấy
+- nén (compaction): định kỳ xóa các dòng cũ hơn N lượt cuối của mỗi người chơi và các
+  cuộc hội thoại bỏ dở quá RETENTION giây, nên file không phình mãi
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class _Conversation:
+    __slots__ = ('turns', 'last_id')
+
+    def __init__(self, max_turns):
+        self.turns = deque(maxlen=max_turns)
+        self.last_id = 0  # id dòng SQLite mới nhất đã nạp vào bộ đệm
+
+
+class ConversationStore:
+    """Bounded per-user ring buffers with an LRU of users and an append-only SQLite log"""
+
+    COMPACT_EVERY = 500  # số lượt ghi giữa hai lần nén
+    RETENTION = 30 * 24 * 3600
+
+    def __init__(self, max_turns=20, max_users=1000, path=None, clock=time.time):
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._users = OrderedDict()  # user_key -> _Conversation
+        self._appends = 0
+        self.stats = {'hits': 0, 'loads': 0, 'evictions': 0, 'compactions': 0}
+
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=1.0, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS conversation_turns ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, user_key TEXT NOT NULL, '
+                'created_at REAL NOT NULL, data TEXT NOT NULL)'
+            )
+            self._db.execute(
+                'CREATE INDEX IF NOT EXISTS idx_conversation_user ON conversation_turns(user_key, id)'
+            )
+
+    def append(self, user_key, turn):
+        """Record one turn (a JSON-serializable dict) for a user"""
+        user_key = str(user_key)
+        with self._lock:
+            if self._disk_append(user_key, turn):
+                # Nạp lại từ log để giữ đúng thứ tự với các lượt worker khác vừa ghi
+                self._sync(user_key)
+            else:
+                self._sync(user_key).turns.append(turn)
+
+            self._appends += 1
+            if self._db is not None and self._appends % self.COMPACT_EVERY == 0:
+                self._compact()
+
+    def recent(self, user_key, n=None):
+        """The last n turns (default: all kept), oldest first"""
+        with self._lock:
+            turns = list(self._sync(str(user_key)).turns)
+        if n is None:
+            return turns
+        return turns[-n:] if n > 0 else []
+
+    def count(self, user_key):
+        with self._lock:
+            return len(self._sync(str(user_key)).turns)
+
+    def clear(self, user_key):
+        user_key = str(user_key)
+        with self._lock:
+            self._users.pop(user_key, None)
+            if self._db is not None:
+                try:
+                    self._db.execute('DELETE FROM conversation_turns WHERE user_key = ?', (user_key,))
+                except sqlite3.Error:
+                    pass
+
+    def compact(self):
+        """Drop log rows older than each user's last max_turns and conversations idle past RETENTION"""
+        with self._lock:
+            self._compact()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['users'] = len(self._users)
+        return stats
+
+    def _sync(self, user_key):
+        """Buffer for user_key, topped up with turns other workers logged since we last looked"""
+        conversation = self._users.get(user_key)
+        if conversation is None:
+            conversation = _Conversation(self.max_turns)
+            self._users[user_key] = conversation
+            self.stats['loads'] += 1
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.stats['evictions'] += 1
+        else:
+            self._users.move_to_end(user_key)
+            self.stats['hits'] += 1
+
+        if self._db is not None:
+            try:
+                rows = self._db.execute(
+                    'SELECT id, data FROM conversation_turns WHERE user_key = ? AND id > ? '
+                    'ORDER BY id DESC LIMIT ?',
+                    (user_key, conversation.last_id, self.max_turns)
+                ).fetchall()
+            except sqlite3.Error:
+                rows = []
+            for row_id, data in reversed(rows):
+                conversation.turns.append(json.loads(data))
+                conversation.last_id = row_id
+        return conversation
+
+    def _disk_append(self, user_key, turn):
+        if self._db is None:
+            return None
+        try:
+            return self._db.execute(
+                'INSERT INTO conversation_turns (user_key, created_at, data) VALUES (?, ?, ?)',
+                (user_key, self._clock(), json.dumps(turn, ensure_ascii=False))
+            ).lastrowid
+        except sqlite3.Error:
+            # Log chỉ để chia sẻ/giữ ngữ cảnh; lỗi ghi không được làm hỏng cuộc trò chuyện
+            return None
+
+    def _compact(self):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                'DELETE FROM conversation_turns WHERE id IN ('
+                ' SELECT id FROM ('
+                '  SELECT id, ROW_NUMBER() OVER (PARTITION BY user_key ORDER BY id DESC) AS rn'
+                '  FROM conversation_turns'
+                ' ) WHERE rn > ?'
+                ')',
+                (self.max_turns,)
+            )
+            self._db.execute(
+                'DELETE FROM conversation_turns WHERE user_key IN ('
+                ' SELECT user_key FROM conversation_turns GROUP BY user_key HAVING MAX(created_at) < ?'
+                ')',
+                (self._clock() - self.RETENTION,)
+            )
+            self.stats['compactions'] += 1
+        except sqlite3.Error:
+            pass
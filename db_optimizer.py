@@ -86,6 +86,77 @@ class DatabaseOptimizer:
             cache.set(cache_key, result, timeout=180)
         return result
     
+    @staticmethod
+    def get_owned_world_summary(db, cache, user_id):
+        """Get a user's owned-world ids, count and aggregate production with caching"""
+        from models import World
+        
+        cache_key = f"owned_worlds_{user_id}"
+        result = cache.get(cache_key)
+        if result is None:
+            rows = db.session.query(
+                World.id,
+                World.spiritual_stones_production,
+                World.daily_income,
+                World.accrual_rate
+            ).filter(World.owner_id == user_id).all()
+            
+            result = {
+                'ids': [row.id for row in rows],
+                'count': len(rows),
+                'total_production': sum(row.spiritual_stones_production or 0 for row in rows),
+                'total_daily_income': sum(row.daily_income or 0 for row in rows),
+                'hourly_rate': round(sum(row.accrual_rate or 0 for row in rows), 2)
+            }
+            cache.set(cache_key, result, timeout=600)
+        return result
+    
+    @staticmethod
+    def invalidate_owned_world_summary(cache, *user_ids):
+        """Drop cached owned-world summaries after ownership or production changes"""
+        for user_id in user_ids:
+            if user_id:
+                cache.delete(f"owned_worlds_{user_id}")
+    
+    @staticmethod
+    def track_owned_world_summaries(cache):
+        """Invalidate the summaries of every owner, previous and new, of a World committed through the ORM"""
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        from models import World
+        from sync import changed_values
+
+        def after_flush(session, flush_context):
+            owners = set()
+            for obj in (*session.new, *session.dirty, *session.deleted):
+                if isinstance(obj, World):
+                    # Cả chủ cũ (bị chiếm/chuyển nhượng) lẫn chủ mới
+                    owners.update(changed_values(obj, 'owner_id'))
+            if owners:
+                session.info.setdefault('owned_world_owners', set()).update(owners)
+
+        def after_commit(session):
+            owners = session.info.pop('owned_world_owners', None)
+            if owners:
+                DatabaseOptimizer.invalidate_owned_world_summary(cache, *owners)
+
+        def after_rollback(session):
+            session.info.pop('owned_world_owners', None)
+
+        event.listen(Session, 'after_flush', after_flush)
+        event.listen(Session, 'after_commit', after_commit)
+        event.listen(Session, 'after_rollback', after_rollback)
+    
+    @staticmethod
+    def get_world_owner_id(db, world_id):
+        """Single indexed (id, owner_id) probe; returns (exists, owner_id)"""
+        from models import World
+        
+        row = db.session.query(World.owner_id).filter(World.id == world_id).first()
+        if row is None:
+            return False, None
+        return True, row.owner_id
+    
     @staticmethod
     def optimize_user_queries(db):
         """Add database indexes for better performance"""
@@ -99,6 +170,7 @@ class DatabaseOptimizer:
             
             # Add indexes for World table
             db.engine.execute(text('CREATE INDEX IF NOT EXISTS idx_world_owner_id ON world(owner_id)'))
+            db.engine.execute(text('CREATE INDEX IF NOT EXISTS idx_world_id_owner_id ON world(id, owner_id)'))
             db.engine.execute(text('CREATE INDEX IF NOT EXISTS idx_world_world_level ON world(world_level)'))
             db.engine.execute(text('CREATE INDEX IF NOT EXISTS idx_world_is_contested ON world(is_contested)'))
             
@@ -116,6 +188,23 @@ class DatabaseOptimizer:
             print(f"Error creating indexes: {e}")
             return False
     
+    @staticmethod
+    def create_reward_indexes(db):
+        """Index Expedition.potential_rewards keys (GIN on PostgreSQL, per-type partial indexes on SQLite)"""
+        from models import INDEXED_REWARD_TYPES
+
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text(
+                'CREATE INDEX IF NOT EXISTS idx_expedition_rewards_gin ON expedition USING GIN (potential_rewards)'
+            ))
+        else:
+            for reward_type in INDEXED_REWARD_TYPES:
+                db.session.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS idx_expedition_reward_{reward_type} ON expedition(status) "
+                    f"WHERE json_type(potential_rewards, '$.{reward_type}') IS NOT NULL"
+                ))
+        db.session.commit()
+
     @staticmethod
     def clear_cache(cache):
         """Clear all cached queries"""
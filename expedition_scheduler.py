@@ -0,0 +1,307 @@
+"""
+Expedition lifecycle scheduler
+
+Đạo lữ tự chuyển trạng thái theo thời gian:
+
+    Tuyển Thành Viên --(start_time)--> Đang Diễn Ra --(start_time + duration_hours)--> Hoàn Thành
+                     \\--(không ai tham gia)--> Đã Hủy
+
+Mỗi worker giữ một min-heap (thời điểm chuyển tiếp kế tiếp, expedition_id) và một
+thread nền xử lý theo lô các đạo lữ đến hạn bằng UPDATE hàng loạt có điều kiện
+trạng thái, nên nhiều worker cùng chạy vẫn chỉ chuyển và trao thưởng một lần.
+Heap được dựng lại từ DB khi khởi động. Lô bị lỗi được đưa lại heap với backoff lũy
+thừa. Thread chỉ chạy khi entrypoint của server gọi start() (BACKGROUND_WORKERS).
+"""
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import update, select, func
+
+logger = logging.getLogger(__name__)
+
+STATUS_RECRUITING = "Tuyển Thành Viên"
+STATUS_ACTIVE = "Đang Diễn Ra"
+STATUS_COMPLETED = "Hoàn Thành"
+STATUS_CANCELLED = "Đã Hủy"
+
+# Loại phần thưởng được cộng thẳng vào cột tài nguyên của User
+USER_REWARD_FIELDS = ('spiritual_stones', 'pills_count', 'artifacts_count', 'cultivation_points', 'reputation')
+
+
+def parse_rewards(raw, difficulty_level=1):
+    """Chuyển potential_rewards thành {cột User: số lượng} cho mỗi thành viên"""
+    from models import Expedition
+
+    difficulty = max(1, difficulty_level or 1)
+    rewards = {
+        'spiritual_stones': 500 * difficulty,
+        'cultivation_points': 50 * difficulty,
+    }
+
+    for reward_type, amount in (Expedition.normalize_rewards(raw) or {}).items():
+        if reward_type not in USER_REWARD_FIELDS:
+            continue
+        if amount:
+            rewards[reward_type] = amount
+        elif reward_type not in rewards:
+            # Chỉ nêu loại phần thưởng, không có số lượng -> mặc định theo độ khó
+            rewards[reward_type] = 2 * difficulty if reward_type in ('pills_count', 'artifacts_count') else 100 * difficulty
+
+    return rewards
+
+
+class ExpeditionScheduler:
+    """In-process timer heap that advances expedition status in batches"""
+
+    RECRUITMENT_HOURS = 1
+    BATCH_SIZE = 200
+    MAX_SLEEP_SECONDS = 300
+    RETRY_BASE_SECONDS = 5
+    RETRY_MAX_SECONDS = 300
+
+    def __init__(self):
+        self.app = None
+        self._heap = []  # (due_at, expedition_id)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._failures = {}  # expedition_id -> số lần advance() lỗi liên tiếp
+
+    def init_app(self, app):
+        self.app = app
+
+    def start(self):
+        """Khởi động thread nền (dựng lại heap từ DB rồi xử lý đạo lữ đến hạn)"""
+        if not self.app.config.get('EXPEDITION_SCHEDULER_ENABLED', True):
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='expedition-scheduler', daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def next_transition_at(cls, status, start_time, duration_hours, created_at):
+        """Thời điểm chuyển trạng thái kế tiếp của một đạo lữ"""
+        if status == STATUS_RECRUITING:
+            return start_time or (created_at or datetime.utcnow()) + timedelta(hours=cls.RECRUITMENT_HOURS)
+        if status == STATUS_ACTIVE:
+            begin = start_time or created_at or datetime.utcnow()
+            return begin + timedelta(hours=duration_hours or 24)
+        return None
+
+    def schedule(self, expedition):
+        """Đưa một đạo lữ vào heap (gọi sau khi tạo hoặc đổi trạng thái)"""
+        due_at = self.next_transition_at(expedition.status, expedition.start_time,
+                                         expedition.duration_hours, expedition.created_at)
+        if due_at is None:
+            return
+        with self._cond:
+            heapq.heappush(self._heap, (due_at, expedition.id))
+            self._cond.notify()
+
+    def rebuild(self):
+        """Nạp lại toàn bộ đạo lữ chưa kết thúc từ DB"""
+        from models import Expedition
+        from app import db
+
+        rows = db.session.query(
+            Expedition.id, Expedition.status, Expedition.start_time,
+            Expedition.duration_hours, Expedition.created_at
+        ).filter(Expedition.status.in_([STATUS_RECRUITING, STATUS_ACTIVE])).all()
+        db.session.remove()
+
+        heap = []
+        for row in rows:
+            due_at = self.next_transition_at(row.status, row.start_time, row.duration_hours, row.created_at)
+            heap.append((due_at, row.id))
+        with self._cond:
+            # Giữ lại các mục được schedule() trong lúc đang dựng lại; trùng lặp vô hại
+            self._heap = heap + self._heap
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        logger.info("Expedition scheduler rebuilt with %d pending expeditions", len(heap))
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _pop_due(self, now):
+        due_ids = []
+        while self._heap and self._heap[0][0] <= now and len(due_ids) < self.BATCH_SIZE:
+            due_ids.append(heapq.heappop(self._heap)[1])
+        return due_ids
+
+    def _run(self):
+        with self.app.app_context():
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"Expedition scheduler rebuild failed: {e}")
+
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = datetime.utcnow()
+                due_ids = self._pop_due(now)
+                if not due_ids:
+                    timeout = self.MAX_SLEEP_SECONDS
+                    if self._heap:
+                        timeout = min(timeout, max(0.0, (self._heap[0][0] - now).total_seconds()))
+                    self._cond.wait(timeout)
+                    continue
+
+            with self.app.app_context():
+                try:
+                    self.process(due_ids)
+                finally:
+                    from app import db
+                    db.session.remove()
+
+    def process(self, due_ids):
+        """advance() một lô; lỗi thì đưa các id lại heap với backoff thay vì bỏ mất"""
+        from app import db
+
+        try:
+            transitioned = self.advance(due_ids)
+        except Exception as e:
+            db.session.rollback()
+            delays = self._retry_later(due_ids)
+            logger.error(f"Expedition scheduler tick failed for {len(due_ids)} expeditions "
+                         f"(retry in {min(delays)}-{max(delays)}s): {e}")
+            return 0
+        with self._cond:
+            for expedition_id in due_ids:
+                self._failures.pop(expedition_id, None)
+        return transitioned
+
+    def _retry_later(self, expedition_ids):
+        now = datetime.utcnow()
+        delays = []
+        with self._cond:
+            for expedition_id in expedition_ids:
+                attempts = self._failures[expedition_id] = self._failures.get(expedition_id, 0) + 1
+                delay = min(self.RETRY_MAX_SECONDS, self.RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+                heapq.heappush(self._heap, (now + timedelta(seconds=delay), expedition_id))
+                delays.append(delay)
+            self._cond.notify()
+        return delays
+
+    def advance(self, expedition_ids, now=None):
+        """Chuyển trạng thái các đạo lữ đến hạn theo lô; trả về số đạo lữ đã chuyển"""
+        from models import Expedition, ExpeditionParticipant
+        from app import db
+
+        now = now or datetime.utcnow()
+        rows = db.session.query(
+            Expedition.id, Expedition.status, Expedition.start_time, Expedition.duration_hours,
+            Expedition.created_at, Expedition.difficulty_level, Expedition.potential_rewards,
+            Expedition.participant_count
+        ).filter(Expedition.id.in_(expedition_ids)).all()
+
+        to_start, to_cancel, to_complete = [], [], []
+        for row in rows:
+            due_at = self.next_transition_at(row.status, row.start_time, row.duration_hours, row.created_at)
+            if due_at is None:
+                continue
+            if due_at > now:
+                # Thời điểm đã đổi (vd. start_time được cập nhật) -> lên lịch lại
+                with self._cond:
+                    heapq.heappush(self._heap, (due_at, row.id))
+                continue
+            if row.status == STATUS_RECRUITING:
+                (to_start if row.participant_count else to_cancel).append(row)
+            else:
+                to_complete.append(row)
+
+        transitioned = 0
+        if to_start:
+            started = self._transition(db, [r.id for r in to_start], STATUS_RECRUITING, STATUS_ACTIVE)
+            db.session.execute(
+                update(Expedition)
+                .where(Expedition.id.in_(started), Expedition.start_time.is_(None))
+                .values(start_time=now)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(
+                update(ExpeditionParticipant)
+                .where(ExpeditionParticipant.expedition_id.in_(started))
+                .values(status=STATUS_ACTIVE)
+                .execution_options(synchronize_session=False)
+            )
+            transitioned += len(started)
+            for row in to_start:
+                if row.id in started:
+                    begin = row.start_time or now
+                    with self._cond:
+                        heapq.heappush(self._heap, (begin + timedelta(hours=row.duration_hours or 24), row.id))
+
+        if to_cancel:
+            transitioned += len(self._transition(db, [r.id for r in to_cancel], STATUS_RECRUITING, STATUS_CANCELLED))
+
+        if to_complete:
+            completed = self._transition(db, [r.id for r in to_complete], STATUS_ACTIVE, STATUS_COMPLETED)
+            for row in to_complete:
+                if row.id in completed:
+                    self._distribute_rewards(db, row)
+            transitioned += len(completed)
+
+        db.session.commit()
+        return transitioned
+
+    @staticmethod
+    def _transition(db, ids, from_status, to_status):
+        """Guarded bulk status UPDATE; returns the set of ids this worker actually moved"""
+        from models import Expedition
+
+        stmt = (
+            update(Expedition)
+            .where(Expedition.id.in_(ids), Expedition.status == from_status)
+            .values(status=to_status)
+        )
+        if db.engine.dialect.update_returning:
+            return {row.id for row in db.session.execute(stmt.returning(Expedition.id))}
+
+        moved = set()
+        for expedition_id in ids:
+            result = db.session.execute(
+                update(Expedition)
+                .where(Expedition.id == expedition_id, Expedition.status == from_status)
+                .values(status=to_status)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                moved.add(expedition_id)
+        return moved
+
+    @staticmethod
+    def _distribute_rewards(db, row):
+        """Trao thưởng cho toàn bộ thành viên của một đạo lữ bằng một UPDATE"""
+        from models import User, ExpeditionParticipant
+
+        rewards = parse_rewards(row.potential_rewards, row.difficulty_level)
+        participant_ids = select(ExpeditionParticipant.user_id).where(
+            ExpeditionParticipant.expedition_id == row.id
+        ).scalar_subquery()
+
+        db.session.execute(
+            update(User)
+            .where(User.id.in_(participant_ids))
+            .values({getattr(User, field): func.coalesce(getattr(User, field), 0) + amount
+                     for field, amount in rewards.items()})
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            update(ExpeditionParticipant)
+            .where(ExpeditionParticipant.expedition_id == row.id)
+            .values(
+                status=STATUS_COMPLETED,
+                contribution_points=func.coalesce(ExpeditionParticipant.contribution_points, 0) + 10 * (row.difficulty_level or 1)
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+# Global scheduler instance
+expedition_scheduler = ExpeditionScheduler()
@@ -0,0 +1,76 @@
+"""
+Fragment caching for templates
+
+Trang dashboard trước đây tính lại vận mệnh, lời khuyên, thời tiết, truy vấn chat và đạo
+lữ rồi render toàn bộ ở mỗi lần tải, dù nhiều phần giống hệt nhau cho mọi người chơi.
+Giờ mỗi phần là một fragment HTML được cache riêng:
+
+    {% call cached_fragment('dashboard_recent_chat', timeout=30) %} ... {% endcall %}
+    {% call cached_fragment('dashboard_advice', current_user.id, current_user.fingerprint()) %}
+
+- thân của khối call chỉ được render (và chỉ chạy các loader truyền vào template) khi miss
+- phần dùng chung không có tham số vary, cache một lần cho cả server
+- phần riêng theo người chơi vary theo user id + phiên bản dữ liệu, nên không cần xóa tay
+- phần dùng chung có thể xóa sớm bằng invalidate() khi dữ liệu nguồn thay đổi
+"""
+import threading
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """Rendered HTML fragments in the shared cache, keyed by name and vary values"""
+
+    DEFAULT_TIMEOUT = 300
+    PREFIX = 'fragment:'
+
+    def __init__(self):
+        self.cache = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def init_app(self, app, cache):
+        self.cache = cache
+        self.DEFAULT_TIMEOUT = app.config.get('FRAGMENT_CACHE_TIMEOUT', self.DEFAULT_TIMEOUT)
+        app.jinja_env.globals['cached_fragment'] = self.fragment
+
+    def key(self, name, *vary):
+        return self.PREFIX + ':'.join((name,) + tuple(str(value) for value in vary))
+
+    def fragment(self, name, *vary, timeout=None, caller=None):
+        """Jinja call-block helper: cached HTML for (name, *vary), rendering the block body on a miss"""
+        key = self.key(name, *vary)
+        html = self._get(key)
+        with self._lock:
+            self.stats['misses' if html is None else 'hits'] += 1
+
+        if html is None:
+            html = str(caller())
+            if self.cache is not None:
+                try:
+                    self.cache.set(key, html, timeout=timeout or self.DEFAULT_TIMEOUT)
+                except Exception:
+                    pass
+        return Markup(html)
+
+    def invalidate(self, name, *vary):
+        if self.cache is not None:
+            try:
+                self.cache.delete(self.key(name, *vary))
+            except Exception:
+                pass
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _get(self, key):
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.get(key)
+        except Exception:
+            return None
+
+
+# Global fragment cache instance
+fragment_cache = FragmentCache()
@@ -0,0 +1,369 @@
+"""
+Resilient HTTP client for upstream AI APIs
+
+Một Session dùng chung (keep-alive, connection pool) cho mỗi worker, kèm:
+
+- timeout connect/read cho mọi request (upstream treo không giữ worker mãi)
+- giới hạn số request đồng thời; hết chỗ thì trả lỗi ngay thay vì xếp hàng
+- retry có jitter, bị giới hạn bởi retry budget (retry không nhân tải khi upstream quá tải)
+- circuit breaker: lỗi liên tiếp -> mở mạch, fail fast trong thời gian cooldown,
+  sau đó cho một request thử (half-open) để kiểm tra upstream đã hồi phục chưa
+
+AsyncResilientHTTPClient là bản asyncio (aiohttp) với cùng các chính sách, dùng cho
+máy chủ chat bất đồng bộ (ai_chat_server.py).
+"""
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:  # chỉ cần cho máy chủ chat bất đồng bộ
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when a request is rejected locally (circuit open, pool saturated) or all attempts failed"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open -> closed)"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    PROBE = 'probe'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self):
+        """Whether a request may go upstream now; only one probe is let through while half-open.
+
+        Returns PROBE (truthy) for that probe: its caller must end it with record_success(),
+        record_failure() or cancel_probe(), otherwise the breaker stays half-open.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return self.PROBE
+
+    def cancel_probe(self):
+        """Release the half-open probe when it ended without a verdict (cancelled, unexpected error)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Circuit closed after successful probe")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("Circuit opened after %d consecutive failures", self._failures)
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+class RetryBudget:
+    """Allow retries only up to a fraction of recent first attempts (token bucket)"""
+
+    def __init__(self, ratio=0.2, min_tokens=3, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._lock = threading.Lock()
+        self._tokens = float(min_tokens)
+
+    def record_attempt(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class ResilientHTTPClient:
+    """Pooled keep-alive JSON client with timeouts, bounded concurrency, jittered retries and a circuit breaker"""
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, connect_timeout=3.05, read_timeout=20.0, max_concurrency=8,
+                 acquire_timeout=0.5, max_retries=2, backoff_base=0.25, backoff_cap=2.0,
+                 breaker=None, retry_budget=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.acquire_timeout = acquire_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_concurrency, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'rejected': 0, 'short_circuited': 0}
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _backoff(self, attempt):
+        """Full jitter: uniform(0, min(cap, base * 2^attempt))"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def _acquire(self):
+        """Take a concurrency slot and pass the breaker, or fail fast; returns allow_request()'s result"""
+        # Lấy slot trước: bị từ chối vì hết slot thì không tốn lượt probe của breaker
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self._count('rejected')
+            raise UpstreamUnavailable('too many concurrent upstream requests')
+
+        allowed = self.breaker.allow_request()
+        if not allowed:
+            self._slots.release()
+            self._count('short_circuited')
+            raise UpstreamUnavailable('circuit open')
+
+        self._count('requests')
+        self.retry_budget.record_attempt()
+        return allowed
+
+    def _release(self, allowed):
+        """Give the slot back; a probe that ended without a verdict is released too"""
+        if allowed == CircuitBreaker.PROBE:
+            self.breaker.cancel_probe()
+        self._slots.release()
+
+    def _send(self, url, payload, headers, stream=False):
+        """POST with jittered, budgeted retries; returns a 2xx response (caller holds a slot)"""
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.session.post(url, json=payload, headers=headers,
+                                             timeout=self.timeout, stream=stream)
+                if response.status_code in self.RETRY_STATUS:
+                    raise requests.HTTPError(f"{response.status_code} from upstream", response=response)
+                response.raise_for_status()
+                return response
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                if response is not None:
+                    response.close()
+                retryable = not isinstance(e, requests.HTTPError) or e.response.status_code in self.RETRY_STATUS
+                if retryable and attempt < self.max_retries and self.retry_budget.try_spend():
+                    self._count('retries')
+                    time.sleep(self._backoff(attempt))
+                    attempt += 1
+                    continue
+                self._count('failures')
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # 4xx: upstream vẫn sống, lỗi nằm ở request
+                    self.breaker.record_success()
+                raise UpstreamUnavailable(str(e)) from e
+            except requests.RequestException as e:
+                # ChunkedEncodingError, TooManyRedirects...: không retry nhưng vẫn là lỗi upstream
+                if response is not None:
+                    response.close()
+                self._count('failures')
+                self.breaker.record_failure()
+                raise UpstreamUnavailable(str(e)) from e
+
+    def post_json(self, url, payload, headers=None):
+        """POST JSON and return the decoded body; raises UpstreamUnavailable on failure"""
+        allowed = self._acquire()
+        try:
+            response = self._send(url, payload, headers)
+            try:
+                data = response.json()
+            except ValueError as e:
+                self._count('failures')
+                self.breaker.record_failure()
+                raise UpstreamUnavailable(f"invalid JSON from upstream: {e}") from e
+
+            self.breaker.record_success()
+            return data
+        finally:
+            self._release(allowed)
+
+    def stream_post(self, url, payload, headers=None):
+        """POST and yield parsed `data:` payloads of an SSE response as they arrive.
+
+        Retries only happen before the first byte. Closing the generator (e.g. the browser
+        disconnected) closes the upstream response, so generation is cancelled upstream too.
+        """
+        allowed = self._acquire()
+        response = None
+        try:
+            response = self._send(url, payload, headers, stream=True)
+            try:
+                # chunk_size=None: xử lý từng chunk ngay khi tới thay vì chờ đầy bộ đệm 512 byte
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    yield json.loads(data)
+            except GeneratorExit:
+                # Client bỏ đi giữa chừng: upstream vẫn khỏe, chỉ cần đóng kết nối
+                self.breaker.record_success()
+                raise
+            except (requests.RequestException, ValueError) as e:
+                self._count('failures')
+                self.breaker.record_failure()
+                raise UpstreamUnavailable(f"stream interrupted: {e}") from e
+            self.breaker.record_success()
+        finally:
+            if response is not None:
+                response.close()
+            self._release(allowed)
+
+    def get_status(self):
+        """Breaker state and counters for status endpoints"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['circuit'] = self.breaker.state
+        return stats
+
+
+class AsyncResilientHTTPClient:
+    """asyncio counterpart of ResilientHTTPClient (aiohttp), sharing its breaker and retry policies.
+
+    Waiting for a slot only parks a coroutine, so the default acquire_timeout is longer than the
+    sync client's. The aiohttp session is created lazily inside the running event loop; call close() on shutdown.
+    """
+
+    RETRY_STATUS = ResilientHTTPClient.RETRY_STATUS
+
+    def __init__(self, connect_timeout=3.05, read_timeout=20.0, max_concurrency=256,
+                 acquire_timeout=5.0, max_retries=2, backoff_base=0.25, backoff_cap=2.0,
+                 breaker=None, retry_budget=None):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for AsyncResilientHTTPClient")
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.acquire_timeout = acquire_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+        self._slots = None
+        self.session = None
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'rejected': 0, 'short_circuited': 0}
+
+    def _ensure_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self.session
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    async def post_json(self, url, payload, headers=None):
+        """POST JSON and return the decoded body; raises UpstreamUnavailable on failure"""
+        session = self._ensure_session()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.stats['rejected'] += 1
+            raise UpstreamUnavailable('too many concurrent upstream requests')
+        allowed = self.breaker.allow_request()
+        if not allowed:
+            self._slots.release()
+            self.stats['short_circuited'] += 1
+            raise UpstreamUnavailable('circuit open')
+
+        self.stats['requests'] += 1
+        self.retry_budget.record_attempt()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    async with session.post(url, json=payload, headers=headers) as response:
+                        if response.status in self.RETRY_STATUS or response.status >= 400:
+                            raise aiohttp.ClientResponseError(
+                                response.request_info, response.history,
+                                status=response.status, message=f"{response.status} from upstream"
+                            )
+                        data = await response.json(content_type=None)
+                    self.breaker.record_success()
+                    return data
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    status = getattr(e, 'status', None)
+                    retryable = not isinstance(e, ValueError) and (status is None or status in self.RETRY_STATUS)
+                    if retryable and attempt < self.max_retries and self.retry_budget.try_spend():
+                        self.stats['retries'] += 1
+                        await asyncio.sleep(self._backoff(attempt))
+                        attempt += 1
+                        continue
+                    self.stats['failures'] += 1
+                    if retryable or isinstance(e, ValueError):
+                        self.breaker.record_failure()
+                    else:
+                        # 4xx: upstream vẫn sống, lỗi nằm ở request
+                        self.breaker.record_success()
+                    raise UpstreamUnavailable(str(e) or type(e).__name__) from e
+        finally:
+            # Bị hủy (CancelledError) hay lỗi lạ: trả lại lượt probe để breaker không kẹt half-open
+            if allowed == CircuitBreaker.PROBE:
+                self.breaker.cancel_probe()
+            self._slots.release()
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    def get_status(self):
+        stats = dict(self.stats)
+        stats['circuit'] = self.breaker.state
+        return stats
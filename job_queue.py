@@ -0,0 +1,322 @@
+"""
+Background job queue
+
+Các việc chậm (gọi AI, tính toán hàng loạt) được đưa vào hàng đợi thay vì chạy
+trong request. Route trả về job_id ngay lập tức; client hỏi trạng thái qua
+/api/jobs/<job_id>.
+
+- Lưu trữ: bảng SQLite riêng (instance/jobs.db), dùng chung giữa các worker gunicorn
+  nên poll ở worker nào cũng thấy kết quả; không cần broker ngoài
+- Worker: thread nền, nhận job trong giao dịch BEGIN IMMEDIATE. Chỉ khởi động khi
+  entrypoint của server gọi start() (BACKGROUND_WORKERS), không phải khi import app,
+  nên test, script migrate_*.py và loadtest.py không chạy worker
+- Job có thể báo tiến độ (report_progress), client đọc phần đó qua trường 'partial'
+- Làn ưu tiên: PRIORITY_INTERACTIVE (lời khuyên AI) luôn được nhận trước PRIORITY_BULK;
+  một số worker chỉ phục vụ làn interactive để việc hàng loạt không chặn người chơi
+- Giới hạn mỗi người chơi: tối đa MAX_ACTIVE_PER_USER job đang chờ/chạy
+- Kết quả hết hạn sau RESULT_TTL giây và được dọn định kỳ
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+
+
+class JobLimitExceeded(Exception):
+    """Raised when a user already has too many active jobs"""
+
+
+class JobQueue:
+    """SQLite-backed job queue with an in-process worker pool"""
+
+    MAX_ACTIVE_PER_USER = 3
+    RESULT_TTL = 600
+    JOB_TIMEOUT = 300  # job 'running' quá lâu (worker chết) được đưa lại hàng đợi
+    MAX_ATTEMPTS = 2
+    POLL_INTERVAL = 1.0
+    PURGE_INTERVAL = 60
+
+    def __init__(self):
+        self.app = None
+        self.path = None
+        self._tasks = {}
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopped = False
+        self._last_purge = 0.0
+
+    def init_app(self, app):
+        """Open the job store; workers only run once start() is called"""
+        self.app = app
+        self.path = app.config.get('JOB_QUEUE_PATH') or os.path.join(app.instance_path, 'jobs.db')
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                user_id INTEGER,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                payload TEXT,
+                result TEXT,
+                error TEXT,
+                dedupe_key TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                expires_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, priority, created_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_user_status ON jobs(user_id, status)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs(dedupe_key, status)')
+
+    def start(self):
+        """Start the worker threads in this process (if JOB_QUEUE_ENABLED)"""
+        app = self.app
+        if not app.config.get('JOB_QUEUE_ENABLED', True) or self._threads:
+            return
+        interactive_workers = app.config.get('JOB_INTERACTIVE_WORKERS', 2)
+        bulk_workers = app.config.get('JOB_BULK_WORKERS', 1)
+        for i in range(interactive_workers + bulk_workers):
+            max_priority = PRIORITY_INTERACTIVE if i < interactive_workers else PRIORITY_BULK
+            thread = threading.Thread(target=self._run, args=(max_priority,),
+                                      name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def task(self, kind):
+        """Register a function as the handler for a job kind: @job_queue.task('ai_advice')"""
+        def decorator(func):
+            self._tasks[kind] = func
+            return func
+        return decorator
+
+    def _conn(self):
+        """One SQLite connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, kind, payload=None, user_id=None, priority=PRIORITY_INTERACTIVE, dedupe_key=None):
+        """Queue a job and return its id; an identical active job (same dedupe_key) is reused"""
+        if kind not in self._tasks:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if dedupe_key:
+                row = conn.execute(
+                    'SELECT id FROM jobs WHERE dedupe_key = ? AND status IN (?, ?)',
+                    (dedupe_key, STATUS_QUEUED, STATUS_RUNNING)
+                ).fetchone()
+                if row:
+                    conn.execute('COMMIT')
+                    return row['id']
+
+            if user_id is not None:
+                active = conn.execute(
+                    'SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN (?, ?)',
+                    (user_id, STATUS_QUEUED, STATUS_RUNNING)
+                ).fetchone()[0]
+                if active >= self.MAX_ACTIVE_PER_USER:
+                    raise JobLimitExceeded(f"User {user_id} already has {active} active jobs")
+
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                'INSERT INTO jobs (id, kind, user_id, priority, status, payload, dedupe_key, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, user_id, priority, STATUS_QUEUED,
+                 json.dumps(payload or {}, ensure_ascii=False), dedupe_key, time.time())
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        with self._cond:
+            self._cond.notify()
+        return job_id
+
+    def get(self, job_id, user_id=None):
+        """Job status dict (with result once done), or None if unknown, expired or not owned by user_id"""
+        row = self._conn().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or (user_id is not None and row['user_id'] != user_id):
+            return None
+        if row['expires_at'] and row['expires_at'] <= time.time():
+            return None
+        return self._to_dict(row)
+
+    def list_for_user(self, user_id, limit=20):
+        rows = self._conn().execute(
+            'SELECT * FROM jobs WHERE user_id = ? AND (expires_at IS NULL OR expires_at > ?) '
+            'ORDER BY created_at DESC LIMIT ?',
+            (user_id, time.time(), limit)
+        ).fetchall()
+        return [self._to_dict(row, include_result=False) for row in rows]
+
+    def cancel(self, job_id, user_id=None):
+        """Cancel a job that has not started yet; returns True if cancelled"""
+        now = time.time()
+        query = 'UPDATE jobs SET status = ?, finished_at = ?, expires_at = ? WHERE id = ? AND status = ?'
+        params = [STATUS_CANCELLED, now, now + self.RESULT_TTL, job_id, STATUS_QUEUED]
+        if user_id is not None:
+            query += ' AND user_id = ?'
+            params.append(user_id)
+        return self._conn().execute(query, params).rowcount == 1
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def report_progress(self, partial):
+        """From inside a running task: publish a partial result, readable as job['partial']"""
+        job_id = getattr(self._local, 'job_id', None)
+        if job_id is None:
+            return
+        # Cột result chỉ chứa kết quả cuối khi status = done; lúc đang chạy nó giữ phần tạm
+        self._conn().execute(
+            'UPDATE jobs SET result = ? WHERE id = ? AND status = ?',
+            (json.dumps(partial, ensure_ascii=False, default=str), job_id, STATUS_RUNNING)
+        )
+
+    def _to_dict(self, row, include_result=True):
+        job = {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'priority': row['priority'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at']
+        }
+        if include_result and row['status'] == STATUS_DONE:
+            job['result'] = json.loads(row['result']) if row['result'] else None
+        if include_result and row['status'] == STATUS_RUNNING and row['result']:
+            job['partial'] = json.loads(row['result'])
+        if row['status'] == STATUS_FAILED:
+            job['error'] = row['error']
+        return job
+
+    def claim(self, max_priority=PRIORITY_BULK):
+        """Atomically take the oldest highest-priority queued job this worker may run"""
+        conn = self._conn()
+        # BEGIN IMMEDIATE giữ khóa ghi, nên hai worker (kể cả khác process) không nhận cùng một job
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT id, kind, payload FROM jobs WHERE status = ? AND priority <= ? '
+                'ORDER BY priority, created_at LIMIT 1',
+                (STATUS_QUEUED, max_priority)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    'UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?',
+                    (STATUS_RUNNING, time.time(), row['id'])
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return row
+
+    def run_job(self, row):
+        """Execute a claimed job and store its outcome"""
+        func = self._tasks.get(row['kind'])
+        self._local.job_id = row['id']
+        try:
+            if func is None:
+                raise ValueError(f"No handler registered for {row['kind']}")
+            result = func(**json.loads(row['payload'] or '{}'))
+            finished = time.time()
+            self._conn().execute(
+                'UPDATE jobs SET status = ?, result = ?, finished_at = ?, expires_at = ? WHERE id = ?',
+                (STATUS_DONE, json.dumps(result, ensure_ascii=False, default=str),
+                 finished, finished + self.RESULT_TTL, row['id'])
+            )
+        except Exception as e:
+            logger.error(f"Job {row['id']} ({row['kind']}) failed: {e}")
+            finished = time.time()
+            self._conn().execute(
+                'UPDATE jobs SET status = ?, error = ?, finished_at = ?, expires_at = ? WHERE id = ?',
+                (STATUS_FAILED, str(e), finished, finished + self.RESULT_TTL, row['id'])
+            )
+        finally:
+            self._local.job_id = None
+
+    def maintenance(self):
+        """Requeue jobs orphaned by dead workers and purge expired results"""
+        now = time.time()
+        conn = self._conn()
+        stale = now - self.JOB_TIMEOUT
+        conn.execute(
+            'UPDATE jobs SET status = ?, started_at = NULL WHERE status = ? AND started_at < ? AND attempts < ?',
+            (STATUS_QUEUED, STATUS_RUNNING, stale, self.MAX_ATTEMPTS)
+        )
+        conn.execute(
+            'UPDATE jobs SET status = ?, error = ?, finished_at = ?, expires_at = ? '
+            'WHERE status = ? AND started_at < ?',
+            (STATUS_FAILED, 'worker lost', now, now + self.RESULT_TTL, STATUS_RUNNING, stale)
+        )
+        conn.execute('DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,))
+
+    def _run(self, max_priority):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+
+            try:
+                if time.time() - self._last_purge >= self.PURGE_INTERVAL:
+                    self._last_purge = time.time()
+                    self.maintenance()
+                row = self.claim(max_priority)
+            except sqlite3.Error as e:
+                logger.error(f"Job queue error: {e}")
+                row = None
+
+            if row is None:
+                # Job từ worker khác không gọi notify() ở đây, nên vẫn poll định kỳ
+                with self._cond:
+                    self._cond.wait(self.POLL_INTERVAL)
+                continue
+
+            # Flask-SQLAlchemy dọn session khi app context kết thúc
+            with self.app.app_context():
+                self.run_job(row)
+
+    def get_stats(self):
+        rows = self._conn().execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status').fetchall()
+        stats = {row['status']: row['n'] for row in rows}
+        stats['workers'] = len(self._threads)
+        return stats
+
+
+# Global queue instance
+job_queue = JobQueue()
@@ -0,0 +1,96 @@
+"""
+Compiled multi-category keyword matcher for chat messages
+
+Thay vì quét từng danh sách từ khóa bằng `any(k in text ...)` (mỗi lần lại lower() tin
+nhắn), toàn bộ từ khóa của mọi nhóm (ý định, cảm xúc, khẩn cấp...) được gộp thành một
+biểu thức chính quy duy nhất, biên dịch một lần. Một lượt finditer trên tin nhắn cho ra
+số từ khóa khớp của từng nhóm.
+
+Chuẩn hóa tiếng Việt:
+- tin nhắn được đưa về dạng NFC + casefold, nên chữ có dấu gõ bằng bộ gõ dựng sẵn hay tổ hợp
+  đều khớp như nhau
+- tin nhắn gõ không dấu ("toi dang buon") được so với bản không dấu của từ khóa; tin nhắn
+  có dấu chỉ so với từ khóa có dấu để "ngày" không bị nhầm thành "ngay"
+- từ khóa khớp theo ranh giới từ ("hi" không còn khớp bên trong "thích")
+"""
+import re
+import unicodedata
+from typing import Dict, Iterable
+
+
+def normalize(text: str) -> str:
+    """NFC + casefold form used for matching"""
+    text = str(text or '')
+    if not unicodedata.is_normalized('NFC', text):
+        text = unicodedata.normalize('NFC', text)
+    return text.casefold()
+
+
+def _build_fold_table():
+    """Precomposed Latin letter -> base letter ('ệ' -> 'e', 'đ' -> 'd'), for str.translate"""
+    table = {ord('đ'): 'd', ord('Đ'): 'D'}
+    for code in list(range(0xC0, 0x250)) + list(range(0x1E00, 0x1F00)):
+        char = chr(code)
+        base = ''.join(c for c in unicodedata.normalize('NFD', char) if not unicodedata.combining(c))
+        if base != char and base:
+            table[code] = base
+    return table
+
+
+_FOLD_TABLE = _build_fold_table()
+_DIACRITIC_RE = re.compile('[' + ''.join(chr(code) for code in _FOLD_TABLE) + ']')
+
+
+def fold_diacritics(text: str) -> str:
+    """Strip Vietnamese diacritics: 'Tu Luyện Đan' -> 'tu luyen dan'"""
+    return normalize(text).translate(_FOLD_TABLE)
+
+
+class KeywordMatcher:
+    """One precompiled alternation over every keyword of every category"""
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        self.categories = list(categories)
+        accented = {}
+        folded = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                accented.setdefault(normalize(keyword), set()).add(category)
+                folded.setdefault(fold_diacritics(keyword), set()).add(category)
+
+        self._accented = self._compile(accented)
+        self._folded = self._compile(folded)
+
+    @staticmethod
+    def _compile(keyword_categories):
+        """Regex plus, for each keyword, every (category, keyword) it implies.
+
+        The regex takes the longest keyword at each position, so a keyword that contains a
+        shorter one ('sợ hãi' ⊃ 'sợ') also credits the shorter keyword's categories.
+        """
+        keywords = sorted(keyword_categories, key=len, reverse=True)
+        pattern = re.compile(r'(?<!\w)(?:' + '|'.join(re.escape(k) for k in keywords) + r')(?!\w)')
+
+        implied = {}
+        for keyword in keywords:
+            hits = set()
+            for other in keywords:
+                if re.search(r'(?<!\w)' + re.escape(other) + r'(?!\w)', keyword):
+                    hits.update((category, other) for category in keyword_categories[other])
+            implied[keyword] = frozenset(hits)
+        return pattern, implied
+
+    def scan(self, text: str) -> Dict[str, int]:
+        """Number of distinct keywords of each category found in text (one pass)"""
+        normalized = normalize(text)
+        # Tin nhắn không dấu: so với bản không dấu của từ khóa
+        pattern, implied = self._accented if _DIACRITIC_RE.search(normalized) else self._folded
+
+        found = set()
+        for keyword in pattern.findall(normalized):
+            found |= implied[keyword]
+
+        counts = dict.fromkeys(self.categories, 0)
+        for category, _ in found:
+            counts[category] += 1
+        return counts
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Load-testing harness and synthetic world generator
+
+test_app.py/test_fixes.py chỉ kiểm tra import và schema, không tái hiện được tải thật.
+Công cụ này gồm ba bước:
+
+- seed: sinh người chơi, bang hội, thế giới, đạo lữ và tin nhắn bằng INSERT hàng loạt
+  (executemany, băm mật khẩu một lần cho mọi tài khoản), vài nghìn dòng chỉ mất vài giây.
+  Dữ liệu sinh ra mang tiền tố `load_` và xóa được bằng `clear`
+- run: mỗi người chơi ảo đăng nhập bằng một tài khoản load_* rồi gửi liên tục một hỗn hợp
+  request có trọng số (`/api/cultivate`, `/api/get-messages`, `/api/sync`, `/rankings`,
+  `/guild-management`) tới server cục bộ; in và lưu báo cáo throughput/độ trễ theo route.
+  `/api/sync` gửi đủ các mục mà các trang đăng ký và mang theo phiên bản nhận được như sync.js
+- compare: so hai báo cáo (vd. trước/sau một commit)
+
+    python loadtest.py seed --users 2000 --guilds 80 --worlds 1000 --expeditions 200 --messages 20000
+    gunicorn app:app -w 4 &
+    python loadtest.py run --url http://127.0.0.1:8000 --users 50 --duration 60 --output after.json
+    python loadtest.py compare before.json after.json
+
+Giới hạn tần suất (rate limit) vẫn bật thì các lần tu luyện vượt mức nhận 429 và được đếm
+riêng; muốn đo công suất thô thì chạy server với RATE_LIMIT_ENABLED=false.
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+PREFIX = 'load_'
+PASSWORD = 'loadtest-password'
+
+LEVELS = [f'{stage} Tầng {tier}' for stage in ('Luyện Khí', 'Trúc Cơ', 'Kết Đan', 'Nguyên Anh', 'Hóa Thần')
+          for tier in range(1, 10)]
+WORLD_TYPES = ('Linh Giới', 'Ma Cảnh', 'Thiên Giới', 'Tiểu Thế Giới')
+DESTINATIONS = ('Rừng Tre Xanh', 'Hang Động Bí Ẩn', 'Núi Lửa Cổ', 'Biển Sương Mù', 'Di Tích Thượng Cổ')
+MESSAGES = (
+    'Đạo hữu nào đi thám hiểm bí cảnh không?',
+    'Vừa đột phá thêm một tầng, linh khí tràn đầy!',
+    'Bang hội tuyển thêm thành viên, ai muốn gia nhập?',
+    'Đổi đan dược lấy linh thạch, giá hợp lý.',
+    'Thế giới của ta vừa lên cấp, cảm tạ các đạo hữu.',
+)
+
+# Route -> (method, path); trọng số mặc định mô phỏng một tab đang chơi
+ROUTES = {
+    'cultivate': ('POST', '/api/cultivate'),
+    'messages': ('GET', '/api/get-messages?channel=general'),
+    'sync': ('POST', '/api/sync'),
+    'rankings': ('GET', '/rankings'),
+    'guild': ('GET', '/guild-management'),
+}
+DEFAULT_MIX = {'cultivate': 3, 'messages': 4, 'sync': 4, 'rankings': 2, 'guild': 1}
+
+# Các mục mà dashboard, cộng đồng, bang hội, thế giới và thám hiểm đăng ký với /api/sync
+SYNC_SECTIONS = {
+    'user': {},
+    'messages': {'channel': 'general'},
+    'guild': {},
+    'worlds': {},
+    'expeditions': {},
+}
+
+
+def sync_body(versions):
+    """/api/sync payload for the sections a player keeps open, carrying the versions already seen"""
+    return {'sections': {name: {'params': params, 'version': versions.get(name)}
+                         for name, params in SYNC_SECTIONS.items()}}
+
+
+# ========================
+# SYNTHETIC DATA
+# ========================
+
+def seed(users=1000, guilds=40, worlds=500, expeditions=100, messages=5000, rng_seed=42):
+    """Bulk-insert a synthetic world (call inside an app context); returns row counts and seconds"""
+    from sqlalchemy import insert, update
+    from app import db
+    from login_security import password_policy
+    from models import User, Guild, World, Expedition, ExpeditionParticipant, ChatMessage
+
+    rng = random.Random(rng_seed)
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    run = uuid.uuid4().hex[:6]  # seed nhiều lần không trùng tên đăng nhập/bang hội
+    password_hash = password_policy.hash(PASSWORD)
+
+    def insert_ids(model, rows):
+        if not rows:
+            return []
+        return list(db.session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows))
+
+    user_ids = insert_ids(User, [{
+        'username': f'{PREFIX}{run}_{i:06d}',
+        'email': f'{PREFIX}{run}_{i:06d}@load.test',
+        'password_hash': password_hash,
+        'dao_name': f'Đạo Hữu {i}' if rng.random() < 0.6 else None,
+        'cultivation_level': rng.choice(LEVELS),
+        'spiritual_power': int(rng.lognormvariate(7, 1.2)),
+        'cultivation_points': rng.randint(0, 5000),
+        'reputation': rng.randint(0, 2000),
+        'karma_points': rng.randint(-100, 500),
+        'spiritual_stones': rng.randint(100, 50000),
+        'pills_count': rng.randint(0, 50),
+        'artifacts_count': rng.randint(0, 10),
+        'last_cultivation': now - timedelta(minutes=rng.randint(1, 600)),
+    } for i in range(users)])
+
+    guild_ids = insert_ids(Guild, [{
+        'name': f'{PREFIX}{run} Bang {i}',
+        'description': 'Bang hội sinh tự động cho kiểm thử tải',
+        'leader_id': leader_id,
+        'level': rng.randint(1, 20),
+        'experience': rng.randint(0, 10000),
+        'treasury': rng.randint(0, 100000),
+    } for i, leader_id in enumerate(rng.sample(user_ids, min(guilds, len(user_ids))))])
+
+    # ~70% người chơi vào bang, bang lớn nhỏ khác nhau (phân phối lệch)
+    if guild_ids:
+        weights = [1 / (rank + 1) for rank in range(len(guild_ids))]
+        memberships = [{'id': user_id, 'guild_id': rng.choices(guild_ids, weights)[0]}
+                       for user_id in user_ids if rng.random() < 0.7]
+        leaders = db.session.query(Guild.leader_id, Guild.id).filter(Guild.id.in_(guild_ids)).all()
+        memberships += [{'id': leader_id, 'guild_id': guild_id} for leader_id, guild_id in leaders]
+        db.session.execute(update(User), memberships)
+
+    world_rows = []
+    for i in range(worlds):
+        world_rows.append({
+            'name': f'{PREFIX}{run} Giới {i}',
+            'world_type': rng.choice(WORLD_TYPES),
+            'owner_id': rng.choice(user_ids) if user_ids and rng.random() < 0.8 else None,
+            'world_level': rng.randint(1, 10),
+            'spiritual_density': rng.randint(10, 100),
+            'danger_level': rng.randint(1, 10),
+            'spiritual_stones_production': rng.randint(50, 500),
+        })
+    insert_ids(World, world_rows)
+
+    statuses = ('Tuyển Thành Viên', 'Đang Diễn Ra', 'Hoàn Thành')
+    expedition_rows = []
+    for i in range(expeditions):
+        status = rng.choices(statuses, (5, 3, 2))[0]
+        expedition_rows.append({
+            'name': f'{PREFIX}{run} Đạo Lữ {i}',
+            'destination': rng.choice(DESTINATIONS),
+            'difficulty_level': rng.randint(1, 5),
+            'max_participants': 5,
+            'duration_hours': rng.choice((1, 6, 24)),
+            'status': status,
+            'organizer_guild_id': rng.choice(guild_ids) if guild_ids else None,
+            'start_time': now - timedelta(hours=rng.randint(0, 20)) if status != 'Tuyển Thành Viên' else None,
+            'potential_rewards': {'spiritual_stones': rng.randint(100, 1000), 'pills_count': rng.randint(0, 5)},
+        })
+    expedition_ids = insert_ids(Expedition, expedition_rows)
+
+    participant_rows, counts = [], []
+    for expedition_id in expedition_ids:
+        members = rng.sample(user_ids, min(len(user_ids), rng.randint(1, 5)))
+        participant_rows += [{'expedition_id': expedition_id, 'user_id': user_id} for user_id in members]
+        counts.append({'id': expedition_id, 'participant_count': len(members)})
+    insert_ids(ExpeditionParticipant, participant_rows)
+    if counts:
+        db.session.execute(update(Expedition), counts)
+
+    message_rows = []
+    for i in range(messages):
+        user_id = rng.choice(user_ids)
+        message_rows.append({
+            'user_id': user_id,
+            'content': rng.choice(MESSAGES),
+            'channel': 'general',
+            'created_at': now - timedelta(seconds=(messages - i) * 7),
+        })
+    insert_ids(ChatMessage, message_rows)
+
+    db.session.commit()
+    return {
+        'users': len(user_ids), 'guilds': len(guild_ids), 'worlds': worlds,
+        'expeditions': len(expedition_ids), 'participants': len(participant_rows), 'messages': messages,
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+
+
+def clear():
+    """Delete every synthetic row created by seed() (call inside an app context)"""
+    from app import db
+    from models import (User, Guild, World, Expedition, ExpeditionParticipant, ChatMessage,
+                        Achievement, GuildWar)
+
+    user_ids = db.session.query(User.id).filter(User.username.like(f'{PREFIX}%'))
+    guild_ids = db.session.query(Guild.id).filter(Guild.name.like(f'{PREFIX}%'))
+    expedition_ids = db.session.query(Expedition.id).filter(Expedition.name.like(f'{PREFIX}%'))
+    options = {'synchronize_session': False}
+
+    deleted = {
+        'messages': ChatMessage.query.filter(ChatMessage.user_id.in_(user_ids)).delete(**options),
+        'participants': ExpeditionParticipant.query.filter(
+            ExpeditionParticipant.expedition_id.in_(expedition_ids) | ExpeditionParticipant.user_id.in_(user_ids)
+        ).delete(**options),
+    }
+    Achievement.query.filter(Achievement.user_id.in_(user_ids)).delete(**options)
+    GuildWar.query.filter(GuildWar.guild_id.in_(guild_ids) | GuildWar.target_guild_id.in_(guild_ids)).delete(**options)
+    deleted['expeditions'] = Expedition.query.filter(Expedition.name.like(f'{PREFIX}%')).delete(**options)
+    deleted['worlds'] = World.query.filter(World.name.like(f'{PREFIX}%')).delete(**options)
+    World.query.filter(World.owner_id.in_(user_ids)).update({'owner_id': None}, **options)
+    User.query.filter(User.username.like(f'{PREFIX}%')).update({'guild_id': None}, **options)
+    deleted['guilds'] = Guild.query.filter(Guild.name.like(f'{PREFIX}%')).delete(**options)
+    deleted['users'] = User.query.filter(User.username.like(f'{PREFIX}%')).delete(**options)
+    db.session.commit()
+    # Id vừa xóa sẽ được cấp lại: không để tài khoản mới kế thừa cửa sổ giới hạn của người chơi ảo
+    from rate_limit import rate_limiter
+    rate_limiter.reset()
+    return deleted
+
+
+def seeded_usernames(limit):
+    from app import db
+    from models import User
+    rows = db.session.query(User.username).filter(User.username.like(f'{PREFIX}%')).order_by(User.id).limit(limit)
+    return [username for username, in rows]
+
+
+# ========================
+# LOAD REPLAY
+# ========================
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class LoadRunner:
+    """Virtual players replaying a weighted route mix against a running server"""
+
+    def __init__(self, base_url, usernames, mix=None, duration=30, think_time=0.0, timeout=30, rng_seed=1):
+        self.base_url = base_url.rstrip('/')
+        self.usernames = usernames
+        self.mix = mix or DEFAULT_MIX
+        self.duration = duration
+        self.think_time = think_time
+        self.timeout = timeout
+        self.rng_seed = rng_seed
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)  # route -> [(status, latency giây)]
+        self.login_failures = 0
+
+    def login(self, session, username):
+        response = session.post(f'{self.base_url}/auth', data={
+            'action': 'login', 'username': username, 'password': PASSWORD
+        }, allow_redirects=False, timeout=self.timeout)
+        return response.status_code == 302 and '/dashboard' in response.headers.get('Location', '')
+
+    def player(self, index, username, deadline):
+        import requests
+
+        rng = random.Random(self.rng_seed * 100003 + index)
+        routes, weights = zip(*self.mix.items())
+        session = requests.Session()
+        if not self.login(session, username):
+            with self._lock:
+                self.login_failures += 1
+            return
+
+        samples = defaultdict(list)
+        sync_versions = {}
+        while time.monotonic() < deadline:
+            route = rng.choices(routes, weights)[0]
+            method, path = ROUTES[route]
+            if route == 'sync':
+                body = sync_body(sync_versions)
+            else:
+                body = {} if method == 'POST' else None
+            started = time.perf_counter()
+            try:
+                response = session.request(method, self.base_url + path, timeout=self.timeout,
+                                           headers={'X-Requested-With': 'XMLHttpRequest'},
+                                           json=body, allow_redirects=False)
+                status = response.status_code
+                if route == 'sync' and status == 200:
+                    # Như sync.js: lần sau chỉ nhận lại các mục đã đổi
+                    for name, update in response.json().get('sections', {}).items():
+                        sync_versions[name] = update.get('version')
+            except (requests.RequestException, ValueError):
+                status = 0
+            samples[route].append((status, time.perf_counter() - started))
+            if self.think_time:
+                time.sleep(rng.uniform(0, 2 * self.think_time))
+
+        with self._lock:
+            for route, route_samples in samples.items():
+                self.samples[route].extend(route_samples)
+
+    def run(self):
+        deadline = time.monotonic() + self.duration
+        started = time.perf_counter()
+        threads = [threading.Thread(target=self.player, args=(index, username, deadline), daemon=True)
+                   for index, username in enumerate(self.usernames)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        routes = {}
+        for route in self.mix:
+            samples = self.samples.get(route, [])
+            latencies = sorted(latency * 1000 for _, latency in samples)
+            statuses = defaultdict(int)
+            for status, _ in samples:
+                statuses[str(status)] += 1
+            routes[route] = {
+                'requests': len(samples),
+                'rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+                'errors': sum(1 for status, _ in samples if status == 0 or status >= 500),
+                'statuses': dict(statuses),
+                'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+                'p50_ms': _round(percentile(latencies, 0.50)),
+                'p95_ms': _round(percentile(latencies, 0.95)),
+                'p99_ms': _round(percentile(latencies, 0.99)),
+                'max_ms': _round(latencies[-1] if latencies else None),
+            }
+        total = sum(route['requests'] for route in routes.values())
+        return {
+            'commit': git_commit(),
+            'started_at': datetime.utcnow().isoformat() + 'Z',
+            'base_url': self.base_url,
+            'players': len(self.usernames),
+            'duration_s': round(elapsed, 2),
+            'mix': self.mix,
+            'login_failures': self.login_failures,
+            'total_requests': total,
+            'total_rps': round(total / elapsed, 2) if elapsed else 0,
+            'routes': routes,
+        }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def parse_mix(text):
+    """'cultivate=3,messages=4' -> {'cultivate': 3.0, 'messages': 4.0}"""
+    mix = {}
+    for part in text.split(','):
+        route, _, weight = part.partition('=')
+        if route.strip() not in ROUTES:
+            raise ValueError(f'Unknown route {route!r} (choose from {", ".join(ROUTES)})')
+        mix[route.strip()] = float(weight or 1)
+    return mix
+
+
+def format_report(report):
+    lines = [f"commit {report['commit']}  players {report['players']}  {report['duration_s']}s  "
+             f"{report['total_requests']} requests  {report['total_rps']} req/s"]
+    lines.append(f"{'route':12}{'req':>8}{'req/s':>9}{'err':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  statuses")
+    for route, stats in report['routes'].items():
+        lines.append(f"{route:12}{stats['requests']:>8}{stats['rps']:>9}{stats['errors']:>6}"
+                     f"{_fmt(stats['p50_ms']):>9}{_fmt(stats['p95_ms']):>9}{_fmt(stats['p99_ms']):>9}  "
+                     + ' '.join(f'{status}:{count}' for status, count in sorted(stats['statuses'].items())))
+    return '\n'.join(lines)
+
+
+def compare_reports(before, after):
+    lines = [f"{'route':12}{'req/s':>18}{'p50 ms':>20}{'p95 ms':>20}"]
+    for route in after['routes']:
+        old, new = before['routes'].get(route), after['routes'][route]
+        if not old:
+            continue
+        lines.append(f"{route:12}" + ''.join(
+            f"{_fmt(old[key]):>7} ->{_fmt(new[key]):>7}{_delta(old[key], new[key]):>4}"
+            for key in ('rps', 'p50_ms', 'p95_ms')))
+    return '\n'.join(lines)
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+def _delta(old, new):
+    if not old or new is None:
+        return ''
+    return f' {(new - old) / old:+.0%}'
+
+
+def serve_in_thread():
+    """Start the app on a free local port (convenience; use gunicorn for comparable numbers)"""
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Synthetic data and load replay for the game backend')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help='bulk-insert synthetic players, guilds, worlds...')
+    seed_parser.add_argument('--users', type=int, default=1000)
+    seed_parser.add_argument('--guilds', type=int, default=40)
+    seed_parser.add_argument('--worlds', type=int, default=500)
+    seed_parser.add_argument('--expeditions', type=int, default=100)
+    seed_parser.add_argument('--messages', type=int, default=5000)
+    seed_parser.add_argument('--seed', type=int, default=42)
+
+    commands.add_parser('clear', help='delete all synthetic rows')
+
+    run_parser = commands.add_parser('run', help='replay a route mix against a server')
+    run_parser.add_argument('--url', default='http://127.0.0.1:5000')
+    run_parser.add_argument('--serve', action='store_true', help='start the app in-process instead of --url')
+    run_parser.add_argument('--users', type=int, default=20, help='concurrent virtual players')
+    run_parser.add_argument('--duration', type=float, default=30, help='seconds')
+    run_parser.add_argument('--think', type=float, default=0.0, help='mean think time between requests (s)')
+    run_parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='e.g. cultivate=3,messages=4,sync=4,rankings=2,guild=1')
+    run_parser.add_argument('--output', help='write the JSON report here')
+
+    compare_parser = commands.add_parser('compare', help='compare two JSON reports')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.before, encoding='utf-8') as f:
+            before = json.load(f)
+        with open(args.after, encoding='utf-8') as f:
+            after = json.load(f)
+        print(f"{before['commit']} -> {after['commit']}")
+        print(compare_reports(before, after))
+        return 0
+
+    from app import app
+    with app.app_context():
+        if args.command == 'seed':
+            print(json.dumps(seed(args.users, args.guilds, args.worlds, args.expeditions, args.messages, args.seed)))
+            return 0
+        if args.command == 'clear':
+            print(json.dumps(clear()))
+            return 0
+        usernames = seeded_usernames(args.users)
+
+    if len(usernames) < args.users:
+        print(f'Only {len(usernames)} synthetic players found; run `python loadtest.py seed` first')
+        return 1
+    url = args.url
+    if args.serve:
+        server, url = serve_in_thread()
+    report = LoadRunner(url, usernames, args.mix, args.duration, args.think).run()
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
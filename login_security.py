@@ -0,0 +1,184 @@
+"""
+Password hashing policy and login throttling
+
+Trước đây /auth băm mật khẩu (scrypt mặc định của werkzeug) cho mọi lần thử, không giới hạn,
+nên một đợt credential stuffing làm bão hòa CPU của các worker. Module này gom:
+
+- PasswordPolicy: một phương thức băm cấu hình được (PASSWORD_HASH_METHOD); hash cũ/yếu hơn
+  được băm lại khi người chơi đăng nhập thành công; thời gian băm mỗi worker được đo
+- LoginThrottle: cửa sổ trượt số lần đăng nhập SAI theo IP và theo tên đăng nhập, lưu trong
+  cache dùng chung thành các bộ đếm theo khung thời gian (add + inc, không đọc-sửa-ghi);
+  bị chặn thì từ chối ngay, trước khi truy vấn User hay chạy hàm băm
+"""
+import threading
+import time
+from werkzeug.security import generate_password_hash, check_password_hash
+
+MAX_PASSWORD_LENGTH = 1024  # mật khẩu dài hơn bị từ chối trước khi băm
+
+
+class PasswordPolicy:
+    """Configured werkzeug hash method, rehash detection and per-worker hash timing"""
+
+    DEFAULT_METHOD = 'scrypt'
+
+    def __init__(self, method=DEFAULT_METHOD):
+        self._lock = threading.Lock()
+        self.stats = {'hashes': 0, 'verifications': 0, 'rehashes': 0,
+                      'hash_seconds': 0.0, 'max_hash_seconds': 0.0}
+        self.configure(method)
+
+    def configure(self, method):
+        self.method = method
+        # Dạng đầy đủ (vd. 'scrypt:32768:8:1') để so với tiền tố của hash đã lưu
+        self.method_id = generate_password_hash('', method=method).split('$', 1)[0]
+
+    def init_app(self, app):
+        self.configure(app.config.get('PASSWORD_HASH_METHOD', self.method))
+
+    def hash(self, password):
+        if password is None or len(password) > MAX_PASSWORD_LENGTH:
+            # verify() từ chối mật khẩu này, nên tài khoản băm với nó sẽ không bao giờ đăng nhập được
+            raise ValueError(f'password must be at most {MAX_PASSWORD_LENGTH} characters')
+        started = time.perf_counter()
+        password_hash = generate_password_hash(password, method=self.method)
+        self._record('hashes', time.perf_counter() - started)
+        return password_hash
+
+    def verify(self, password_hash, password):
+        if not password_hash or password is None or len(password) > MAX_PASSWORD_LENGTH:
+            return False
+        started = time.perf_counter()
+        try:
+            return check_password_hash(password_hash, password)
+        finally:
+            self._record('verifications', time.perf_counter() - started)
+
+    def needs_rehash(self, password_hash):
+        """True if the stored hash was made with a different method or cost than the policy"""
+        return bool(password_hash) and password_hash.split('$', 1)[0] != self.method_id
+
+    def record_rehash(self):
+        with self._lock:
+            self.stats['rehashes'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        calls = stats['hashes'] + stats['verifications']
+        stats['avg_hash_ms'] = round(stats['hash_seconds'] / calls * 1000, 2) if calls else 0.0
+        stats['hash_seconds'] = round(stats['hash_seconds'], 4)
+        stats['max_hash_seconds'] = round(stats['max_hash_seconds'], 4)
+        stats['method'] = self.method_id
+        return stats
+
+    def _record(self, kind, elapsed):
+        with self._lock:
+            self.stats[kind] += 1
+            self.stats['hash_seconds'] += elapsed
+            if elapsed > self.stats['max_hash_seconds']:
+                self.stats['max_hash_seconds'] = elapsed
+
+
+class LoginThrottle:
+    """Sliding-window failed-login limits per IP and per username in the shared cache"""
+
+    WINDOW = 900  # giây
+    BUCKETS = 15  # cửa sổ chia thành bấy nhiêu bộ đếm; lỗi hết tính sau WINDOW - WINDOW/BUCKETS..WINDOW giây
+    MAX_FAILURES_PER_IP = 20
+    MAX_FAILURES_PER_USER = 5
+
+    def __init__(self, cache=None, clock=time.time):
+        self.cache = cache
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._inc_lock = threading.Lock()
+        self.stats = {'allowed': 0, 'blocked': 0, 'failures': 0}
+
+    def init_app(self, app, cache):
+        self.cache = cache
+        self.WINDOW = app.config.get('LOGIN_FAILURE_WINDOW', self.WINDOW)
+        self.MAX_FAILURES_PER_IP = app.config.get('LOGIN_MAX_FAILURES_PER_IP', self.MAX_FAILURES_PER_IP)
+        self.MAX_FAILURES_PER_USER = app.config.get('LOGIN_MAX_FAILURES_PER_USER', self.MAX_FAILURES_PER_USER)
+
+    def check(self, ip, username):
+        """Seconds to wait before another attempt is allowed (0 = go ahead)"""
+        now = self._clock()
+        width = self._bucket_width()
+        retry_after = 0
+        for key, limit in self._keys(ip, username):
+            buckets = self._bucket_indexes(now)
+            try:
+                counts = self.cache.get_many(*(self._bucket_key(key, b) for b in buckets))
+            except Exception:
+                # Cache hỏng thì không khóa người chơi ngoài
+                continue
+            counts = [int(c or 0) for c in counts]
+            remaining = sum(counts)
+            # Bỏ dần khung cũ nhất cho tới khi dưới ngưỡng: lúc khung đó trượt khỏi cửa sổ là hết bị chặn
+            for bucket, count in zip(buckets, counts):
+                if remaining < limit:
+                    break
+                remaining -= count
+                retry_after = max(retry_after, bucket * width + self.WINDOW - now)
+
+        with self._lock:
+            self.stats['blocked' if retry_after else 'allowed'] += 1
+        return int(retry_after) + 1 if retry_after else 0
+
+    def record_failure(self, ip, username):
+        now = self._clock()
+        bucket = self._bucket_indexes(now)[-1]
+        timeout = int(self.WINDOW + self._bucket_width()) + 1
+        # add() + inc() nguyên tử trên Redis/memcached: một đợt stuffing song song đếm đủ mọi lần sai.
+        # Lock phủ SimpleCache (inc là get + set) trong process.
+        backend = getattr(self.cache, 'cache', self.cache)  # Flask-Caching không bọc inc()
+        for key, _ in self._keys(ip, username):
+            bucket_key = self._bucket_key(key, bucket)
+            try:
+                with self._inc_lock:
+                    backend.add(bucket_key, 0, timeout=timeout)
+                    backend.inc(bucket_key)
+            except Exception:
+                pass
+        with self._lock:
+            self.stats['failures'] += 1
+
+    def reset(self, username):
+        """Clear the username window after a successful login (the IP window keeps counting)"""
+        key = self._user_key(username)
+        try:
+            self.cache.delete_many(*(self._bucket_key(key, b) for b in self._bucket_indexes(self._clock())))
+        except Exception:
+            pass
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _keys(self, ip, username):
+        keys = [(f'login_fail:ip:{ip or "unknown"}', self.MAX_FAILURES_PER_IP)]
+        if username:
+            keys.append((self._user_key(username), self.MAX_FAILURES_PER_USER))
+        return keys
+
+    def _bucket_width(self):
+        return self.WINDOW / self.BUCKETS
+
+    def _bucket_indexes(self, now):
+        """Indexes of the buckets still inside the window, oldest first"""
+        current = int(now // self._bucket_width())
+        return list(range(current - self.BUCKETS + 1, current + 1))
+
+    @staticmethod
+    def _bucket_key(key, bucket):
+        return f'{key}:{bucket}'
+
+    @staticmethod
+    def _user_key(username):
+        return f'login_fail:user:{username.strip().casefold()}'
+
+
+# Global instances
+password_policy = PasswordPolicy()
+login_throttle = LoginThrottle()
@@ -1,4 +1,8 @@
-from app import app
+import os
+from app import app, start_background_workers
 
 if __name__ == '__main__':
+    # Với reloader, chỉ process con (phục vụ request) chạy worker nền
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers()
     app.run(host='0.0.0.0', port=5000, debug=True)
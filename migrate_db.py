@@ -46,7 +46,11 @@ def migrate_database():
                 'total_upgrades INTEGER DEFAULT 0',
                 'last_attacked DATETIME',
                 'successful_defenses INTEGER DEFAULT 0',
-                'special_events_count INTEGER DEFAULT 0'
+                'special_events_count INTEGER DEFAULT 0',
+                'accrual_rate FLOAT',
+                'pending_yield FLOAT DEFAULT 0.0',
+                'last_settled_at DATETIME',
+                'last_harvested DATETIME'
             ]
             
             # Add each column if it doesn't exist
@@ -65,6 +69,20 @@ def migrate_database():
                         print(f"Error adding column {column_name}: {e}")
                         db.session.rollback()
             
+            # Indexes declared on the World model
+            new_indexes = [
+                'CREATE INDEX IF NOT EXISTS idx_world_owner_id ON world(owner_id)',
+                'CREATE INDEX IF NOT EXISTS idx_world_id_owner_id ON world(id, owner_id)'
+            ]
+            
+            for index_sql in new_indexes:
+                try:
+                    db.session.execute(text(index_sql))
+                    db.session.commit()
+                except Exception as e:
+                    print(f"Error creating index: {e}")
+                    db.session.rollback()
+            
             print("Database migration completed successfully!")
             
         except Exception as e:
@@ -0,0 +1,50 @@
+from app import app, db
+from sqlalchemy import text
+
+def migrate_expedition_database():
+    """Migrate database for race-free expedition joins"""
+    with app.app_context():
+        try:
+            # Add participant_count column
+            try:
+                db.session.execute(text('ALTER TABLE expedition ADD COLUMN participant_count INTEGER NOT NULL DEFAULT 0'))
+                db.session.commit()
+                print("Added column: participant_count")
+            except Exception as e:
+                if "already exists" in str(e) or "duplicate column" in str(e).lower():
+                    print("Column participant_count already exists, skipping...")
+                    db.session.rollback()
+                else:
+                    raise
+            
+            # Remove duplicate joins, keeping the earliest row
+            result = db.session.execute(text('''
+                DELETE FROM expedition_participant
+                WHERE id NOT IN (
+                    SELECT MIN(id) FROM expedition_participant GROUP BY expedition_id, user_id
+                )
+            '''))
+            print(f"Removed {result.rowcount} duplicate participants")
+            
+            # Backfill participant_count from existing rows
+            db.session.execute(text('''
+                UPDATE expedition SET participant_count = (
+                    SELECT COUNT(*) FROM expedition_participant
+                    WHERE expedition_participant.expedition_id = expedition.id
+                )
+            '''))
+            
+            db.session.execute(text(
+                'CREATE UNIQUE INDEX IF NOT EXISTS uq_expedition_participant '
+                'ON expedition_participant(expedition_id, user_id)'
+            ))
+            db.session.commit()
+            
+            print("Expedition database migration completed successfully!")
+            
+        except Exception as e:
+            print(f"Expedition migration failed: {e}")
+            db.session.rollback()
+
+if __name__ == "__main__":
+    migrate_expedition_database()
@@ -0,0 +1,65 @@
+from app import app, db
+from sqlalchemy import text
+from models import Expedition
+from db_optimizer import DatabaseOptimizer
+import json
+
+# (table, column, normalizer) - normalizer chuyển giá trị văn bản cũ thành JSON hợp lệ
+JSON_COLUMNS = [
+    ('expedition', 'required_items', Expedition.normalize_items),
+    ('expedition', 'potential_rewards', Expedition.normalize_rewards),
+    ('guild_war', 'casualties', None),
+    ('guild_war', 'rewards', None),
+]
+
+def parse_legacy(value, normalizer):
+    """Parse a legacy Text value; non-JSON text is kept as a JSON string"""
+    if normalizer:
+        return normalizer(value)
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def migrate_json_columns():
+    """Convert Text "JSON string" columns into real JSON columns"""
+    with app.app_context():
+        try:
+            is_postgres = db.engine.dialect.name == 'postgresql'
+
+            for table, column, normalizer in JSON_COLUMNS:
+                rows = db.session.execute(text(
+                    f'SELECT id, {column} FROM {table} WHERE {column} IS NOT NULL'
+                )).fetchall()
+
+                converted = 0
+                for row_id, value in rows:
+                    if not isinstance(value, str):
+                        continue  # đã là JSON
+                    parsed = parse_legacy(value, normalizer)
+                    db.session.execute(
+                        text(f'UPDATE {table} SET {column} = :value WHERE id = :id'),
+                        {'value': json.dumps(parsed, ensure_ascii=False) if parsed is not None else None, 'id': row_id}
+                    )
+                    converted += 1
+                db.session.commit()
+                print(f"Normalized {converted} rows in {table}.{column}")
+
+                if is_postgres:
+                    db.session.execute(text(
+                        f'ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb'
+                    ))
+                    db.session.commit()
+                    print(f"Converted {table}.{column} to JSONB")
+
+            DatabaseOptimizer.create_reward_indexes(db)
+            print("Created reward indexes")
+
+            print("JSON column migration completed successfully!")
+
+        except Exception as e:
+            print(f"JSON column migration failed: {e}")
+            db.session.rollback()
+
+if __name__ == "__main__":
+    migrate_json_columns()
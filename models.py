@@ -1,9 +1,30 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from app import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from login_security import password_policy
+from sqlalchemy.dialects.postgresql import JSONB
 import json
 
+# Cột JSON thật: JSONB trên PostgreSQL, JSON (JSON1) trên SQLite
+JSONType = db.JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql')
+
+# Loại phần thưởng -> tên hiển thị
+REWARD_TYPES = {
+    'spiritual_stones': 'Linh Thạch',
+    'pills_count': 'Đan Dược',
+    'artifacts_count': 'Pháp Bảo',
+    'cultivation_points': 'Điểm Tu Luyện',
+    'reputation': 'Uy Tín',
+    'spiritual_herbs': 'Linh Thảo',
+    'essence_crystals': 'Tinh Thể Tinh Hoa',
+    'ancient_artifacts': 'Cổ Vật',
+    'dragon_scales': 'Vảy Rồng',
+    'phoenix_feathers': 'Lông Phượng Hoàng'
+}
+
+# Các loại phần thưởng có chỉ mục riêng để lọc nhanh
+INDEXED_REWARD_TYPES = ('spiritual_stones', 'pills_count', 'artifacts_count', 'dragon_scales', 'phoenix_feathers')
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -47,10 +68,10 @@ class User(UserMixin, db.Model):
     expedition_participations = db.relationship('ExpeditionParticipant', backref='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_policy.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_policy.verify(self.password_hash, password)
     
     def get_cultivation_stage(self):
         stages = [
@@ -118,6 +139,12 @@ class Guild(db.Model):
     expeditions = db.relationship('Expedition', backref='organizing_guild', lazy=True)
 
 class World(db.Model):
+    __table_args__ = (
+        db.Index('idx_world_owner_id', 'owner_id'),
+        # Covering index for ownership probes: WHERE id = ? -> owner_id
+        db.Index('idx_world_id_owner_id', 'id', 'owner_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     world_type = db.Column(db.String(50))  # Linh Giới, Ma Cảnh, Thiên Giới, etc.
@@ -190,8 +217,64 @@ class World(db.Model):
     successful_defenses = db.Column(db.Integer, default=0)
     special_events_count = db.Column(db.Integer, default=0)
     
+    # Offline production accrual
+    accrual_rate = db.Column(db.Float)  # Linh thạch mỗi giờ (tính từ các chỉ số kinh tế)
+    pending_yield = db.Column(db.Float, default=0.0)  # Sản lượng đã chốt nhưng chưa thu hoạch
+    last_settled_at = db.Column(db.DateTime)  # Thời điểm chốt sản lượng gần nhất
+    last_harvested = db.Column(db.DateTime)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Giới hạn tích lũy khi offline và thời gian hồi thu hoạch
+    MAX_ACCRUAL_HOURS = 72
+    HARVEST_COOLDOWN_SECONDS = 600
+    
+    def get_production_multiplier(self):
+        """Hệ số nhân sản lượng từ các tính năng đặc biệt"""
+        multiplier = self.time_flow_rate or 1.0
+        if self.resource_multiplication:
+            multiplier *= 2.0
+        if self.market_level:
+            multiplier *= (1 + self.market_level * 0.1)
+        return multiplier
+    
+    def compute_accrual_rate(self):
+        """Tính tốc độ sản xuất linh thạch mỗi giờ"""
+        base_daily = self.daily_income or self.spiritual_stones_production or 0
+        return base_daily * self.get_production_multiplier() / 24.0
+    
+    def refresh_accrual_rate(self):
+        """Cập nhật accrual_rate sau khi chỉ số kinh tế thay đổi"""
+        self.accrual_rate = self.compute_accrual_rate()
+        return self.accrual_rate
+    
+    def get_pending_yield(self, now=None):
+        """Sản lượng chờ thu hoạch, tính khi đọc (không ghi DB)"""
+        now = now or datetime.utcnow()
+        rate = self.accrual_rate if self.accrual_rate is not None else self.compute_accrual_rate()
+        since = self.last_settled_at or self.created_at or now
+        
+        elapsed_hours = max(0.0, (now - since).total_seconds() / 3600)
+        pending = (self.pending_yield or 0.0) + rate * elapsed_hours
+        return min(pending, rate * self.MAX_ACCRUAL_HOURS) if rate > 0 else (self.pending_yield or 0.0)
+    
+    def settle(self, now=None):
+        """Chốt sản lượng tích lũy vào pending_yield, gọi trước khi thay đổi tốc độ sản xuất"""
+        now = now or datetime.utcnow()
+        self.pending_yield = self.get_pending_yield(now)
+        self.last_settled_at = now
+        if self.accrual_rate is None:
+            self.refresh_accrual_rate()
+        return self.pending_yield
+    
+    def harvest_cooldown_remaining(self, now=None):
+        """Số giây còn lại trước khi được thu hoạch tiếp"""
+        if not self.last_harvested:
+            return 0
+        now = now or datetime.utcnow()
+        elapsed = (now - self.last_harvested).total_seconds()
+        return max(0, self.HARVEST_COOLDOWN_SECONDS - elapsed)
+    
     def get_total_power(self):
         """Tính tổng sức mạnh thế giới"""
         base_power = (self.world_level * 1000) + (self.spiritual_density * 10) + (self.resource_richness * 5)
@@ -237,8 +320,8 @@ class GuildWar(db.Model):
     
     # War results
     winner_guild_id = db.Column(db.Integer, db.ForeignKey('guild.id'))
-    casualties = db.Column(db.Text)  # JSON string
-    rewards = db.Column(db.Text)  # JSON string
+    casualties = db.Column(JSONType)
+    rewards = db.Column(JSONType)
 
 class Expedition(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -249,11 +332,12 @@ class Expedition(db.Model):
     destination = db.Column(db.String(100))
     difficulty_level = db.Column(db.Integer, default=1)
     max_participants = db.Column(db.Integer, default=5)
+    participant_count = db.Column(db.Integer, default=0, nullable=False)  # Cập nhật nguyên tử khi tham gia
     duration_hours = db.Column(db.Integer, default=24)
     
     # Requirements
     min_cultivation = db.Column(db.String(50))
-    required_items = db.Column(db.Text)  # JSON string
+    required_items = db.Column(JSONType)  # ["Bùa hộ mạng", ...]
     
     # Status
     status = db.Column(db.String(50), default="Tuyển Thành Viên")
@@ -261,14 +345,110 @@ class Expedition(db.Model):
     start_time = db.Column(db.DateTime)
     
     # Rewards
-    potential_rewards = db.Column(db.Text)  # JSON string
+    potential_rewards = db.Column(JSONType)  # {"spiritual_stones": 500, "dragon_scales": null, "other": [...]}
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     participants = db.relationship('ExpeditionParticipant', backref='expedition', lazy=True)
+    
+    @staticmethod
+    def normalize_items(raw):
+        """Chuẩn hóa required_items (JSON, văn bản phân tách bằng dấu phẩy) thành list"""
+        if isinstance(raw, str):
+            try:
+                raw = json.loads(raw)
+            except ValueError:
+                raw = raw.split(',')
+        if not raw:
+            return None
+        if isinstance(raw, dict):
+            raw = list(raw.keys())
+        if not isinstance(raw, list):
+            raw = [raw]
+        items = [str(item).strip() for item in raw if str(item).strip()]
+        return items or None
+    
+    @staticmethod
+    def normalize_rewards(raw):
+        """Chuẩn hóa potential_rewards thành {loại phần thưởng: số lượng hoặc None}"""
+        if isinstance(raw, str):
+            try:
+                raw = json.loads(raw)
+            except ValueError:
+                raw = raw.split(',')
+        if not raw:
+            return None
+        if isinstance(raw, dict):
+            entries = list(raw.items())
+        elif isinstance(raw, list):
+            entries = [(item, None) for item in raw]
+        else:
+            entries = [(raw, None)]
+        
+        rewards = {}
+        other = list(raw.get('other', [])) if isinstance(raw, dict) else []
+        for name, amount in entries:
+            name = str(name).strip()
+            if not name or name == 'other':
+                continue
+            lowered = name.lower()
+            reward_type = next((key for key, label in REWARD_TYPES.items()
+                                if lowered == key or label.lower() in lowered), None)
+            if reward_type is None:
+                other.append(name)
+                continue
+            rewards[reward_type] = int(amount) if isinstance(amount, (int, float)) and amount > 0 else None
+        
+        if other:
+            rewards['other'] = other
+        return rewards or None
+    
+    def get_reward_labels(self):
+        """Danh sách phần thưởng để hiển thị"""
+        rewards = self.potential_rewards or {}
+        labels = []
+        for reward_type, amount in rewards.items():
+            if reward_type == 'other':
+                labels.extend(amount)
+            else:
+                label = REWARD_TYPES.get(reward_type, reward_type)
+                labels.append(f"{label} x{amount}" if amount else label)
+        return labels
+    
+    @classmethod
+    def rewarding(cls, reward_type):
+        """Điều kiện lọc đạo lữ có phần thưởng loại reward_type (dùng chỉ mục JSON)"""
+        if reward_type not in REWARD_TYPES:
+            raise ValueError(f"Unknown reward type: {reward_type}")
+        if db.engine.dialect.name == 'postgresql':
+            return cls.potential_rewards.op('?')(reward_type)
+        # Đường dẫn JSON phải là hằng trong câu SQL (không phải tham số ?) thì SQLite mới
+        # khớp được với điều kiện WHERE của chỉ mục idx_expedition_reward_*
+        path = db.literal(f'$.{reward_type}', literal_execute=True)
+        return db.func.json_type(cls.potential_rewards, path).isnot(None)
+    
+    def get_end_time(self):
+        """Thời điểm kết thúc dự kiến (None nếu chưa có start_time)"""
+        if not self.start_time:
+            return None
+        return self.start_time + timedelta(hours=self.duration_hours or 24)
+    
+    def get_progress_percent(self, now=None):
+        """Tiến độ đạo lữ đang diễn ra, tính từ thời gian thực"""
+        end_time = self.get_end_time()
+        if not end_time:
+            return 0
+        now = now or datetime.utcnow()
+        total = (end_time - self.start_time).total_seconds()
+        elapsed = (now - self.start_time).total_seconds()
+        return max(0, min(100, int(elapsed / total * 100))) if total > 0 else 100
 
 class ExpeditionParticipant(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('expedition_id', 'user_id', name='uq_expedition_participant'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     expedition_id = db.Column(db.Integer, db.ForeignKey('expedition.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
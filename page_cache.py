@@ -0,0 +1,144 @@
+"""
+Full-page cache that varies by user class
+
+`@cache.cached` chỉ lấy path làm khóa, nên navbar (phụ thuộc đăng nhập) của một người có
+thể bị phục vụ cho người khác. PageCache khóa theo:
+
+- path + query string
+- lớp người dùng: 'anon' / 'user' / 'admin' (các lớp thấy cùng một khung trang)
+- phiên bản của path (purge) và phiên bản chung (purge_all)
+
+Dữ liệu riêng của từng người (tên trên navbar, dòng "Bạn" trong bảng xếp hạng...) đi qua
+"lỗ" (hole): template gọi `{{ page_hole('partials/nav_user.html') }}`; khi trang đang được
+cache, chỗ đó chỉ là một dấu đánh dấu, và mỗi response điền lại bằng cách render riêng
+template nhỏ đó cho người đang xem. Request có flash message thì bỏ qua cache.
+"""
+import re
+import threading
+from functools import wraps
+from flask import g, make_response, render_template, request, session
+from flask_login import current_user
+from markupsafe import Markup
+
+HOLE_RE = re.compile(r'<!--page-hole:([\w./-]+)-->')
+
+
+class PageCache:
+    """Path + user-class page cache with per-request holes and purge hooks"""
+
+    DEFAULT_TIMEOUT = 300
+    PREFIX = 'page:'
+
+    def __init__(self):
+        self.cache = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'bypassed': 0}
+
+    def init_app(self, app, cache):
+        self.cache = cache
+        app.jinja_env.globals['page_hole'] = self.hole
+
+    @staticmethod
+    def user_class():
+        # Chưa đăng nhập: không cần tải User; đã đăng nhập: principal đã cache sẵn
+        if not session.get('_user_id') or not current_user.is_authenticated:
+            return 'anon'
+        return 'admin' if current_user.is_admin else 'user'
+
+    def cached(self, timeout=None):
+        """Cache the view's HTML per (path, query, user class); personal bits go through page_hole"""
+        def decorator(view):
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                if request.method != 'GET' or session.get('_flashes') or self.cache is None:
+                    self._count('bypassed')
+                    return view(*args, **kwargs)
+
+                key = self._key(request.full_path, self.user_class())
+                body = self._get(key)
+                status = 'HIT'
+                if body is None:
+                    status = 'MISS'
+                    g.page_cache_rendering = True
+                    try:
+                        response = make_response(view(*args, **kwargs))
+                    finally:
+                        g.page_cache_rendering = False
+                    if response.status_code != 200 or response.direct_passthrough:
+                        self._count('bypassed')
+                        return response
+                    body = response.get_data(as_text=True)
+                    try:
+                        self.cache.set(key, body, timeout=timeout or self.DEFAULT_TIMEOUT)
+                    except Exception:
+                        pass
+
+                self._count('hits' if status == 'HIT' else 'misses')
+                response = make_response(self.fill_holes(body))
+                response.headers['X-Page-Cache'] = status
+                response.vary.add('Cookie')
+                return response
+
+            return wrapped
+        return decorator
+
+    def hole(self, template_name):
+        """Jinja helper: personal fragment, rendered per request even inside a cached page"""
+        if g.get('page_cache_rendering'):
+            return Markup(f'<!--page-hole:{template_name}-->')
+        return Markup(render_template(template_name))
+
+    def fill_holes(self, body):
+        if '<!--page-hole:' not in body:
+            return body
+        rendered = {}
+
+        def fill(match):
+            name = match.group(1)
+            if name not in rendered:
+                rendered[name] = render_template(name)
+            return rendered[name]
+
+        return HOLE_RE.sub(fill, body)
+
+    def purge(self, *paths):
+        """Drop cached pages for these paths (every query string and user class)"""
+        for path in paths:
+            self._bump(f'{self.PREFIX}version:{path}')
+
+    def purge_all(self):
+        self._bump(f'{self.PREFIX}generation')
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _key(self, full_path, user_class):
+        path = full_path.split('?', 1)[0]
+        try:
+            version, generation = self.cache.get_many(f'{self.PREFIX}version:{path}', f'{self.PREFIX}generation')
+        except Exception:
+            version = generation = None
+        return f'{self.PREFIX}{generation or 0}:{version or 0}:{user_class}:{full_path.rstrip("?")}'
+
+    def _get(self, key):
+        try:
+            return self.cache.get(key)
+        except Exception:
+            return None
+
+    def _bump(self, key):
+        if self.cache is None:
+            return
+        try:
+            self.cache.set(key, (self.cache.get(key) or 0) + 1, timeout=0)
+        except Exception:
+            pass
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+# Global page cache instance
+page_cache = PageCache()
@@ -1,7 +1,10 @@
 import os
 import json
-import requests
-from typing import Dict, Any, Optional
+import asyncio
+from typing import Dict, Any, Optional, Iterator, Union
+from http_client import ResilientHTTPClient, AsyncResilientHTTPClient, CircuitBreaker, UpstreamUnavailable
+from advice_cache import AdviceCache, bucket, normalize_text, make_key
+from single_flight import SingleFlight, AsyncSingleFlight
 
 class PerplexityManager:
     """
@@ -10,48 +13,208 @@ class PerplexityManager:
     
     def __init__(self):
         self.api_key = os.environ.get("PERPLEXITY_API_KEY")
-        self.base_url = "https://api.perplexity.ai/chat/completions"
+        self.base_url = os.environ.get("PERPLEXITY_BASE_URL", "https://api.perplexity.ai/chat/completions")
         self.model = "llama-3.1-sonar-small-128k-online"
         
+        # Pooled keep-alive client; a hung or failing upstream fails fast instead of pinning workers
+        self.client = ResilientHTTPClient(
+            connect_timeout=float(os.environ.get("PERPLEXITY_CONNECT_TIMEOUT", 3.05)),
+            read_timeout=float(os.environ.get("PERPLEXITY_READ_TIMEOUT", 20)),
+            max_concurrency=int(os.environ.get("PERPLEXITY_MAX_CONCURRENCY", 4)),
+            max_retries=int(os.environ.get("PERPLEXITY_MAX_RETRIES", 2)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.environ.get("PERPLEXITY_BREAKER_THRESHOLD", 5)),
+                reset_timeout=float(os.environ.get("PERPLEXITY_BREAKER_RESET", 30))
+            )
+        )
+        
+        # Semantic cache: similar game states share one answer (memory LRU + shared SQLite tier)
+        self.cache = AdviceCache(
+            max_entries=int(os.environ.get("PERPLEXITY_CACHE_SIZE", 1024)),
+            ttl=int(os.environ.get("PERPLEXITY_CACHE_TTL", 3600)),
+            path=os.environ.get("PERPLEXITY_CACHE_PATH", os.path.join("instance", "advice_cache.db")) or None
+        )
+        
+        # Identical in-flight prompts share one upstream call; optional file lock extends this across workers
+        cross_worker = os.environ.get("PERPLEXITY_CROSS_WORKER_LOCK", "false").lower() == "true"
+        self.flight = SingleFlight(
+            lock_dir=os.environ.get("PERPLEXITY_LOCK_DIR", os.path.join("instance", "ai_locks")) if cross_worker else None
+        )
+        
+        # asyncio client for the async chat server, created on first use inside its event loop
+        self.async_client = None
+        self.async_flight = AsyncSingleFlight()
+        
         if not self.api_key:
             print("Warning: PERPLEXITY_API_KEY not found. AI features will be disabled.")
     
+    def _build_request(self, messages: list, system_prompt: str = None, stream: bool = False):
+        """Payload and headers for a chat-completions call"""
+        # Prepare messages with system prompt if provided
+        formatted_messages = []
+        if system_prompt:
+            formatted_messages.append({
+                "role": "system",
+                "content": system_prompt
+            })
+        
+        formatted_messages.extend(messages)
+        
+        payload = {
+            "model": self.model,
+            "messages": formatted_messages,
+            "temperature": 0.2,
+            "max_tokens": 1000,
+            "stream": stream
+        }
+        
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        return payload, headers
+    
     def _make_request(self, messages: list, system_prompt: str = None) -> Optional[Dict[str, Any]]:
         """Make API request to Perplexity"""
+        if not self.api_key:
+            return None
+        
         try:
-            # Prepare messages with system prompt if provided
-            formatted_messages = []
-            if system_prompt:
-                formatted_messages.append({
-                    "role": "system",
-                    "content": system_prompt
-                })
-            
-            formatted_messages.extend(messages)
-            
-            payload = {
-                "model": self.model,
-                "messages": formatted_messages,
-                "temperature": 0.2,
-                "max_tokens": 1000,
-                "stream": False
-            }
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+            payload, headers = self._build_request(messages, system_prompt)
+            return self.client.post_json(self.base_url, payload, headers=headers)
             
-            response = requests.post(self.base_url, headers=headers, json=payload)
-            response.raise_for_status()
+        except UpstreamUnavailable as e:
+            print(f"Perplexity API unavailable: {e}")
+            return None
+        except Exception as e:
+            print(f"Perplexity API error: {e}")
+            return None
+    
+    def _stream_request(self, messages: list, system_prompt: str = None) -> Iterator[str]:
+        """Yield content deltas from a streamed Perplexity response; raises UpstreamUnavailable"""
+        if not self.api_key:
+            return
+        
+        payload, headers = self._build_request(messages, system_prompt, stream=True)
+        for event in self.client.stream_post(self.base_url, payload, headers=headers):
+            choices = event.get('choices') or [{}]
+            delta = (choices[0].get('delta') or {}).get('content')
+            if delta:
+                yield delta
+    
+    def _get_advice(self, kind: str, features: dict, query: str, system_prompt: str, fallback: str,
+                    stream: bool = False) -> Union[str, Iterator[str]]:
+        """Answer from the semantic cache, or ask Perplexity (once per key across concurrent callers)"""
+        if stream:
+            return self._stream_advice(kind, features, query, system_prompt, fallback)
+        
+        key = make_key(kind, features)
+        advice = self.cache.get(key)
+        if advice is not None:
+            return advice
+        
+        advice, _ = self.flight.do(key, lambda: self._fetch_advice(key, query, system_prompt))
+        return advice if advice is not None else fallback
+    
+    def _fetch_advice(self, key: str, query: str, system_prompt: str) -> Optional[str]:
+        """Single-flight leader: call upstream and fill the cache; None on failure"""
+        with self.flight.cross_worker_lock(key):
+            # Một caller khác (trong hoặc ngoài worker) có thể vừa điền cache
+            advice = self.cache.get(key, record=False)
+            if advice is not None:
+                return advice
             
-            return response.json()
+            messages = [{"role": "user", "content": query}]
+            response = self._make_request(messages, system_prompt)
             
+            if response and response.get('choices'):
+                advice = response['choices'][0]['message']['content']
+                self.cache.set(key, advice)
+                return advice
+            return None
+    
+    def _stream_advice(self, kind: str, features: dict, query: str, system_prompt: str, fallback: str) -> Iterator[str]:
+        """Yield advice chunks as they are generated; cached answers come back as one chunk"""
+        key = make_key(kind, features)
+        advice = self.cache.get(key)
+        if advice is not None:
+            yield advice
+            return
+        
+        # Các caller cùng câu hỏi dùng chung một stream upstream, nhận từng chunk cùng lúc
+        chunks = self.flight.stream(key, lambda: self._stream_upstream(key, query, system_prompt))
+        sent = False
+        try:
+            for chunk in chunks:
+                sent = True
+                yield chunk
+        except UpstreamUnavailable as e:
+            print(f"Perplexity API unavailable: {e}")
         except Exception as e:
             print(f"Perplexity API error: {e}")
+        finally:
+            chunks.close()
+        
+        if not sent:
+            yield fallback
+    
+    def _stream_upstream(self, key: str, query: str, system_prompt: str) -> Iterator[str]:
+        """Single-flight stream leader: yield upstream chunks, cache the answer once complete"""
+        parts = []
+        for chunk in self._stream_request([{"role": "user", "content": query}], system_prompt):
+            parts.append(chunk)
+            yield chunk
+        if parts:
+            # Chỉ tới được đây khi stream trọn vẹn: không cache câu trả lời bị đứt giữa chừng
+            self.cache.set(key, ''.join(parts))
+    
+    def _get_async_client(self) -> AsyncResilientHTTPClient:
+        if self.async_client is None:
+            self.async_client = AsyncResilientHTTPClient(
+                connect_timeout=float(os.environ.get("PERPLEXITY_CONNECT_TIMEOUT", 3.05)),
+                read_timeout=float(os.environ.get("PERPLEXITY_READ_TIMEOUT", 20)),
+                max_concurrency=int(os.environ.get("PERPLEXITY_ASYNC_MAX_CONCURRENCY", 256)),
+                max_retries=int(os.environ.get("PERPLEXITY_MAX_RETRIES", 2)),
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.environ.get("PERPLEXITY_BREAKER_THRESHOLD", 5)),
+                    reset_timeout=float(os.environ.get("PERPLEXITY_BREAKER_RESET", 30))
+                )
+            )
+        return self.async_client
+    
+    async def _get_advice_async(self, kind: str, features: dict, query: str, system_prompt: str, fallback: str) -> str:
+        """Async _get_advice: cache I/O runs in a thread, the upstream call on the event loop"""
+        key = make_key(kind, features)
+        advice = await asyncio.to_thread(self.cache.get, key)
+        if advice is not None:
+            return advice
+        
+        advice, _ = await self.async_flight.do(key, lambda: self._fetch_advice_async(key, query, system_prompt))
+        return advice if advice is not None else fallback
+    
+    async def _fetch_advice_async(self, key: str, query: str, system_prompt: str) -> Optional[str]:
+        if not self.api_key:
             return None
+        
+        payload, headers = self._build_request([{"role": "user", "content": query}], system_prompt)
+        try:
+            response = await self._get_async_client().post_json(self.base_url, payload, headers=headers)
+        except UpstreamUnavailable as e:
+            print(f"Perplexity API unavailable: {e}")
+            return None
+        
+        if response and response.get('choices'):
+            advice = response['choices'][0]['message']['content']
+            await asyncio.to_thread(self.cache.set, key, advice)
+            return advice
+        return None
     
-    def get_cultivation_advice(self, user_data: dict) -> str:
+    async def close_async(self):
+        """Close the asyncio client (async chat server shutdown)"""
+        if self.async_client is not None:
+            await self.async_client.close()
+    
+    def get_cultivation_advice(self, user_data: dict, stream: bool = False) -> Union[str, Iterator[str]]:
         """Get cultivation strategy advice based on user's current status"""
         system_prompt = """Bạn là một vị Tiên sư chuyên gia về tu luyện trong thế giới Tu Tiên. 
         Hãy đưa ra lời khuyên chiến lược về tu luyện, phát triển nhân vật dựa trên thông tin hiện tại.
@@ -75,27 +238,28 @@ class PerplexityManager:
         3. Có lời khuyên gì về việc phân bổ thời gian tu luyện?
         """
         
-        messages = [{"role": "user", "content": query}]
-        response = self._make_request(messages, system_prompt)
-        
-        if response and response.get('choices'):
-            return response['choices'][0]['message']['content']
-        else:
-            return "Tiên sư hiện tại không thể truyền đạt được. Hãy thử lại sau!"
+        features = {
+            'level': current_level,
+            'power': bucket(spiritual_power),
+            'stones': bucket(resources['spiritual_stones']),
+            'pills': bucket(resources['pills']),
+            'artifacts': bucket(resources['artifacts'])
+        }
+        return self._get_advice('cultivation', features, query, system_prompt,
+                                "Tiên sư hiện tại không thể truyền đạt được. Hãy thử lại sau!", stream=stream)
     
-    def get_guild_management_advice(self, guild_data: dict, user_role: str) -> str:
+    def get_guild_management_advice(self, guild_data: dict, user_role: str, stream: bool = False) -> Union[str, Iterator[str]]:
         """Get guild management advice"""
         system_prompt = """Bạn là một vị Trưởng lão am hiểu về quản lý bang hội trong thế giới Tu Tiên.
         Đưa ra lời khuyên về quản lý bang hội, phát triển tổ chức, và chiến lược hợp tác.
         Trả lời bằng tiếng Việt với phong cách cổ điển tu tiên."""
         
-        guild_name = guild_data.get('name', 'Unknown Guild')
         member_count = guild_data.get('member_count', 0)
         guild_level = guild_data.get('level', 1)
         treasury = guild_data.get('treasury', 0)
         
         query = f"""
-        Bang hội {guild_name} hiện có {member_count} thành viên, cấp độ {guild_level}, kho bạc {treasury} linh thạch.
+        Bang hội của ta hiện có {member_count} thành viên, cấp độ {guild_level}, kho bạc {treasury} linh thạch.
         Ta đang giữ vai trò {user_role} trong bang hội.
         
         Hãy tư vấn về:
@@ -105,15 +269,16 @@ class PerplexityManager:
         4. Hoạt động nào nên ưu tiên để nâng cao uy tín bang hội
         """
         
-        messages = [{"role": "user", "content": query}]
-        response = self._make_request(messages, system_prompt)
-        
-        if response and response.get('choices'):
-            return response['choices'][0]['message']['content']
-        else:
-            return "Trưởng lão hiện tại đang tĩnh tâm. Hãy thử lại sau!"
+        features = {
+            'level': guild_level,
+            'members': bucket(member_count),
+            'treasury': bucket(treasury),
+            'role': user_role
+        }
+        return self._get_advice('guild', features, query, system_prompt,
+                                "Trưởng lão hiện tại đang tĩnh tâm. Hãy thử lại sau!", stream=stream)
     
-    def get_expedition_advice(self, expedition_data: dict, context: str = "planning") -> str:
+    def get_expedition_advice(self, expedition_data: dict, context: str = "planning", stream: bool = False) -> Union[str, Iterator[str]]:
         """Get expedition planning and coordination advice"""
         system_prompt = """Bạn là một vị Đạo trưởng dày dặn kinh nghiệm trong việc tổ chức và dẫn dắt các cuộc đạo lữ.
         Đưa ra lời khuyên về lập kế hoạch, tổ chức và điều phối đạo lữ an toàn hiệu quả.
@@ -143,15 +308,20 @@ class PerplexityManager:
             Cần lời khuyên về quản lý và điều phối đoàn đạo lữ đang diễn ra.
             """
         
-        messages = [{"role": "user", "content": query}]
-        response = self._make_request(messages, system_prompt)
-        
-        if response and response.get('choices'):
-            return response['choices'][0]['message']['content']
-        else:
-            return "Đạo trưởng hiện đang nhập định. Hãy thử lại sau!"
+        features = {
+            'context': context,
+            'destination': normalize_text(expedition_data.get('destination')),
+            'difficulty': expedition_data.get('difficulty_level', 1),
+            'duration': bucket(expedition_data.get('duration_hours', 24)),
+            'max_participants': expedition_data.get('max_participants', 5),
+            'min_cultivation': expedition_data.get('min_cultivation'),
+            'participants': len(expedition_data.get('participants', [])),
+            'name': expedition_data.get('name') if context != "planning" else None
+        }
+        return self._get_advice('expedition', features, query, system_prompt,
+                                "Đạo trưởng hiện đang nhập định. Hãy thử lại sau!", stream=stream)
     
-    def get_resource_optimization_advice(self, user_resources: dict, goals: list = None) -> str:
+    def get_resource_optimization_advice(self, user_resources: dict, goals: list = None, stream: bool = False) -> Union[str, Iterator[str]]:
         """Get resource management and optimization advice"""
         system_prompt = """Bạn là một vị Quản lý kho bạc cao cấp, chuyên gia về tối ưu hóa tài nguyên trong tu tiên.
         Đưa ra lời khuyên về quản lý tài chính, đầu tư và tối ưu hóa tài nguyên.
@@ -186,16 +356,27 @@ class PerplexityManager:
         4. Cách cân bằng giữa chi tiêu hiện tại và tích lũy tương lai
         """
         
-        messages = [{"role": "user", "content": query}]
-        response = self._make_request(messages, system_prompt)
-        
-        if response and response.get('choices'):
-            return response['choices'][0]['message']['content']
-        else:
-            return "Quản lý kho bạc đang kiểm kê. Hãy thử lại sau!"
+        features = {
+            'stones': bucket(resources['spiritual_stones']),
+            'pills': bucket(resources['pills']),
+            'artifacts': bucket(resources['artifacts']),
+            'mining_level': resources['mining_level'],
+            'points': bucket(resources['cultivation_points']),
+            'goals': sorted(normalize_text(g) for g in goals) if goals and isinstance(goals, list) else []
+        }
+        return self._get_advice('resources', features, query, system_prompt,
+                                "Quản lý kho bạc đang kiểm kê. Hãy thử lại sau!", stream=stream)
     
-    def get_general_advice(self, question: str, context: dict = None) -> str:
+    def get_general_advice(self, question: str, context: dict = None, stream: bool = False) -> Union[str, Iterator[str]]:
         """Get general Tu Tiên world advice"""
+        return self._get_advice(*self._general_advice_request(question, context), stream=stream)
+    
+    async def get_general_advice_async(self, question: str, context: dict = None) -> str:
+        """get_general_advice for asyncio callers"""
+        return await self._get_advice_async(*self._general_advice_request(question, context))
+    
+    def _general_advice_request(self, question: str, context: dict = None):
+        """(kind, features, query, system_prompt, fallback) for a general question"""
         system_prompt = """Bạn là một vị Tiên nhân uyên bác, am hiểu mọi việc trong thế giới Tu Tiên.
         Trả lời các câu hỏi về thế giới tu tiên, cốt truyện, và cuộc sống trong cộng đồng tu tiên.
         Luôn trả lời bằng tiếng Việt với phong cách cổ điển, uy nghiêm nhưng thân thiện."""
@@ -206,13 +387,12 @@ class PerplexityManager:
         
         full_query = f"{question}{context_info}"
         
-        messages = [{"role": "user", "content": full_query}]
-        response = self._make_request(messages, system_prompt)
-        
-        if response and response.get('choices'):
-            return response['choices'][0]['message']['content']
-        else:
-            return "Tiên nhân hiện tại không thể đáp ứng. Hãy thử lại sau!"
+        features = {
+            'question': normalize_text(question),
+            'context': context if isinstance(context, dict) else None
+        }
+        return ('general', features, full_query, system_prompt,
+                "Tiên nhân hiện tại không thể đáp ứng. Hãy thử lại sau!")
 
 # Global instance
 perplexity_manager = PerplexityManager()
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""
+Cached user principal for Flask-Login
+
+load_user trước đây chạy `User.query.get(id)` (tải cả dòng ~30 cột) ở mọi request đã đăng
+nhập, kể cả các endpoint JSON được poll liên tục. Giờ current_user là một UserPrincipal:
+
+- chỉ chứa id, username, is_admin, guild_id và các trường tài nguyên hay đọc (__slots__)
+- ảnh chụp các trường này được cache trong từng worker với TTL ngắn, nên request đọc
+  không chạm CSDL để xác thực
+- truy cập trường khác, quan hệ, phương thức, hoặc GHI bất kỳ trường nào sẽ tải dòng User
+  đầy đủ (lazy) và thao tác trên dòng đó như trước
+- commit có thay đổi User (kể cả UPDATE hàng loạt) làm mất hiệu lực cache; số phiên bản
+  (version stamp) nằm trong cache dùng chung nên worker khác cũng thấy khi backend cache
+  dùng chung (Redis...), còn không thì TTL giới hạn độ trễ
+"""
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+PRINCIPAL_FIELDS = (
+    'id', 'username', 'is_admin', 'guild_id',
+    'cultivation_level', 'spiritual_power', 'cultivation_points',
+    'spiritual_stones', 'pills_count', 'artifacts_count',
+    'mining_level', 'mining_experience', 'reputation', 'karma_points'
+)
+
+
+class UserPrincipal:
+    """Read-mostly stand-in for the logged-in User; loads the ORM row only when needed"""
+
+    __slots__ = ('_values', '_row')
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, values, row=None):
+        object.__setattr__(self, '_values', values)
+        object.__setattr__(self, '_row', row)
+
+    def get_id(self):
+        return str(self._values[0])
+
+    def load(self):
+        """The full User row (loaded on first use, then kept for the request)"""
+        row = self._row
+        if row is None:
+            from app import db
+            from models import User
+            row = db.session.get(User, self._values[0])
+            object.__setattr__(self, '_row', row)
+        return row
+
+    @property
+    def is_loaded(self):
+        return self._row is not None
+
+    def fingerprint(self):
+        """Version of the principal fields (changes whenever any of them changes), for cache keys"""
+        # crc32 thay vì hash(): giống nhau giữa các worker (hash chuỗi bị ngẫu nhiên hóa theo process)
+        return format(zlib.crc32(repr(tuple(getattr(self, name) for name in PRINCIPAL_FIELDS)).encode()), 'x')
+
+    def __getattr__(self, name):
+        # Chỉ được gọi cho thuộc tính không có trong principal: quan hệ, phương thức, cột ít dùng
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name, value):
+        if hasattr(type(self), name):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.load(), name, value)
+
+    def __eq__(self, other):
+        other_id = getattr(other, 'id', None)
+        return other_id is not None and other_id == self._values[0]
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self._values[0])
+
+    def __repr__(self):
+        return f'<UserPrincipal {self._values[1]}>'
+
+
+def _field(index, name):
+    """Read from the loaded row if any (it may have been changed), else the cached snapshot; writes go to the row"""
+    def getter(self):
+        row = self._row
+        return getattr(row, name) if row is not None else self._values[index]
+
+    def setter(self, value):
+        setattr(self.load(), name, value)
+
+    return property(getter, setter)
+
+
+for _index, _name in enumerate(PRINCIPAL_FIELDS):
+    setattr(UserPrincipal, _name, _field(_index, _name))
+
+
+def read_only(view):
+    """Mark a POST view that never writes current_user, so it keeps using the cached principal"""
+    view.principal_read_only = True
+    return view
+
+
+class PrincipalCache:
+    """Per-worker LRU of principal snapshots with TTL and shared version stamps"""
+
+    TTL = 5.0
+    MAX_ENTRIES = 5000
+    VERSION_TIMEOUT = 3600
+
+    def __init__(self):
+        self.cache = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (values, loaded_at, user_version, generation)
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._listening = False
+
+    def init_app(self, app, cache=None):
+        """Configure TTL/size and hook invalidation into every SQLAlchemy commit"""
+        self.cache = cache
+        self.TTL = app.config.get('PRINCIPAL_CACHE_TTL', self.TTL)
+        self.MAX_ENTRIES = app.config.get('PRINCIPAL_CACHE_SIZE', self.MAX_ENTRIES)
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            event.listen(Session, 'do_orm_execute', self._on_execute)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_rollback', self._after_rollback)
+            self._listening = True
+
+    def load(self, user_id, fresh=False):
+        """UserPrincipal for user_id from the cache, or from a narrow SELECT; None if the user is gone
+
+        fresh=True (request ghi: POST/PUT/...) bỏ qua cache và tải luôn dòng User đầy đủ, để
+        các phép `current_user.x += ...` không bao giờ cộng dồn lên một ảnh chụp cũ.
+        """
+        if fresh:
+            return self._load_row(user_id)
+
+        user_versions = self._versions(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] < self.TTL and entry[2:] == user_versions:
+                self._entries.move_to_end(user_id)
+                self.stats['hits'] += 1
+                return UserPrincipal(entry[0])
+            self.stats['misses'] += 1
+
+        from app import db
+        from models import User
+        values = db.session.query(*(getattr(User, name) for name in PRINCIPAL_FIELDS)).filter(
+            User.id == user_id
+        ).first()
+        if values is None:
+            self.invalidate(user_id)
+            return None
+
+        values = tuple(values)
+        with self._lock:
+            self._entries[user_id] = (values, now) + user_versions
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+        return UserPrincipal(values)
+
+    def _load_row(self, user_id):
+        from app import db
+        from models import User
+        row = db.session.get(User, user_id)
+        if row is None:
+            self.invalidate(user_id)
+            return None
+        return UserPrincipal(tuple(getattr(row, name) for name in PRINCIPAL_FIELDS), row)
+
+    def invalidate(self, *user_ids):
+        """Drop cached principals and bump their shared version stamps"""
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+            self.stats['invalidations'] += len(user_ids)
+        if self.cache is not None:
+            for user_id in user_ids:
+                self._bump(f'principal_version:{user_id}')
+
+    def invalidate_all(self):
+        """Drop every cached principal (after bulk UPDATE/DELETE on users)"""
+        with self._lock:
+            self.stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+        if self.cache is not None:
+            self._bump('principal_generation')
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+        return stats
+
+    def _versions(self, user_id):
+        if self.cache is None:
+            return (0, 0)
+        try:
+            version, generation = self.cache.get_many(f'principal_version:{user_id}', 'principal_generation')
+        except Exception:
+            return (0, 0)
+        return (version or 0, generation or 0)
+
+    def _bump(self, key):
+        try:
+            self.cache.set(key, (self.cache.get(key) or 0) + 1, timeout=self.VERSION_TIMEOUT)
+        except Exception:
+            pass
+
+    # --- SQLAlchemy session hooks ---
+
+    def _after_flush(self, session, flush_context):
+        from models import User
+        changed = [obj.id for obj in (*session.new, *session.dirty, *session.deleted)
+                   if isinstance(obj, User) and obj.id is not None]
+        if changed:
+            session.info.setdefault('principal_dirty', set()).update(changed)
+
+    def _on_execute(self, orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete:
+            from models import User
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None and mapper.class_ is User:
+                orm_execute_state.session.info['principal_all'] = True
+
+    def _after_commit(self, session):
+        dirty = session.info.pop('principal_dirty', None)
+        if session.info.pop('principal_all', False):
+            self.invalidate_all()
+        elif dirty:
+            self.invalidate(*dirty)
+
+    def _after_rollback(self, session):
+        session.info.pop('principal_dirty', None)
+        session.info.pop('principal_all', None)
+
+
+# Global cache instance
+principal_cache = PrincipalCache()
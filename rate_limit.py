@@ -0,0 +1,161 @@
+"""
+Per-route, per-user rate limiting for game actions
+
+Các action (tu luyện, khám phá, thu hoạch, chat, AI...) trước đây không giới hạn, client
+chạy vòng lặp gọi liên tục và mỗi lần tốn một lượt tải User + commit. Decorator
+`rate_limiter.limit(rate, per)` từ chối bằng 429 + Retry-After TRƯỚC khi chạm CSDL:
+
+- danh tính lấy từ cookie phiên (`_user_id` kèm dấu tài khoản ghi lúc đăng nhập, vì id bị dùng
+  lại sau khi xóa tài khoản), chưa đăng nhập thì theo IP; không tải User
+- backend 'memory' (mặc định): cửa sổ trượt trong từng worker, O(1) mỗi lần gọi
+- backend 'cache': token bucket trong cache dùng chung, giới hạn chung cho mọi worker
+
+Đặt decorator TRÊN @login_required để nó chạy trước cả load_user.
+"""
+import threading
+import time
+from collections import deque
+from functools import wraps
+from flask import jsonify, request, session
+
+
+class RateLimiter:
+    """Declarative per-route limits: in-memory sliding windows or a shared-cache token bucket"""
+
+    PURGE_EVERY = 1000  # số lần gọi giữa hai lần dọn cửa sổ đã hết hạn
+    ACCOUNT_KEY = '_rl_account'  # khóa trong session giữ dấu tài khoản
+
+    def __init__(self, backend='memory', cache=None, clock=time.monotonic):
+        self.backend = backend
+        self.cache = cache
+        self.enabled = True
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._windows = {}  # (scope, identity) -> deque các mốc thời gian
+        self._periods = {}  # scope -> per (để biết khi nào cửa sổ hết hạn)
+        self._calls = 0
+        self.stats = {}  # scope -> {'allowed': n, 'limited': n}
+
+    def init_app(self, app, cache=None):
+        self.cache = cache
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        self.backend = app.config.get('RATE_LIMIT_BACKEND', self.backend)
+        if self.backend == 'cache':
+            # Token bucket dùng chung cần đồng hồ thực, giống nhau giữa các worker
+            self._clock = time.time
+
+    def limit(self, rate, per=60, scope=None):
+        """Allow `rate` calls per `per` seconds for each user on the decorated view"""
+        def decorator(view):
+            name = scope or view.__name__
+
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                if self.enabled:
+                    retry_after = self.hit(name, self.identity(), rate, per)
+                    if retry_after:
+                        return self.too_many_requests(retry_after)
+                return view(*args, **kwargs)
+
+            return wrapped
+        return decorator
+
+    @classmethod
+    def identity(cls):
+        return cls.identity_for(session, request.remote_addr)
+
+    @classmethod
+    def identity_for(cls, session_data, remote_addr):
+        """Limit key for a decoded Flask session (also used by the aiohttp chat server)"""
+        user_id = session_data.get('_user_id')
+        if not user_id:
+            return f'ip:{remote_addr}'
+        # SQLite dùng lại id của tài khoản đã xóa: dấu tài khoản tách cửa sổ của hai tài khoản cùng id
+        account = session_data.get(cls.ACCOUNT_KEY)
+        return f'u:{user_id}:{account}' if account else f'u:{user_id}'
+
+    @classmethod
+    def remember_account(cls, user):
+        """Store a per-account stamp in the session at login (id + creation time never repeat)"""
+        if user.created_at is not None:
+            session[cls.ACCOUNT_KEY] = format(int(user.created_at.timestamp() * 1_000_000), 'x')
+
+    def reset(self):
+        """Drop every in-memory window (tests and tools that delete users whose ids get reused)"""
+        with self._lock:
+            self._windows.clear()
+
+    def hit(self, scope, identity, rate, per):
+        """Record one call; seconds until the next call is allowed if over the limit (0 = allowed)"""
+        if self.backend == 'cache' and self.cache is not None:
+            retry_after = self._hit_bucket(scope, identity, rate, per)
+        else:
+            retry_after = self._hit_window(scope, identity, rate, per)
+
+        with self._lock:
+            counts = self.stats.setdefault(scope, {'allowed': 0, 'limited': 0})
+            counts['limited' if retry_after else 'allowed'] += 1
+        return retry_after
+
+    @staticmethod
+    def too_many_requests(retry_after):
+        seconds = max(1, int(retry_after + 0.999))
+        response = jsonify({
+            'success': False,
+            'error': f'Thao tác quá nhanh, hãy thử lại sau {seconds} giây!',
+            'retry_after': seconds
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = str(seconds)
+        return response
+
+    def get_stats(self):
+        with self._lock:
+            stats = {scope: dict(counts) for scope, counts in self.stats.items()}
+            stats['tracked_windows'] = len(self._windows)
+        stats['backend'] = self.backend
+        return stats
+
+    def _hit_window(self, scope, identity, rate, per):
+        now = self._clock()
+        with self._lock:
+            key = (scope, identity)
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = deque(maxlen=rate)
+                self._periods[scope] = per
+            if len(window) == rate and window[0] > now - per:
+                return window[0] + per - now
+            window.append(now)
+
+            self._calls += 1
+            if self._calls % self.PURGE_EVERY == 0:
+                self._purge(now)
+        return 0
+
+    def _purge(self, now):
+        expired = [key for key, window in self._windows.items()
+                   if not window or window[-1] <= now - self._periods.get(key[0], 0)]
+        for key in expired:
+            del self._windows[key]
+
+    def _hit_bucket(self, scope, identity, rate, per):
+        key = f'ratelimit:{scope}:{identity}'
+        refill = rate / per  # token mỗi giây
+        now = self._clock()
+        try:
+            tokens, updated = self.cache.get(key) or (rate, now)
+        except Exception:
+            return 0
+        tokens = min(rate, tokens + (now - updated) * refill)
+        if tokens < 1:
+            return (1 - tokens) / refill
+        try:
+            self.cache.set(key, (tokens - 1, now), timeout=int(per) + 1)
+        except Exception:
+            pass
+        return 0
+
+
+# Global rate limiter instance
+rate_limiter = RateLimiter()
@@ -1,16 +1,29 @@
 # Added guild management APIs for settings, war declarations, and member recruitment.
-from flask import render_template, request, redirect, url_for, flash, jsonify, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, session, abort, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import json
 import random
+import time
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
 
 from app import app, db, cache
-from models import User, Guild, World, GuildWar, Expedition, ExpeditionParticipant, ChatMessage, Achievement
+from models import User, Guild, World, GuildWar, Expedition, ExpeditionParticipant, ChatMessage, Achievement, REWARD_TYPES
 from db_optimizer import DatabaseOptimizer
+from world_conquest import ConquestManager, conquest_queue
+from expedition_scheduler import expedition_scheduler, STATUS_RECRUITING
+from job_queue import job_queue, JobLimitExceeded, PRIORITY_BULK
 from ai_helper import cultivation_ai
 from ai_tutien_girl import get_ai_response, get_ai_status
+from login_security import password_policy, login_throttle, MAX_PASSWORD_LENGTH
+from principal import principal_cache, read_only
+from rate_limit import rate_limiter
+from fragment_cache import fragment_cache
+from page_cache import page_cache
+from compression import compressor
+from sync import change_counters, sync_hub, changed_values, was_modified
 
 # Import Perplexity AI helper
 try:
@@ -25,7 +38,7 @@ except Exception as e:
     PERPLEXITY_AVAILABLE = False
 
 @app.route('/')
-@cache.cached(timeout=300)  # Cache for 5 minutes
+@page_cache.cached(timeout=300)  # Cache for 5 minutes, riêng cho khách / người chơi / admin
 def index():
     # Get optimized statistics using DatabaseOptimizer
     user_stats = DatabaseOptimizer.get_user_stats(db, cache)
@@ -53,13 +66,29 @@ def auth():
             username = request.form.get('username')
             password = request.form.get('password')
 
+            # Chặn sớm: quá nhiều lần sai thì không truy vấn User, không chạy hàm băm
+            retry_after = login_throttle.check(request.remote_addr, username)
+            if retry_after:
+                flash(f'Đăng nhập sai quá nhiều lần, hãy thử lại sau {retry_after // 60 + 1} phút!', 'error')
+                response = app.make_response((render_template('auth.html'), 429))
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+
             user = User.query.filter_by(username=username).first()
 
             if user and user.check_password(password):
+                if password_policy.needs_rehash(user.password_hash):
+                    # Nâng hash cũ lên chi phí hiện tại khi còn giữ mật khẩu gốc
+                    user.set_password(password)
+                    db.session.commit()
+                    password_policy.record_rehash()
+                login_throttle.reset(username)
                 login_user(user)
+                rate_limiter.remember_account(user)
                 flash('Đăng nhập thành công!', 'success')
                 return redirect(url_for('dashboard'))
             else:
+                login_throttle.record_failure(request.remote_addr, username)
                 flash('Tên đăng nhập hoặc mật khẩu không đúng!', 'error')
 
         elif action == 'register':
@@ -68,7 +97,9 @@ def auth():
             password = request.form.get('password')
             dao_name = request.form.get('dao_name', '')
 
-            if User.query.filter_by(username=username).first():
+            if len(password or '') > MAX_PASSWORD_LENGTH:
+                flash(f'Mật khẩu quá dài (tối đa {MAX_PASSWORD_LENGTH} ký tự)!', 'error')
+            elif User.query.filter_by(username=username).first():
                 flash('Tên đăng nhập đã tồn tại!', 'error')
             elif User.query.filter_by(email=email).first():
                 flash('Email đã được sử dụng!', 'error')
@@ -77,6 +108,7 @@ def auth():
                 user.set_password(password)
                 db.session.add(user)
                 db.session.commit()
+                page_cache.purge('/')
 
                 flash('Đăng ký thành công! Hãy đăng nhập.', 'success')
                 return redirect(url_for('auth'))
@@ -93,36 +125,35 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # AI predictions and advice
-    fortune = cultivation_ai.predict_cultivation_fortune(current_user)
-    advice = cultivation_ai.get_cultivation_advice(current_user)
-    weather = cultivation_ai.get_weather_forecast()
-
     # User's guild info
-    guild = current_user.guild
-
-    # Recent activities
-    recent_messages = ChatMessage.query.filter_by(channel='general').order_by(ChatMessage.created_at.desc()).limit(10).all()
+    guild = db.session.get(Guild, current_user.guild_id) if current_user.guild_id else None
 
-    # Available expeditions
-    available_expeditions = Expedition.query.filter_by(status='Tuyển Thành Viên').limit(5).all()
+    # Owned worlds summary (cached, no relationship load)
+    world_summary = DatabaseOptimizer.get_owned_world_summary(db, cache, current_user.id)
 
-    return render_template('dashboard.html', 
-                         fortune=fortune, 
-                         advice=advice, 
-                         weather=weather,
+    # Các phần còn lại là fragment cache trong template; loader chỉ chạy khi fragment miss
+    return render_template('dashboard.html',
+                         world_summary=world_summary,
                          guild=guild,
-                         recent_messages=recent_messages,
-                         available_expeditions=available_expeditions)
+                         today=cultivation_ai.game_day(),
+                         fortune_inputs=cultivation_ai.fortune_inputs(current_user),
+                         user_version=current_user.fingerprint(),
+                         load_fortune=lambda: cultivation_ai.predict_cultivation_fortune(current_user),
+                         load_advice=lambda: cultivation_ai.get_cultivation_advice(current_user),
+                         load_weather=cultivation_ai.get_weather_forecast,
+                         load_recent_messages=lambda: ChatMessage.query.filter_by(channel='general').order_by(ChatMessage.created_at.desc()).limit(10).all(),
+                         load_expeditions=lambda: Expedition.query.filter_by(status='Tuyển Thành Viên').limit(5).all())
 
 @app.route('/world-management')
 @login_required
 def world_management():
-    owned_worlds = current_user.owned_worlds
+    world_summary = DatabaseOptimizer.get_owned_world_summary(db, cache, current_user.id)
+    owned_worlds = World.query.filter_by(owner_id=current_user.id).all()
     available_worlds = World.query.filter_by(owner_id=None).all()
     contested_worlds = World.query.filter_by(is_contested=True).all()
 
     return render_template('world_management.html', 
+                         world_summary=world_summary,
                          owned_worlds=owned_worlds,
                          available_worlds=available_worlds,
                          contested_worlds=contested_worlds)
@@ -136,35 +167,38 @@ def guild_management():
     # Guild wars
     active_wars = GuildWar.query.filter_by(status='Đang Diễn Ra').all()
 
-    # War predictions if user is guild leader
-    war_predictions = []
-    if user_guild and user_guild.leader_id == current_user.id:
-        for guild in all_guilds:
-            if guild.id != user_guild.id:
-                prediction = cultivation_ai.calculate_guild_war_prediction(user_guild, guild)
-                prediction['target_guild'] = guild
-                war_predictions.append(prediction)
-
+    # Dự đoán chiến tranh được tính ở job nền, trang tự tải qua /api/refresh-war-predictions
     return render_template('guild_management.html',
                          user_guild=user_guild,
                          all_guilds=all_guilds,
-                         active_wars=active_wars,
-                         war_predictions=war_predictions)
+                         active_wars=active_wars)
 
 @app.route('/expeditions')
 @login_required
 def expeditions():
-    available_expeditions = Expedition.query.filter_by(status='Tuyển Thành Viên').all()
-    active_expeditions = Expedition.query.filter_by(status='Đang Diễn Ra').all()
+    available_query = Expedition.query.filter_by(status='Tuyển Thành Viên')
+    active_query = Expedition.query.filter_by(status='Đang Diễn Ra')
+
+    # Lọc theo loại phần thưởng (?reward=dragon_scales) bằng chỉ mục JSON
+    reward_filter = request.args.get('reward')
+    if reward_filter in REWARD_TYPES:
+        available_query = available_query.filter(Expedition.rewarding(reward_filter))
+        active_query = active_query.filter(Expedition.rewarding(reward_filter))
+
+    available_expeditions = available_query.all()
+    active_expeditions = active_query.all()
     user_expeditions = Expedition.query.join(ExpeditionParticipant).filter(ExpeditionParticipant.user_id == current_user.id).all()
 
     return render_template('expeditions.html',
                          available_expeditions=available_expeditions,
                          active_expeditions=active_expeditions,
-                         user_expeditions=user_expeditions)
+                         user_expeditions=user_expeditions,
+                         reward_types=REWARD_TYPES,
+                         reward_filter=reward_filter)
 
 @app.route('/rankings')
 @login_required
+@page_cache.cached(timeout=60)
 def rankings():
     # Different ranking categories
     power_rankings = User.query.order_by(User.spiritual_power.desc()).limit(50).all()
@@ -207,6 +241,7 @@ def profile():
 
 # API Routes
 @app.route('/api/cultivate', methods=['POST'])
+@rate_limiter.limit(30, per=60)
 @login_required
 def cultivate():
     # Simple cultivation system with bounds checking
@@ -289,6 +324,7 @@ def cultivate():
     })
 
 @app.route('/api/mine-stones', methods=['POST'])
+@rate_limiter.limit(10, per=60)  # chặn vòng lặp; hồi chiêu 2 giờ vẫn là luật game bên dưới
 @login_required
 def mine_stones():
     # Admin users can mine without cooldown
@@ -358,8 +394,10 @@ def create_world_free():
         spiritual_density=random.randint(40, 80),
         danger_level=random.randint(1, 3),
         resource_richness=random.randint(30, 70),
-        spiritual_stones_production=random.randint(100, 300)
+        spiritual_stones_production=random.randint(100, 300),
+        last_settled_at=datetime.utcnow()
     )
+    world.refresh_accrual_rate()
 
     # Mark free opening as used
     current_user.free_world_opening_used = True
@@ -367,6 +405,7 @@ def create_world_free():
     try:
         db.session.add(world)
         db.session.commit()
+        DatabaseOptimizer.invalidate_owned_world_summary(cache, current_user.id)
 
         return jsonify({
             'success': True, 
@@ -383,14 +422,35 @@ def create_world_free():
         db.session.rollback()
         return jsonify({'success': False, 'error': 'Lỗi khi tạo thế giới. Vui lòng thử lại!'})
 
+def get_owned_world(world_id):
+    """Tải thế giới thuộc sở hữu của current_user, trả về (world, error_response)"""
+    summary = DatabaseOptimizer.get_owned_world_summary(db, cache, current_user.id)
+    
+    if world_id not in summary['ids']:
+        # Probe chỉ mục (id, owner_id) thay vì tải toàn bộ hàng World
+        exists, owner_id = DatabaseOptimizer.get_world_owner_id(db, world_id)
+        if not exists:
+            abort(404)
+        if owner_id != current_user.id:
+            return None, jsonify({'success': False, 'error': 'Bạn không sở hữu thế giới này!'})
+        # Summary đã cũ (vd. worker khác vừa cập nhật)
+        DatabaseOptimizer.invalidate_owned_world_summary(cache, current_user.id)
+    
+    world = db.session.get(World, world_id)
+    if world is None or world.owner_id != current_user.id:
+        # Summary của cả người chơi này lẫn chủ hiện tại (nếu có) đều có thể đã cũ
+        DatabaseOptimizer.invalidate_owned_world_summary(cache, current_user.id, world.owner_id if world else None)
+        return None, jsonify({'success': False, 'error': 'Bạn không sở hữu thế giới này!'})
+    
+    return world, None
+
 @app.route('/api/explore-world/<int:world_id>', methods=['POST'])
+@rate_limiter.limit(20, per=60)
 @login_required
 def explore_world(world_id):
-    world = World.query.get_or_404(world_id)
-
-    # Check if user owns the world
-    if world.owner_id != current_user.id:
-        return jsonify({'success': False, 'error': 'Bạn không sở hữu thế giới này!'})
+    world, error = get_owned_world(world_id)
+    if error:
+        return error
 
     # Check energy requirement
     energy_cost = world.danger_level * 50
@@ -435,11 +495,9 @@ def explore_world(world_id):
 @app.route('/api/upgrade-world/<int:world_id>', methods=['POST'])
 @login_required
 def upgrade_world(world_id):
-    world = World.query.get_or_404(world_id)
-
-    # Check if user owns the world
-    if world.owner_id != current_user.id:
-        return jsonify({'success': False, 'error': 'Bạn không sở hữu thế giới này!'})
+    world, error = get_owned_world(world_id)
+    if error:
+        return error
 
     # Validate JSON request
     if not request.json:
@@ -456,6 +514,9 @@ def upgrade_world(world_id):
     upgrade_success = True
     
     try:
+        # Chốt sản lượng theo tốc độ cũ trước khi nâng cấp thay đổi tốc độ
+        world.settle()
+        
         if upgrade_type == 'spiritual_density':
             if world.spiritual_density >= 100:
                 return jsonify({'success': False, 'error': 'Mật độ linh khí đã đạt tối đa!'})
@@ -559,7 +620,9 @@ def upgrade_world(world_id):
             world.world_experience = 0
             world.stability = min(100, world.stability + 10)
 
+        world.refresh_accrual_rate()
         db.session.commit()
+        DatabaseOptimizer.invalidate_owned_world_summary(cache, current_user.id)
 
         return jsonify({
             'success': True,
@@ -592,7 +655,9 @@ def mining():
     return render_template('mining.html')
 
 @app.route('/api/send-message', methods=['POST'])
+@rate_limiter.limit(10, per=30)
 @login_required
+@read_only
 def send_message():
     # Validate JSON request
     if not request.json:
@@ -614,25 +679,31 @@ def send_message():
 
     db.session.add(message)
     db.session.commit()
+    if channel == 'general':
+        fragment_cache.invalidate('dashboard_recent_chat')
 
     return jsonify({'success': True})
 
 @app.route('/api/join-expedition/<int:expedition_id>', methods=['POST'])
 @login_required
 def join_expedition(expedition_id):
-    expedition = Expedition.query.get_or_404(expedition_id)
-
-    # Check if already joined
-    existing = ExpeditionParticipant.query.filter_by(
-        expedition_id=expedition_id,
-        user_id=current_user.id
-    ).first()
-
-    if existing:
-        return jsonify({'success': False, 'error': 'Bạn đã tham gia đạo lữ này rồi!'})
+    # Giữ chỗ nguyên tử: chỉ tăng khi còn tuyển và còn chỗ trống, không tải danh sách thành viên.
+    # Kiểm tra trạng thái trong cùng WHERE: scheduler có thể vừa chuyển đạo lữ sang Đang Diễn Ra
+    result = db.session.execute(
+        update(Expedition)
+        .where(Expedition.id == expedition_id, Expedition.status == STATUS_RECRUITING,
+               Expedition.participant_count < Expedition.max_participants)
+        .values(participant_count=Expedition.participant_count + 1)
+        .execution_options(synchronize_session=False)
+    )
 
-    # Check requirements
-    if len(expedition.participants) >= expedition.max_participants:
+    if result.rowcount != 1:
+        db.session.rollback()
+        status = db.session.query(Expedition.status).filter_by(id=expedition_id).scalar()
+        if status is None:
+            abort(404)
+        if status != STATUS_RECRUITING:
+            return jsonify({'success': False, 'error': 'Đạo lữ không còn tuyển thành viên!'})
         return jsonify({'success': False, 'error': 'Đạo lữ đã đủ thành viên!'})
 
     participant = ExpeditionParticipant(
@@ -640,9 +711,15 @@ def join_expedition(expedition_id):
         user_id=current_user.id
     )
 
-    db.session.add(participant)
-    db.session.commit()
+    try:
+        db.session.add(participant)
+        db.session.commit()
+    except IntegrityError:
+        # Ràng buộc unique (expedition_id, user_id); rollback cũng hoàn lại chỗ đã giữ
+        db.session.rollback()
+        return jsonify({'success': False, 'error': 'Bạn đã tham gia đạo lữ này rồi!'})
 
+    fragment_cache.invalidate('dashboard_expeditions')
     return jsonify({'success': True, 'message': 'Tham gia đạo lữ thành công!'})
 
 @app.route('/api/create-guild', methods=['POST'])
@@ -686,6 +763,7 @@ def create_guild():
         # Update user's guild
         current_user.guild_id = guild.id
         db.session.commit()
+        page_cache.purge('/', '/rankings')
 
         return jsonify({'success': True, 'message': 'Tạo bang hội thành công!'})
     except Exception as e:
@@ -724,9 +802,10 @@ def create_expedition():
         max_participants=max(1, min(10, int(data.get('max_participants', 5)))),
         duration_hours=max(1, min(168, int(data.get('duration_hours', 24)))),
         min_cultivation=data.get('min_cultivation'),
-        required_items=data.get('required_items'),
-        potential_rewards=data.get('potential_rewards'),
-        organizer_guild_id=current_user.guild_id
+        required_items=Expedition.normalize_items(data.get('required_items')),
+        potential_rewards=Expedition.normalize_rewards(data.get('potential_rewards')),
+        organizer_guild_id=current_user.guild_id,
+        start_time=datetime.utcnow() + timedelta(hours=expedition_scheduler.RECRUITMENT_HOURS)
     )
 
     # Admin users don't pay the cost
@@ -740,6 +819,8 @@ def create_expedition():
 
         db.session.add(expedition)
         db.session.commit()
+        expedition_scheduler.schedule(expedition)
+        fragment_cache.invalidate('dashboard_expeditions')
 
         return jsonify({'success': True, 'message': 'Tạo đạo lữ thành công!'})
     except (ValueError, TypeError) as e:
@@ -825,7 +906,10 @@ def upgrade_test_account():
 def get_messages():
     channel = request.args.get('channel', 'general')
     channel_id = request.args.get('channel_id')
+    return jsonify({'success': True, 'messages': recent_messages(channel, channel_id)})
 
+def recent_messages(channel, channel_id=None):
+    """20 tin nhắn mới nhất của một kênh"""
     query = ChatMessage.query.filter_by(channel=channel)
     if channel_id:
         query = query.filter_by(channel_id=channel_id)
@@ -841,15 +925,239 @@ def get_messages():
             'user_name': msg.user.dao_name or msg.user.username,
             'created_at': msg.created_at.isoformat()
         })
+    return message_list
+
+# ========================
+# CLIENT SYNC (/api/sync)
+# ========================
+
+# Dòng nào đổi thì bộ đếm nào tăng (xem sync.py)
+change_counters.track(
+    User,
+    lambda user: [('user', user.id)] + (
+        [('guild', guild_id) for guild_id in changed_values(user, 'guild_id')]
+        if was_modified(user, 'guild_id', 'cultivation_level', 'dao_name') else []),
+    resources=('user', 'guild'))
+change_counters.track(Guild, lambda guild: [('guild', guild.id)], resources=('guild',))
+change_counters.track(
+    GuildWar, lambda war: [('guild', war.guild_id), ('guild', war.target_guild_id)], resources=('guild',))
+change_counters.track(
+    World, lambda world: [('worlds', owner_id) for owner_id in changed_values(world, 'owner_id')],
+    resources=('worlds',))
+change_counters.track(Expedition, lambda expedition: [('expeditions',)], resources=('expeditions',))
+DatabaseOptimizer.track_owned_world_summaries(cache)
+change_counters.track(ExpeditionParticipant, lambda participant: [('expeditions',)], resources=('expeditions',))
+change_counters.track(
+    ChatMessage, lambda message: [('messages', message.channel or 'general')], resources=('messages',))
+
+@sync_hub.section('user', lambda params: ('user', current_user.id))
+def sync_user(params):
+    # Toàn bộ là trường của principal: không truy vấn CSDL
+    return {field: getattr(current_user, field) for field in (
+        'cultivation_level', 'spiritual_power', 'cultivation_points', 'spiritual_stones',
+        'pills_count', 'artifacts_count', 'reputation', 'karma_points')}
+
+@sync_hub.section('messages', lambda params: ('messages', str(params.get('channel') or 'general')))
+def sync_messages(params):
+    return recent_messages(str(params.get('channel') or 'general'), params.get('channel_id'))
+
+@sync_hub.section('guild', lambda params: ('guild', current_user.guild_id) if current_user.guild_id else None)
+def sync_guild(params):
+    guild = db.session.get(Guild, current_user.guild_id)
+    if guild is None:
+        return None
+    members = User.query.filter_by(guild_id=guild.id).order_by(User.id).all()
+    wars = GuildWar.query.filter(
+        (GuildWar.guild_id == guild.id) | (GuildWar.target_guild_id == guild.id),
+        GuildWar.status == 'Đang Diễn Ra'
+    ).all()
+    war_targets = {war.id: war.target_guild_id if war.guild_id == guild.id else war.guild_id for war in wars}
+    names = dict(db.session.query(Guild.id, Guild.name).filter(Guild.id.in_(set(war_targets.values())))) if wars else {}
+    return {
+        'guild': {
+            'id': guild.id,
+            'name': guild.name,
+            'description': guild.description,
+            'level': guild.level,
+            'experience': guild.experience,
+            'treasury': guild.treasury or 0,
+            'territory_count': guild.territory_count,
+            'recruitment_open': guild.recruitment_open,
+            'member_count': len(members)
+        },
+        'members': [{
+            'id': member.id,
+            'username': member.username,
+            'dao_name': member.dao_name,
+            'cultivation_level': member.cultivation_level,
+            'role': 'Leader' if member.id == guild.leader_id else 'Thành viên'
+        } for member in members],
+        'wars': [{
+            'id': war.id,
+            'war_type': war.war_type,
+            'target_guild_name': names.get(war_targets[war.id]),
+            'status': war.status,
+            'start_time': war.start_time.isoformat() if war.start_time else None
+        } for war in wars]
+    }
+
+@sync_hub.section('worlds', lambda params: ('worlds', current_user.id))
+def sync_worlds(params):
+    worlds = World.query.filter_by(owner_id=current_user.id).order_by(World.id).all()
+    return {'owned_worlds': [{
+        'id': world.id,
+        'name': world.name,
+        'world_type': world.world_type,
+        'world_level': world.world_level or 1,
+        'spiritual_density': world.spiritual_density or 50,
+        'danger_level': world.danger_level or 1,
+        'description': world.description,
+        'spiritual_stones_production': world.spiritual_stones_production or 100
+    } for world in worlds]}
+
+@sync_hub.section('expeditions', lambda params: ('expeditions',))
+def sync_expeditions(params):
+    expeditions = Expedition.query.filter(
+        Expedition.status.in_(('Tuyển Thành Viên', 'Đang Diễn Ra'))
+    ).order_by(Expedition.id).all()
+    result = []
+    for expedition in expeditions:
+        end_time = expedition.get_end_time()
+        result.append({
+            'id': expedition.id,
+            'name': expedition.name,
+            'status': expedition.status,
+            'participant_count': expedition.participant_count,
+            'max_participants': expedition.max_participants,
+            'start_time': expedition.start_time.isoformat() + 'Z' if expedition.start_time else None,
+            'end_time': end_time.isoformat() + 'Z' if end_time else None
+        })
+    return result
+
+@app.route('/api/sync', methods=['POST'])
+@rate_limiter.limit(30, per=60, scope='sync')
+@login_required
+@read_only
+def api_sync():
+    """Một request thay cho các vòng poll riêng: chỉ trả các mục đã đổi so với phiên bản client giữ"""
+    payload = request.get_json(silent=True) or {}
+    subscriptions = payload.get('sections')
+    if not isinstance(subscriptions, dict):
+        return jsonify({'success': False, 'error': 'Thiếu danh sách mục cần đồng bộ'}), 400
 
-    return jsonify({'success': True, 'messages': message_list})
+    return jsonify({
+        'success': True,
+        'interval': sync_hub.INTERVAL,
+        'max_interval': sync_hub.MAX_INTERVAL,
+        'sections': sync_hub.sync(subscriptions)
+    })
 
 # ========================
 # PERPLEXITY AI ROUTES
 # ========================
 
+def wants_event_stream():
+    """Client asked for Server-Sent Events (Accept: text/event-stream or ?stream=1)"""
+    return request.args.get('stream') == '1' or request.accept_mimetypes.best == 'text/event-stream'
+
+def sse_event(data, event=None):
+    """Format one SSE frame"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_response(chunks, done_payload, meta=None):
+    """Stream text chunks as SSE; closing the response (client gone) closes the upstream stream"""
+    def generate():
+        try:
+            if meta is not None:
+                yield sse_event(meta, event='meta')
+            for chunk in chunks:
+                yield sse_event({'delta': chunk})
+            yield sse_event(done_payload, event='done')
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close:
+                close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def wants_async():
+    """Run the call as a background job when the client asks for it (Prefer: respond-async or ?async=1),
+    or by default (AI_ADVICE_ASYNC) unless it accepts an SSE stream; ?async=0 keeps it inline"""
+    if not app.config.get('JOB_QUEUE_ENABLED', True) or request.args.get('async') == '0':
+        return False
+    if request.args.get('async') == '1' or 'respond-async' in request.headers.get('Prefer', ''):
+        return True
+    # Client đọc được SSE: stream trực tiếp để chữ đầu tiên hiện ngay, không poll job
+    return app.config.get('AI_ADVICE_ASYNC', True) and not wants_event_stream()
+
+def job_accepted(job_id):
+    """202 response pointing at the job status endpoint"""
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('api_job_status', job_id=job_id)
+    }), 202
+
+def job_limit_response():
+    return jsonify({
+        'success': False,
+        'error': 'Bạn đang có quá nhiều yêu cầu đang xử lý, hãy chờ một chút!'
+    }), 429
+
+# Các phương thức PerplexityManager được phép chạy qua job nền
+AI_ADVICE_METHODS = {
+    'get_cultivation_advice',
+    'get_guild_management_advice',
+    'get_expedition_advice',
+    'get_resource_optimization_advice',
+    'get_general_advice'
+}
+
+# Khoảng cách tối thiểu giữa hai lần ghi phần lời khuyên đã sinh ra vào job (giây)
+AI_ADVICE_PROGRESS_INTERVAL = 0.5
+
+@job_queue.task('ai_advice')
+def run_ai_advice_job(method, args):
+    """Background job: one Perplexity advice call, streamed so pollers see the partial answer"""
+    if method not in AI_ADVICE_METHODS or not perplexity_manager:
+        raise ValueError(f"AI advice method unavailable: {method}")
+    advice = ''
+    reported_at = time.monotonic()
+    for chunk in getattr(perplexity_manager, method)(*args, stream=True):
+        advice += chunk
+        if time.monotonic() - reported_at >= AI_ADVICE_PROGRESS_INTERVAL:
+            job_queue.report_progress({'advice': advice})
+            reported_at = time.monotonic()
+    return {'advice': advice}
+
+def ai_advice_response(method, args, advice_type, **extra):
+    """A job id to poll (default), or inline JSON advice / an SSE token stream with ?async=0"""
+    if perplexity_manager and wants_async():
+        try:
+            job_id = job_queue.enqueue('ai_advice', {'method': method, 'args': list(args)},
+                                       user_id=current_user.id)
+        except JobLimitExceeded:
+            return job_limit_response()
+        return job_accepted(job_id)
+
+    stream = wants_event_stream()
+    if perplexity_manager:
+        advice = getattr(perplexity_manager, method)(*args, stream=stream)
+    else:
+        advice = "AI hỗ trợ chưa sẵn sàng!"
+        if stream:
+            advice = iter([advice])
+
+    if stream:
+        return sse_response(advice, dict(success=True, type=advice_type, **extra))
+    return jsonify(dict(success=True, advice=advice, type=advice_type, **extra))
+
 @app.route('/api/ai/cultivation-advice', methods=['POST'])
+@rate_limiter.limit(10, per=60, scope='ai_advice')  # chung cho mọi route tư vấn AI
 @login_required
+@read_only
 def ai_cultivation_advice():
     """Get AI cultivation strategy advice"""
     if not PERPLEXITY_AVAILABLE:
@@ -868,16 +1176,7 @@ def ai_cultivation_advice():
             'cultivation_points': current_user.cultivation_points
         }
 
-        if perplexity_manager:
-            advice = perplexity_manager.get_cultivation_advice(user_data)
-        else:
-            advice = "AI hỗ trợ chưa sẵn sàng!"
-
-        return jsonify({
-            'success': True,
-            'advice': advice,
-            'type': 'cultivation'
-        })
+        return ai_advice_response('get_cultivation_advice', (user_data,), 'cultivation')
 
     except Exception as e:
         return jsonify({
@@ -886,7 +1185,9 @@ def ai_cultivation_advice():
         })
 
 @app.route('/api/ai/guild-management', methods=['POST'])
+@rate_limiter.limit(10, per=60, scope='ai_advice')  # chung cho mọi route tư vấn AI
 @login_required
+@read_only
 def ai_guild_management():
     """Get AI guild management advice"""
     if not PERPLEXITY_AVAILABLE:
@@ -915,16 +1216,7 @@ def ai_guild_management():
 
         user_role = "Bang Chủ" if guild.leader_id == current_user.id else "Thành Viên"
 
-        if perplexity_manager:
-            advice = perplexity_manager.get_guild_management_advice(guild_data, user_role)
-        else:
-            advice = "AI hỗ trợ chưa sẵn sàng!"
-
-        return jsonify({
-            'success': True,
-            'advice': advice,
-            'type': 'guild_management'
-        })
+        return ai_advice_response('get_guild_management_advice', (guild_data, user_role), 'guild_management')
 
     except Exception as e:
         return jsonify({
@@ -933,7 +1225,9 @@ def ai_guild_management():
         })
 
 @app.route('/api/ai/expedition-advice', methods=['POST'])
+@rate_limiter.limit(10, per=60, scope='ai_advice')  # chung cho mọi route tư vấn AI
 @login_required
+@read_only
 def ai_expedition_advice():
     """Get AI expedition planning advice"""
     if not PERPLEXITY_AVAILABLE:
@@ -956,7 +1250,7 @@ def ai_expedition_advice():
                 'name': expedition.name,
                 'destination': expedition.destination,
                 'status': expedition.status,
-                'participants': expedition.participants
+                'participants': [participant.user_id for participant in expedition.participants]
             }
             context = 'ongoing'
         else:
@@ -971,16 +1265,7 @@ def ai_expedition_advice():
                     'min_cultivation': current_user.cultivation_level
                 }
 
-        if perplexity_manager:
-            advice = perplexity_manager.get_expedition_advice(expedition_data, context)
-        else:
-            advice = "AI hỗ trợ chưa sẵn sàng!"
-
-        return jsonify({
-            'success': True,
-            'advice': advice,
-            'type': 'expedition'
-        })
+        return ai_advice_response('get_expedition_advice', (expedition_data, context), 'expedition')
 
     except Exception as e:
         return jsonify({
@@ -989,7 +1274,9 @@ def ai_expedition_advice():
         })
 
 @app.route('/api/ai/resource-optimization', methods=['POST'])
+@rate_limiter.limit(10, per=60, scope='ai_advice')  # chung cho mọi route tư vấn AI
 @login_required
+@read_only
 def ai_resource_optimization():
     """Get AI resource management advice"""
     if not PERPLEXITY_AVAILABLE:
@@ -1010,16 +1297,7 @@ def ai_resource_optimization():
 
         goals = request.json.get('goals', []) if request.json else []
 
-        if perplexity_manager:
-            advice = perplexity_manager.get_resource_optimization_advice(user_resources, goals)
-        else:
-            advice = "AI hỗ trợ chưa sẵn sàng!"
-
-        return jsonify({
-            'success': True,
-            'advice': advice,
-            'type': 'resources'
-        })
+        return ai_advice_response('get_resource_optimization_advice', (user_resources, goals), 'resources')
 
     except Exception as e:
         return jsonify({
@@ -1028,7 +1306,9 @@ def ai_resource_optimization():
         })
 
 @app.route('/api/ai/general', methods=['POST'])
+@rate_limiter.limit(10, per=60, scope='ai_advice')  # chung cho mọi route tư vấn AI
 @login_required
+@read_only
 def ai_general_advice():
     """Get general AI advice about Tu Tiên world"""
     if not PERPLEXITY_AVAILABLE:
@@ -1053,17 +1333,7 @@ def ai_general_advice():
             'guild': Guild.query.get(current_user.guild_id).name if current_user.guild_id else None
         }
 
-        if perplexity_manager:
-            advice = perplexity_manager.get_general_advice(question, context)
-        else:
-            advice = "AI hỗ trợ chưa sẵn sàng!"
-
-        return jsonify({
-            'success': True,
-            'advice': advice,
-            'type': 'general',
-            'question': question
-        })
+        return ai_advice_response('get_general_advice', (question, context), 'general', question=question)
 
     except Exception as e:
         return jsonify({
@@ -1418,6 +1688,14 @@ def handle_join_request():
     """Xử lý yêu cầu gia nhập bang hội (placeholder)"""
     return jsonify({'success': True, 'message': 'Tính năng sẽ được phát triển!'})
 
+def conquest_requirement_error(user, conquest_cost, power_requirement):
+    """Thông báo lỗi nếu người chơi chưa đủ linh thạch / linh lực để chinh phục, ngược lại None"""
+    if (user.spiritual_stones or 0) < conquest_cost:
+        return f'Cần {conquest_cost} linh thạch để chinh phục!'
+    if (user.spiritual_power or 0) < power_requirement:
+        return f'Cần {power_requirement} linh lực để chinh phục!'
+    return None
+
 @app.route('/api/conquer-world/<int:world_id>', methods=['POST'])
 @login_required
 def conquer_world(world_id):
@@ -1433,97 +1711,134 @@ def conquer_world(world_id):
     conquest_cost = max(5000, world_power // 2)
     power_requirement = world_power
     
-    # Kiểm tra điều kiện
-    if current_user.spiritual_stones < conquest_cost:
-        return jsonify({'success': False, 'error': f'Cần {conquest_cost} linh thạch để chinh phục!'})
+    # Kiểm tra nhanh trước khi xếp hàng; số dư được kiểm tra lại sau khi chốt quyền sở hữu
+    error = conquest_requirement_error(current_user, conquest_cost, power_requirement)
+    if error:
+        return jsonify({'success': False, 'error': error})
     
-    if current_user.spiritual_power < power_requirement:
-        return jsonify({'success': False, 'error': f'Cần {power_requirement} linh lực để chinh phục!'})
+    # Kết thúc transaction đọc trước khi xếp hàng để không giữ khóa SQLite khi chờ
+    db.session.rollback()
     
-    try:
-        # Trừ chi phí
-        current_user.spiritual_stones -= conquest_cost
-        current_user.spiritual_power -= power_requirement // 3  # Mất 1/3 sức mạnh do chiến đấu
-        
-        # Chuyển quyền sở hữu
-        world.owner_id = current_user.id
-        world.is_contested = False
-        world.last_attacked = datetime.utcnow()
-        
-        # Bonus chinh phục
-        world.spiritual_stones_production += 50
-        world.stability = max(50, world.stability - 20)  # Giảm ổn định sau chinh phục
-        
-        # Thêm achievement
-        achievement = Achievement(
-            user_id=current_user.id,
-            title=f"Chinh Phục {world.name}",
-            description=f"Đã chinh phục thành công thế giới {world.name} với sức mạnh {world_power}",
-            category="conquest",
-            rarity="epic" if world_power > 10000 else "rare"
-        )
-        db.session.add(achievement)
-        
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'message': f'Đã chinh phục {world.name}! Chi phí: {conquest_cost:,} linh thạch',
-            'world': {
-                'name': world.name,
-                'production': world.spiritual_stones_production,
-                'total_power': world.get_total_power()
-            }
-        })
+    with conquest_queue.slot(world_id) as slot:
+        if not slot.acquired:
+            return jsonify({'success': False, 'error': 'Thế giới đang bị tranh chấp quyết liệt, hãy thử lại sau!'})
         
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'success': False, 'error': 'Lỗi khi chinh phục thế giới!'})
+        try:
+            if slot.contended:
+                ConquestManager.mark_contested(db, world_id)
+            
+            # Chốt quyền sở hữu nguyên tử, chỉ một người thắng
+            world = ConquestManager.claim_world(db, world_id, current_user.id)
+            if world is None:
+                db.session.rollback()
+                return jsonify({'success': False, 'error': 'Thế giới vừa bị người khác chinh phục!'})
+            
+            # Số dư có thể đã đổi trong lúc chờ: đọc lại hàng User (đã khóa) rồi mới kiểm tra và trừ
+            user = ConquestManager.lock_user(db, current_user.id)
+            error = conquest_requirement_error(user, conquest_cost, power_requirement)
+            if error:
+                db.session.rollback()
+                return jsonify({'success': False, 'error': error})
+            
+            # Trừ chi phí
+            user.spiritual_stones -= conquest_cost
+            user.spiritual_power -= power_requirement // 3  # Mất 1/3 sức mạnh do chiến đấu
+            
+            # Bonus chinh phục
+            world.spiritual_stones_production += 50
+            world.stability = max(50, world.stability - 20)  # Giảm ổn định sau chinh phục
+            
+            # Chủ mới bắt đầu tích lũy sản lượng từ thời điểm chinh phục
+            world.pending_yield = 0.0
+            world.last_settled_at = world.last_attacked
+            world.refresh_accrual_rate()
+            
+            # Thêm achievement
+            achievement = Achievement(
+                user_id=current_user.id,
+                title=f"Chinh Phục {world.name}",
+                description=f"Đã chinh phục thành công thế giới {world.name} với sức mạnh {world_power}",
+                category="conquest",
+                rarity="epic" if world_power > 10000 else "rare"
+            )
+            db.session.add(achievement)
+            
+            db.session.commit()
+            DatabaseOptimizer.invalidate_owned_world_summary(cache, current_user.id)
+            
+            return jsonify({
+                'success': True,
+                'message': f'Đã chinh phục {world.name}! Chi phí: {conquest_cost:,} linh thạch',
+                'world': {
+                    'name': world.name,
+                    'production': world.spiritual_stones_production,
+                    'total_power': world.get_total_power()
+                }
+            })
+            
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Lỗi khi chinh phục thế giới!'})
 
 @app.route('/api/harvest-world/<int:world_id>', methods=['POST'])
+@rate_limiter.limit(20, per=60)
 @login_required
 def harvest_world(world_id):
     """Thu hoạch tài nguyên từ thế giới"""
-    world = World.query.get_or_404(world_id)
+    world, error = get_owned_world(world_id)
+    if error:
+        return error
     
-    if world.owner_id != current_user.id:
-        return jsonify({'success': False, 'error': 'Bạn không sở hữu thế giới này!'})
+    now = datetime.utcnow()
+    cooldown = world.harvest_cooldown_remaining(now)
+    if cooldown > 0:
+        return jsonify({
+            'success': False,
+            'error': f'Còn {int(cooldown // 60) + 1} phút nữa mới có thể thu hoạch tiếp!',
+            'cooldown': cooldown
+        })
     
     try:
-        # Tính toán tài nguyên thu hoạch
-        base_harvest = world.daily_income or world.spiritual_stones_production
+        # Tính sản lượng tích lũy từ hàng đã tải (không ghi vào đối tượng ORM), thu phần nguyên, giữ phần lẻ
+        pending = world.get_pending_yield(now)
+        rate = world.accrual_rate if world.accrual_rate is not None else world.compute_accrual_rate()
+        total_harvest = int(pending)
         
-        # Bonus từ các tính năng đặc biệt
-        multiplier = 1.0
-        if world.resource_multiplication:
-            multiplier *= 2.0
-        if world.time_acceleration:
-            multiplier *= 1.5
-        if world.market_level > 0:
-            multiplier *= (1 + world.market_level * 0.1)
-        
-        total_harvest = int(base_harvest * multiplier)
+        if total_harvest <= 0:
+            return jsonify({'success': False, 'error': 'Thế giới chưa tích lũy đủ tài nguyên để thu hoạch!'})
         
         # Thu hoạch tài nguyên đặc biệt
         special_resources = {}
         if world.resource_richness >= 80:
             special_resources['spiritual_herbs'] = random.randint(1, world.resource_richness // 20)
-            world.spiritual_herbs += special_resources['spiritual_herbs']
         
         if world.spiritual_density >= 90:
             special_resources['essence_crystals'] = random.randint(1, world.spiritual_density // 30)
-            world.essence_crystals += special_resources['essence_crystals']
         
         if world.world_level >= 5:
             special_resources['ancient_artifacts'] = random.randint(0, world.world_level // 5)
-            world.ancient_artifacts += special_resources['ancient_artifacts']
         
-        # Cập nhật tài nguyên người chơi
-        current_user.spiritual_stones += total_harvest
+        # Chốt nguyên tử: chỉ một lần thu hoạch khớp được hồi chiêu và mốc chốt đã đọc. Hai cú click
+        # đồng thời cùng qua kiểm tra ở trên nhưng chỉ một UPDATE trúng hàng. Chạy trên connection để
+        # không kích hoạt hook bulk của sync (mục 'worlds' không hiển thị các cột này).
+        cooldown_cutoff = now - timedelta(seconds=World.HARVEST_COOLDOWN_SECONDS)
+        result = db.session.connection().execute(
+            update(World)
+            .where(World.id == world.id, World.owner_id == current_user.id,
+                   or_(World.last_harvested.is_(None), World.last_harvested <= cooldown_cutoff),
+                   World.last_settled_at.is_not_distinct_from(world.last_settled_at))
+            .values(last_harvested=now, last_settled_at=now, pending_yield=pending - total_harvest,
+                    accrual_rate=rate,
+                    world_experience=World.world_experience + 10,
+                    special_events_count=World.special_events_count + 1,
+                    **{name: getattr(World, name) + amount for name, amount in special_resources.items()})
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Thế giới vừa được thu hoạch, hãy thử lại sau!'})
         
-        # Cập nhật thống kê thế giới
-        world.world_experience += 10
-        world.special_events_count += 1
+        # Cộng linh thạch trong SQL (UPDATE ... SET spiritual_stones = spiritual_stones + n)
+        current_user.spiritual_stones = User.spiritual_stones + total_harvest
         
         db.session.commit()
         
@@ -1534,7 +1849,8 @@ def harvest_world(world_id):
                 'spiritual_stones': total_harvest,
                 'special_resources': special_resources
             },
-            'multiplier': multiplier
+            'hourly_rate': round(rate, 2),
+            'multiplier': round(world.get_production_multiplier(), 2)
         })
         
     except Exception as e:
@@ -1545,10 +1861,9 @@ def harvest_world(world_id):
 @login_required
 def activate_world_ability(world_id):
     """Kích hoạt khả năng đặc biệt của thế giới"""
-    world = World.query.get_or_404(world_id)
-    
-    if world.owner_id != current_user.id:
-        return jsonify({'success': False, 'error': 'Bạn không sở hữu thế giới này!'})
+    world, error = get_owned_world(world_id)
+    if error:
+        return error
     
     data = request.json or {}
     ability_type = data.get('ability_type')
@@ -1607,47 +1922,102 @@ def refresh_war_predictions():
         return jsonify({'success': False, 'error': 'Chỉ bang chủ mới có thể xem dự đoán chiến tranh!'})
 
     try:
-        all_guilds = Guild.query.filter(Guild.id != guild.id).all()
-        predictions = []
+        job_id = job_queue.enqueue('guild_war_predictions', {'guild_id': guild.id},
+                                   user_id=current_user.id, priority=PRIORITY_BULK,
+                                   dedupe_key=f'war_predictions:{guild.id}')
+    except JobLimitExceeded:
+        return job_limit_response()
+    return job_accepted(job_id)
+
+@job_queue.task('guild_war_predictions')
+def compute_war_predictions(guild_id):
+    """Background job: win predictions against every other guild, top 5 by win probability"""
+    # Tổng linh lực của mọi bang hội trong một truy vấn, thay vì tải thành viên từng bang
+    power_rows = db.session.query(
+        User.guild_id, db.func.coalesce(db.func.sum(User.spiritual_power), 0)
+    ).filter(User.guild_id.isnot(None)).group_by(User.guild_id).all()
+    power_by_guild = dict(power_rows)
+    my_power = power_by_guild.get(guild_id, 0)
+
+    predictions = []
+    for target_id, target_name in db.session.query(Guild.id, Guild.name).filter(Guild.id != guild_id):
+        target_power = power_by_guild.get(target_id, 0)
+        if target_power > 0:
+            win_probability = min(95, max(5, int((my_power / target_power) * 50)))
+        else:
+            win_probability = 95
+
+        predictions.append({
+            'target_guild_id': target_id,
+            'target_guild_name': target_name,
+            'win_probability': win_probability,
+            'duration_days': random.randint(1, 7),
+            'casualty_estimate': 'Thấp' if win_probability > 70 else 'Trung Bình' if win_probability > 40 else 'Cao'
+        })
 
-        for target_guild in all_guilds:
-            # Tính toán dự đoán đơn giản
-            my_power = sum(member.spiritual_power or 0 for member in guild.members)
-            target_power = sum(member.spiritual_power or 0 for member in target_guild.members)
+    # Sắp xếp theo tỷ lệ thắng
+    predictions.sort(key=lambda x: x['win_probability'], reverse=True)
+    return {'predictions': predictions[:5]}  # Chỉ trả về 5 dự đoán hàng đầu
 
-            if target_power > 0:
-                win_probability = min(95, max(5, int((my_power / target_power) * 50)))
-            else:
-                win_probability = 95
-
-            prediction = {
-                'target_guild_id': target_guild.id,
-                'target_guild_name': target_guild.name,
-                'win_probability': win_probability,
-                'duration_days': random.randint(1, 7),
-                'casualty_estimate': 'Thấp' if win_probability > 70 else 'Trung Bình' if win_probability > 40 else 'Cao'
-            }
-            predictions.append(prediction)
+# ========================
+# BACKGROUND JOB ROUTES
+# ========================
 
-        # Sắp xếp theo tỷ lệ thắng
-        predictions.sort(key=lambda x: x['win_probability'], reverse=True)
+@app.route('/api/jobs', methods=['GET'])
+@login_required
+def api_jobs():
+    """Các job gần đây của người chơi"""
+    return jsonify({'success': True, 'jobs': job_queue.list_for_user(current_user.id)})
 
-        return jsonify({
-            'success': True,
-            'predictions': predictions[:5]  # Chỉ trả về 5 dự đoán hàng đầu
-        })
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def api_job_status(job_id):
+    """Trạng thái và kết quả của một job"""
+    job = job_queue.get(job_id, user_id=current_user.id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Không tìm thấy công việc hoặc kết quả đã hết hạn!'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+@login_required
+def api_job_cancel(job_id):
+    """Hủy job chưa bắt đầu"""
+    if not job_queue.cancel(job_id, user_id=current_user.id):
+        return jsonify({'success': False, 'error': 'Không thể hủy công việc này!'}), 409
+    return jsonify({'success': True})
 
-    except Exception as e:
-        return jsonify({'success': False, 'error': f'Lỗi khi tải dự đoán: {str(e)}'})
+# ========================
+# WORKER METRICS
+# ========================
+
+@app.route('/api/admin/metrics', methods=['GET'])
+@login_required
+def api_admin_metrics():
+    """Số liệu của worker đang phục vụ request (chỉ admin)"""
+    if not current_user.is_admin:
+        abort(403)
+    return jsonify({
+        'success': True,
+        'data': {
+            'password_hashing': password_policy.get_stats(),
+            'login_throttle': login_throttle.get_stats(),
+            'principal_cache': principal_cache.get_stats(),
+            'rate_limits': rate_limiter.get_stats(),
+            'fragment_cache': fragment_cache.get_stats(),
+            'page_cache': page_cache.get_stats(),
+            'compression': compressor.get_stats(),
+            'sync': sync_hub.get_stats(),
+            'jobs': job_queue.get_stats()
+        }
+    })
 
 @app.route('/api/get-world-details/<int:world_id>', methods=['GET'])
 @login_required
 def get_world_details(world_id):
     """Lấy thông tin chi tiết thế giới"""
-    world = World.query.get_or_404(world_id)
-    
-    if world.owner_id != current_user.id:
-        return jsonify({'success': False, 'error': 'Bạn không sở hữu thế giới này!'})
+    world, error = get_owned_world(world_id)
+    if error:
+        return error
     
     try:
         world_data = {
@@ -1667,6 +2037,9 @@ def get_world_details(world_id):
             'enlightenment_spots': world.enlightenment_spots or 0,
             'spiritual_stones_production': world.spiritual_stones_production or 100,
             'daily_income': world.daily_income or 0,
+            'hourly_rate': round(world.accrual_rate if world.accrual_rate is not None else world.compute_accrual_rate(), 2),
+            'pending_yield': int(world.get_pending_yield()),
+            'harvest_cooldown': int(world.harvest_cooldown_remaining()),
             'dimensional_gate': world.dimensional_gate or False,
             'time_acceleration': world.time_acceleration or False,
             'auto_cultivation': world.auto_cultivation or False,
@@ -1696,8 +2069,15 @@ def ai_chat():
     return render_template('ai_chat.html')
 
 @app.route('/api/ai/chat', methods=['POST'])
+@rate_limiter.limit(20, per=60)
+@read_only
 def api_ai_chat():
-    """API endpoint for AI chat"""
+    """API endpoint for AI chat
+
+    With Accept: text/event-stream the reply is sent as SSE, but it is NOT token streaming: Linh Nhi's
+    reply is generated locally in full first and then re-chunked into 4-word deltas, so the client
+    renders it with the same protocol as the advice routes.
+    """
     try:
         data = request.get_json()
         message = data.get('message', '')
@@ -1709,8 +2089,17 @@ def api_ai_chat():
                 'error': 'Message is required'
             }), 400
         
-        # Get AI response
-        response = get_ai_response(message, context)
+        # Get AI response (ký ức hội thoại theo người chơi đã đăng nhập)
+        user_id = current_user.id if current_user.is_authenticated else None
+        response = get_ai_response(message, context, user_id)
+        
+        if wants_event_stream():
+            # Phản hồi đã sinh xong: chỉ cắt lại thành cụm 4 từ (không phải stream token), gửi meta trước
+            text = response.get('text', '')
+            words = text.split(' ')
+            chunks = (' '.join(words[i:i + 4]) + (' ' if i + 4 < len(words) else '') for i in range(0, len(words), 4))
+            meta = {key: value for key, value in response.items() if key != 'text'}
+            return sse_response(chunks, {'success': True}, meta=meta)
         
         return jsonify({
             'success': True,
@@ -1728,7 +2117,12 @@ def api_ai_chat():
 def api_ai_status():
     """Get AI status"""
     try:
-        status = get_ai_status()
+        status = get_ai_status(current_user.id if current_user.is_authenticated else None)
+        if perplexity_manager:
+            status['perplexity'] = perplexity_manager.client.get_status()
+            status['perplexity']['cache'] = perplexity_manager.cache.get_stats()
+            status['perplexity']['single_flight'] = perplexity_manager.flight.get_stats()
+        status['jobs'] = job_queue.get_stats()
         return jsonify({
             'success': True,
             'data': status
@@ -0,0 +1,273 @@
+"""
+Request coalescing (single-flight) for upstream AI calls
+
+Khi nhiều người chơi cùng bấm một nút AI, các lời gọi giống hệt nhau (cùng khóa)
+đang chạy đồng thời trong một worker chỉ tạo một request upstream; các lời gọi
+còn lại chờ và nhận chung kết quả. Với lời gọi dạng stream (SSE), người đến sau
+nhận lại các chunk đã có rồi nhận tiếp từng chunk mới cùng lúc với người đầu tiên.
+
+Khóa liên worker (tùy chọn, fcntl.flock trên một nhóm file khóa cố định chia theo
+băm của khóa) mở rộng việc này sang nhiều process: worker đến sau chờ worker đầu
+tiên, rồi đọc kết quả từ tầng cache dùng chung thay vì gọi lại upstream.
+
+AsyncSingleFlight làm điều tương tự trong một event loop asyncio.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _StreamCall(_Call):
+    """A shared stream: text chunks received so far and the callers replaying them"""
+    __slots__ = ('cond', 'chunks', 'followers')
+
+    def __init__(self):
+        super().__init__()
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.followers = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution"""
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, lock_dir=None, lock_timeout=15.0, poll_interval=0.05):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {'leaders': 0, 'shared': 0, 'cross_worker_waits': 0}
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, fn):
+        """Run fn() once per key among concurrent callers; returns (result, shared)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats['shared'] += 1
+                leader = False
+                if isinstance(call, _StreamCall):
+                    call.followers += 1
+            else:
+                call = self._calls[key] = _Call()
+                self.stats['leaders'] += 1
+                leader = True
+
+        if not leader:
+            try:
+                call.done.wait()
+            finally:
+                self._leave(call)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def stream(self, key, chunks_fn):
+        """Iterate the text chunks of chunks_fn() once per key among concurrent callers.
+
+        The leader pulls from the upstream iterator; followers first replay the chunks seen so far,
+        then get each new one as it arrives. Errors reach every caller. If the leader's consumer goes
+        away while others are waiting, the upstream is drained for them; otherwise it is closed.
+        A non-streaming call already in flight for the key is shared as a single chunk.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats['shared'] += 1
+                leader = False
+                if isinstance(call, _StreamCall):
+                    call.followers += 1
+            else:
+                call = self._calls[key] = _StreamCall()
+                self.stats['leaders'] += 1
+                leader = True
+
+        if leader:
+            return self._lead(key, call, chunks_fn)
+        return self._follow(call)
+
+    def _lead(self, key, call, chunks_fn):
+        iterator = None
+        try:
+            iterator = iter(chunks_fn())
+            for chunk in iterator:
+                self._publish(call, chunk)
+                try:
+                    yield chunk
+                except GeneratorExit:
+                    with self._lock:
+                        if not call.followers:
+                            # Không ai chờ: gỡ khóa ngay (trong cùng lock) rồi đóng upstream
+                            del self._calls[key]
+                            raise
+                    # Người gọi đầu đã bỏ đi nhưng còn người chờ: kéo nốt upstream cho họ
+                    try:
+                        for chunk in iterator:
+                            self._publish(call, chunk)
+                    except Exception as e:
+                        call.error = e
+                    break
+            if call.error is None:
+                call.result = ''.join(call.chunks)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            if iterator is not None and hasattr(iterator, 'close'):
+                iterator.close()
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            with call.cond:
+                call.done.set()
+                call.cond.notify_all()
+
+    def _follow(self, call):
+        try:
+            if not isinstance(call, _StreamCall):
+                call.done.wait()
+                if call.error is not None:
+                    raise call.error
+                if call.result is not None:
+                    yield call.result
+                return
+
+            sent = 0
+            while True:
+                with call.cond:
+                    while sent >= len(call.chunks) and not call.done.is_set():
+                        call.cond.wait()
+                    pending = call.chunks[sent:]
+                    finished = call.done.is_set()
+                sent += len(pending)
+                yield from pending
+                if finished:
+                    break
+            if call.error is not None:
+                raise call.error
+        finally:
+            self._leave(call)
+
+    def _publish(self, call, chunk):
+        with call.cond:
+            call.chunks.append(chunk)
+            call.cond.notify_all()
+
+    def _leave(self, call):
+        if isinstance(call, _StreamCall):
+            with self._lock:
+                call.followers -= 1
+
+    def in_flight(self, key):
+        """Whether a call for this key is currently running in this worker"""
+        with self._lock:
+            return key in self._calls
+
+    @contextmanager
+    def cross_worker_lock(self, key):
+        """Hold an exclusive per-key file lock across processes; yields True if we had to wait for it.
+
+        No-op (yields False) when no lock_dir is configured or fcntl is unavailable. If the lock
+        cannot be taken within lock_timeout the caller proceeds unlocked rather than hanging.
+        """
+        if not self.lock_dir:
+            yield False
+            return
+
+        stripe = int(hashlib.sha1(key.encode('utf-8')).hexdigest(), 16) % self.LOCK_STRIPES
+        handle = open(os.path.join(self.lock_dir, f'ai-{stripe:02d}.lock'), 'a')
+        waited = False
+        locked = False
+        try:
+            deadline = time.monotonic() + self.lock_timeout
+            while True:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    locked = True
+                    break
+                except BlockingIOError:
+                    waited = True
+                    if time.monotonic() >= deadline:
+                        logger.warning("Cross-worker lock wait timed out on stripe %s", stripe)
+                        break
+                    time.sleep(self.poll_interval)
+            if waited:
+                with self._lock:
+                    self.stats['cross_worker_waits'] += 1
+            yield waited
+        finally:
+            if locked:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+class AsyncSingleFlight:
+    """Coalesce concurrent coroutines that share a key (single event loop)"""
+
+    def __init__(self):
+        self._calls = {}
+        self.stats = {'leaders': 0, 'shared': 0}
+
+    async def do(self, key, coro_fn):
+        """Await coro_fn() once per key among concurrent callers; returns (result, shared)"""
+        future = self._calls.get(key)
+        if future is not None:
+            self.stats['shared'] += 1
+            # shield: một caller bị hủy không được hủy luôn lời gọi chung
+            return await asyncio.shield(future), True
+
+        self.stats['leaders'] += 1
+        future = self._calls[key] = asyncio.ensure_future(coro_fn())
+        try:
+            return await asyncio.shield(future), False
+        finally:
+            if future.done():
+                self._calls.pop(key, None)
+            else:
+                future.add_done_callback(lambda _: self._calls.pop(key, None))
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['in_flight'] = len(self._calls)
+        return stats
@@ -1,8 +1,40 @@
+/**
+ * Read a Server-Sent Events response body, calling onEvent(eventName, data) per frame.
+ * Aborting the fetch (AbortController) cancels the stream on the server too.
+ */
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+}
+
 class AIAssistant {
     constructor() {
         this.isVisible = false;
         this.currentType = 'general';
         this.isLoading = false;
+        this.controller = null;
+        this.jobUrl = null;
         this.init();
     }
 
@@ -223,6 +255,11 @@ class AIAssistant {
                 this.getAIAdvice();
             }
         });
+
+        // Closing the modal cancels an in-progress stream
+        document.getElementById('ai-assistant-modal').addEventListener('hidden.bs.modal', () => {
+            this.cancelAdvice();
+        });
     }
 
     showAssistant() {
@@ -283,14 +320,37 @@ class AIAssistant {
                     break;
             }
             
+            this.controller = new AbortController();
             const response = await fetch(endpoint, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Accept': 'text/event-stream'
                 },
-                body: JSON.stringify(data)
+                body: JSON.stringify(data),
+                signal: this.controller.signal
             });
             
+            if (response.status === 202) {
+                // Lời khuyên chạy ở job nền, không giữ worker web trong lúc chờ AI
+                const accepted = await response.json();
+                await this.pollJob(accepted.status_url);
+                return;
+            }
+            
+            if ((response.headers.get('Content-Type') || '').startsWith('text/event-stream')) {
+                // Hiển thị từng đoạn ngay khi nhận được
+                let advice = '';
+                await readEventStream(response, (event, payload) => {
+                    if (event === 'message' && payload.delta) {
+                        if (!advice) this.hideLoading();
+                        advice += payload.delta;
+                        this.showResponse(advice, this.currentType);
+                    }
+                });
+                return;
+            }
+            
             const result = await response.json();
             
             if (result.success) {
@@ -300,14 +360,60 @@ class AIAssistant {
             }
             
         } catch (error) {
+            if (error.name === 'AbortError') return;
             console.error('AI Assistant Error:', error);
             this.showError('Không thể kết nối với Thiên Cơ Tiên Nhân. Vui lòng thử lại sau!');
         } finally {
+            this.controller = null;
             this.isLoading = false;
             this.hideLoading();
         }
     }
 
+    async pollJob(statusUrl) {
+        // Hỏi trạng thái job định kỳ; phần lời khuyên đã sinh ra (partial) được hiển thị dần
+        this.jobUrl = statusUrl;
+        const deadline = Date.now() + 120000;
+        let delay = 400;
+        try {
+            while (Date.now() < deadline) {
+                await new Promise(resolve => setTimeout(resolve, delay));
+                const response = await fetch(statusUrl, { signal: this.controller.signal });
+                const result = await response.json();
+                const job = result.job;
+                if (!job) {
+                    this.showError(result.error || 'Đã xảy ra lỗi không mong muốn!');
+                    return;
+                }
+
+                const advice = (job.result || job.partial || {}).advice;
+                if (advice) {
+                    this.hideLoading();
+                    this.showResponse(advice, this.currentType);
+                }
+                if (job.status === 'done') return;
+                if (job.status === 'failed' || job.status === 'cancelled') {
+                    this.showError('Thiên Cơ Tiên Nhân hiện không thể trả lời. Vui lòng thử lại sau!');
+                    return;
+                }
+                delay = Math.min(delay * 1.5, 2000);
+            }
+            this.showError('Thiên Cơ Tiên Nhân suy ngẫm quá lâu. Vui lòng thử lại sau!');
+        } finally {
+            this.jobUrl = null;
+        }
+    }
+
+    cancelAdvice() {
+        if (this.jobUrl) {
+            // Job chưa bắt đầu thì hủy luôn; đang chạy thì để nó hoàn tất và vào cache
+            fetch(this.jobUrl, { method: 'DELETE' }).catch(() => {});
+        }
+        if (this.controller) {
+            this.controller.abort();
+        }
+    }
+
     showLoading() {
         document.getElementById('ai-response-loading').style.display = 'block';
         document.getElementById('ai-response-content').style.display = 'none';
@@ -2,7 +2,6 @@
 class CommunityManager {
     constructor() {
         this.currentChannel = 'general';
-        this.messagePollingTimer = null;
         this.init();
     }
 
@@ -10,7 +9,6 @@ class CommunityManager {
         this.setupChatSystem();
         this.setupModalHandlers();
         this.startMessagePolling();
-        this.loadInitialMessages();
     }
 
     setupChatSystem() {
@@ -64,7 +62,7 @@ class CommunityManager {
 
             if (data.success) {
                 messageInput.value = '';
-                this.loadMessages(); // Reload messages to show the new one
+                window.tuTienSync.refresh(); // Đồng bộ ngay để thấy tin nhắn vừa gửi
             } else {
                 alert('Lỗi: ' + (data.error || 'Không thể gửi tin nhắn'));
             }
@@ -76,29 +74,7 @@ class CommunityManager {
 
     switchChannel(channel) {
         this.currentChannel = channel;
-        this.loadMessages();
-    }
-
-    async loadMessages() {
-        try {
-            const response = await fetch(`/api/get-messages?channel=${this.currentChannel}`);
-            const data = await response.json();
-
-            if (data.success) {
-                this.displayMessages(data.messages);
-            }
-        } catch (error) {
-            console.error('Error loading messages:', error);
-        }
-    }
-
-    loadInitialMessages() {
-        // Load initial messages from server-rendered data if available
-        const messagesContainer = document.getElementById('chatMessages');
-        if (messagesContainer && messagesContainer.children.length === 1) {
-            // Only loading spinner present, load messages
-            this.loadMessages();
-        }
+        this.startMessagePolling();
     }
 
     displayMessages(messages) {
@@ -151,17 +127,14 @@ class CommunityManager {
     }
 
     startMessagePolling() {
-        // Poll for new messages every 10 seconds
-        this.messagePollingTimer = setInterval(() => {
-            this.loadMessages();
-        }, 10000);
+        // Tin nhắn của kênh hiện tại đến qua mục 'messages' của /api/sync (chỉ khi có tin mới)
+        window.tuTienSync.subscribe('messages', { channel: this.currentChannel }, messages => {
+            this.displayMessages(messages);
+        });
     }
 
     stopMessagePolling() {
-        if (this.messagePollingTimer) {
-            clearInterval(this.messagePollingTimer);
-            this.messagePollingTimer = null;
-        }
+        window.tuTienSync.unsubscribe('messages');
     }
 
     // Modal management functions
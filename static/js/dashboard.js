@@ -503,27 +503,22 @@ class Dashboard {
     }
 
     startResourceUpdates() {
-        this.resourceUpdateTimer = setInterval(() => {
-            this.updateResources();
-        }, 60000); // Update every minute
-    }
-
-    updateResources() {
-        // Simulate resource generation
-        const spiritualStones = document.querySelector('[data-spiritual-stones]');
-        const pills = document.querySelector('[data-pills]');
-
-        if (spiritualStones) {
-            const current = parseInt(spiritualStones.textContent) || 0;
-            const gained = Math.floor(Math.random() * 10) + 5;
-            window.tuTienApp.animateNumberChange(spiritualStones, current + gained);
-        }
-
-        if (Math.random() < 0.1 && pills) { // 10% chance to gain pills
-            const current = parseInt(pills.textContent) || 0;
-            window.tuTienApp.animateNumberChange(pills, current + 1);
-            window.tuTienApp.showNotification('Tài Nguyên', 'Tìm thấy đan dược!', 'success');
-        }
+        // Tài nguyên thật của người chơi đến qua mục 'user' của /api/sync (chỉ khi có thay đổi)
+        window.tuTienSync.subscribe('user', {}, (resources, first) => this.updateResources(resources, first));
+    }
+
+    updateResources(resources, first) {
+        document.querySelectorAll('[data-sync-user]').forEach(element => {
+            const value = resources[element.dataset.syncUser];
+            if (value === undefined || value === null) return;
+            if (typeof value !== 'number') {
+                element.textContent = value;
+            } else if (first) {
+                element.textContent = value;
+            } else if (value !== (parseInt(element.textContent.replace(/[^\d]/g, '')) || 0)) {
+                window.tuTienApp.animateNumberChange(element, value);
+            }
+        });
     }
 
     setupQuickResourceActions() {
@@ -645,9 +640,7 @@ class Dashboard {
         if (this.aiAdviceTimer) {
             clearInterval(this.aiAdviceTimer);
         }
-        if (this.resourceUpdateTimer) {
-            clearInterval(this.resourceUpdateTimer);
-        }
+        window.tuTienSync.unsubscribe('user');
     }
 }
 
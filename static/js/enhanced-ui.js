@@ -173,8 +173,8 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 // Add CSS for animations
-const style = document.createElement('style');
-style.textContent = `
+const enhancedUIStyle = document.createElement('style');
+enhancedUIStyle.textContent = `
     .animate-fade-in {
         animation: fadeInUp 0.6s ease-out forwards;
     }
@@ -236,4 +236,4 @@ style.textContent = `
         100% { transform: rotate(360deg); }
     }
 `;
-document.head.appendChild(style);
\ No newline at end of file
+document.head.appendChild(enhancedUIStyle);
\ No newline at end of file
@@ -565,9 +565,6 @@ class ExpeditionManager {
         // Real-time expedition progress tracking
         this.setupProgressTracking();
         
-        // Expedition status updates
-        this.setupStatusUpdates();
-        
         // Participant activity monitoring
         this.setupParticipantTracking();
     }
@@ -595,35 +592,6 @@ class ExpeditionManager {
         }, 500);
     }
 
-    setupStatusUpdates() {
-        // Simulate status updates for active expeditions
-        setInterval(() => {
-            this.updateExpeditionStatuses();
-        }, 30000); // Update every 30 seconds
-    }
-
-    updateExpeditionStatuses() {
-        const activeExpeditionItems = document.querySelectorAll('.active-expedition-item');
-        
-        activeExpeditionItems.forEach(item => {
-            if (Math.random() < 0.3) { // 30% chance of update
-                const statusIndicator = item.querySelector('.expedition-status');
-                if (statusIndicator) {
-                    this.flashStatusUpdate(statusIndicator);
-                }
-            }
-        });
-    }
-
-    flashStatusUpdate(element) {
-        element.style.backgroundColor = 'rgba(79, 172, 254, 0.3)';
-        element.style.transition = 'background-color 0.5s ease';
-        
-        setTimeout(() => {
-            element.style.backgroundColor = '';
-        }, 1000);
-    }
-
     setupParticipantTracking() {
         // Track participant activity
         const participantItems = document.querySelectorAll('.participant-item');
@@ -770,15 +738,19 @@ class ExpeditionManager {
     }
 
     startExpeditionUpdates() {
-        // Start periodic updates for expeditions
+        // Thanh tiến độ tính tại chỗ từ mốc thời gian (không gọi server)
         this.expeditionTimer = setInterval(() => {
             this.updateAllExpeditions();
         }, 60000); // Update every minute
+
+        // Trạng thái thật (mở tuyển, bắt đầu, hoàn thành) đến qua mục 'expeditions' của /api/sync
+        window.tuTienSync.subscribe('expeditions', {}, (expeditions, first) => {
+            this.updateAvailableExpeditions(expeditions, first);
+        });
     }
 
     updateAllExpeditions() {
         this.updateActiveExpeditions();
-        this.updateAvailableExpeditions();
         this.checkExpeditionCompletion();
     }
 
@@ -790,13 +762,16 @@ class ExpeditionManager {
     }
 
     updateExpeditionProgress(expeditionElement) {
+        // Progress is derived from server timestamps; the server scheduler owns the status change
         const progressBar = expeditionElement.querySelector('.progress-bar');
-        if (progressBar) {
-            const currentWidth = parseFloat(progressBar.style.width) || 0;
-            const newWidth = Math.min(currentWidth + Math.random() * 5, 100);
+        const { startTime, endTime } = expeditionElement.dataset;
+        if (progressBar && startTime && endTime) {
+            const start = new Date(startTime).getTime();
+            const end = new Date(endTime).getTime();
+            const newWidth = Math.max(0, Math.min(100, (Date.now() - start) / (end - start) * 100));
             progressBar.style.width = `${newWidth}%`;
             
-            if (newWidth >= 100) {
+            if (newWidth >= 100 && !expeditionElement.classList.contains('expedition-completed')) {
                 this.completeExpedition(expeditionElement);
             }
         }
@@ -820,27 +795,31 @@ class ExpeditionManager {
         );
     }
 
-    updateAvailableExpeditions() {
-        // Randomly add new expeditions
-        if (Math.random() < 0.1) { // 10% chance
-            this.addNewExpedition();
+    updateAvailableExpeditions(expeditions, first) {
+        const recruiting = expeditions.filter(expedition => expedition.status === 'Tuyển Thành Viên');
+        if (!first) {
+            recruiting
+                .filter(expedition => !this.availableExpeditions.includes(expedition.id))
+                .forEach(expedition => this.addNewExpedition(expedition));
         }
+        this.availableExpeditions = recruiting.map(expedition => expedition.id);
+
+        // Đạo lữ server đã kết thúc (scheduler) thì hoàn thành trên trang
+        this.activeExpeditions = expeditions
+            .filter(expedition => expedition.status === 'Đang Diễn Ra')
+            .map(expedition => expedition.id);
+        document.querySelectorAll('.active-expedition-item[data-expedition-id]').forEach(item => {
+            if (!this.activeExpeditions.includes(Number(item.dataset.expeditionId)) &&
+                !item.classList.contains('expedition-completed')) {
+                this.completeExpedition(item);
+            }
+        });
     }
 
-    addNewExpedition() {
-        const expeditionNames = [
-            "Khám Phá Hang Động Bí Ẩn",
-            "Tìm Kiếm Thiên Tài Địa Bảo",
-            "Săn Lùng Ác Quỷ",
-            "Thu Thập Linh Thảo Quý",
-            "Khảo Sát Vùng Đất Mới"
-        ];
-        
-        const randomName = expeditionNames[Math.floor(Math.random() * expeditionNames.length)];
-        
+    addNewExpedition(expedition) {
         window.tuTienApp.showNotification(
             'Đạo Lữ Mới!', 
-            `Đạo lữ "${randomName}" vừa được công bố!`, 
+            `Đạo lữ "${expedition.name}" vừa được công bố!`, 
             'info'
         );
     }
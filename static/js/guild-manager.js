@@ -9,7 +9,6 @@ class GuildManager {
 
     init() {
         this.setupGuildEvents();
-        this.loadGuildData();
         this.setupRealTimeUpdates();
     }
 
@@ -39,22 +38,17 @@ class GuildManager {
         }
     }
 
-    async loadGuildData() {
-        try {
-            const response = await fetch('/api/guild/data');
-            if (response.ok) {
-                const data = await response.json();
-                this.currentGuild = data.guild;
-                this.guildMembers = data.members || [];
-                this.guildWars = data.wars || [];
-                this.updateGuildUI();
-            }
-        } catch (error) {
-            console.error('Error loading guild data:', error);
-            if (window.enhancedUI) {
-                window.enhancedUI.showNotification('Lỗi tải dữ liệu guild', 'error');
-            }
-        }
+    loadGuildData() {
+        // Dữ liệu bang hội đến qua mục 'guild' của /api/sync; sau thao tác chỉ cần đồng bộ sớm
+        window.tuTienSync.refresh();
+    }
+
+    applyGuildData(data) {
+        if (!data) return;
+        this.currentGuild = data.guild;
+        this.guildMembers = data.members || [];
+        this.guildWars = data.wars || [];
+        this.updateGuildUI();
     }
 
     updateGuildUI() {
@@ -88,7 +82,7 @@ class GuildManager {
         // Update member count
         const memberCountEl = document.getElementById('memberCount');
         if (memberCountEl) {
-            memberCountEl.textContent = `${this.guildMembers.length} thành viên`;
+            memberCountEl.textContent = this.guildMembers.length.toLocaleString();
         }
     }
 
@@ -162,7 +156,7 @@ class GuildManager {
 
         const treasuryEl = document.getElementById('guildTreasury');
         if (treasuryEl) {
-            treasuryEl.textContent = `${this.currentGuild.treasury.toLocaleString()} Linh Thạch`;
+            treasuryEl.textContent = this.currentGuild.treasury.toLocaleString();
         }
     }
 
@@ -362,12 +356,12 @@ class GuildManager {
     }
 
     setupRealTimeUpdates() {
-        // Update guild data every 30 seconds
-        setInterval(() => {
-            if (this.currentGuild) {
-                this.loadGuildData();
-            }
-        }, 30000);
+        // Chỉ theo dõi khi người chơi có bang hội và trang đang hiển thị thông tin bang hội
+        const hasGuildUI = ['guildName', 'memberCount', 'guildMembersList', 'guildWarsList', 'guildTreasury']
+            .some(id => document.getElementById(id));
+        if (hasGuildUI && window.VIEWER && window.VIEWER.guildId) {
+            window.tuTienSync.subscribe('guild', {}, data => this.applyGuildData(data));
+        }
     }
 }
 
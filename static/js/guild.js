@@ -213,6 +213,11 @@ class GuildManager {
                 this.refreshWarPredictions();
             });
         }
+
+        // Predictions are computed by a background job; load them once on page open
+        if (document.querySelector('.war-predictions-container')) {
+            this.refreshWarPredictions();
+        }
     }
 
     async handleWarDeclaration() {
@@ -487,7 +492,8 @@ class GuildManager {
             const data = await response.json();
 
             if (data.success) {
-                this.renderWarPredictions(data.predictions);
+                const result = await this.waitForJob(data.status_url);
+                this.renderWarPredictions(result.predictions);
                 window.tuTienApp.showNotification('AI Phân Tích', 'Đã cập nhật dự đoán chiến tranh!', 'info');
             } else {
                 throw new Error(data.error);
@@ -498,6 +504,27 @@ class GuildManager {
         }
     }
 
+    async waitForJob(statusUrl, interval = 1000, maxAttempts = 60) {
+        // Poll a background job until it finishes and return its result
+        for (let attempt = 0; attempt < maxAttempts; attempt++) {
+            const response = await fetch(statusUrl, {
+                headers: { 'X-Requested-With': 'XMLHttpRequest' }
+            });
+            const data = await response.json();
+            if (!data.success) {
+                throw new Error(data.error);
+            }
+            if (data.job.status === 'done') {
+                return data.job.result;
+            }
+            if (data.job.status === 'failed' || data.job.status === 'cancelled') {
+                throw new Error(data.job.error || 'Phân tích thất bại');
+            }
+            await new Promise(resolve => setTimeout(resolve, interval));
+        }
+        throw new Error('Phân tích quá lâu, hãy thử lại sau');
+    }
+
     renderWarPredictions(predictions) {
         const container = document.querySelector('.war-predictions-container');
         if (!container) return;
@@ -526,7 +553,7 @@ class GuildManager {
                     </div>
                     <div class="prediction-actions mt-3">
                         <button class="btn btn-sm btn-outline-purple mystical-btn w-100" 
-                                onclick="guildManager.declareWarAgainst('${prediction.target_guild_id}', '${prediction.target_guild_name}')">
+                                onclick="declareWarAgainst('${prediction.target_guild_id}', '${prediction.target_guild_name}')">
                             <i class="fas fa-sword me-1"></i>Tuyên Chiến
                         </button>
                     </div>
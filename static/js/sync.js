@@ -0,0 +1,86 @@
+// Unified client sync: one /api/sync request per tick instead of one polling loop per widget
+class SyncClient {
+    constructor(url = '/api/sync') {
+        this.url = url;
+        this.subscriptions = new Map();
+        this.interval = 15000;
+        this.maxInterval = 60000;
+        this.delay = this.interval;
+        this.timer = null;
+        this.inFlight = false;
+        this.enabled = Boolean(window.VIEWER);
+
+        document.addEventListener('visibilitychange', () => {
+            // Tab ẩn thì dừng hẳn, hiện lại thì đồng bộ ngay
+            if (!document.hidden) this.refresh();
+        });
+    }
+
+    subscribe(section, params, handler) {
+        this.subscriptions.set(section, { params: params || {}, handler, version: null });
+        this.refresh();
+    }
+
+    unsubscribe(section) {
+        this.subscriptions.delete(section);
+    }
+
+    refresh() {
+        // Đồng bộ sớm (sau khi người chơi thao tác), gom các lần gọi liền nhau thành một request
+        this.delay = this.interval;
+        this.schedule(50);
+    }
+
+    schedule(delay) {
+        if (!this.enabled || this.subscriptions.size === 0) return;
+        clearTimeout(this.timer);
+        this.timer = setTimeout(() => this.poll(), delay);
+    }
+
+    async poll() {
+        if (this.inFlight || document.hidden) return;
+        this.inFlight = true;
+
+        const sections = {};
+        this.subscriptions.forEach((subscription, name) => {
+            sections[name] = { params: subscription.params, version: subscription.version };
+        });
+
+        let changed = false;
+        try {
+            const response = await fetch(this.url, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', 'X-Requested-With': 'XMLHttpRequest' },
+                body: JSON.stringify({ sections })
+            });
+            if (response.ok) {
+                const data = await response.json();
+                this.interval = (data.interval || 15) * 1000;
+                this.maxInterval = (data.max_interval || 60) * 1000;
+                Object.entries(data.sections || {}).forEach(([name, update]) => {
+                    const subscription = this.subscriptions.get(name);
+                    // Bỏ qua kết quả của lần đăng ký cũ (vd. vừa đổi kênh chat)
+                    if (!subscription || JSON.stringify(subscription.params) !== JSON.stringify(sections[name].params)) return;
+                    const first = subscription.version === null;
+                    subscription.version = update.version;
+                    changed = true;
+                    try {
+                        subscription.handler(update.data, first);
+                    } catch (error) {
+                        console.error(`Sync handler "${name}" failed:`, error);
+                    }
+                });
+            }
+        } catch (error) {
+            console.error('Sync error:', error);
+        } finally {
+            this.inFlight = false;
+        }
+
+        // Không có gì đổi thì giãn dần khoảng poll tới maxInterval
+        this.delay = changed ? this.interval : Math.min(this.delay * 2, this.maxInterval);
+        this.schedule(this.delay);
+    }
+}
+
+window.tuTienSync = new SyncClient();
@@ -9,7 +9,6 @@ class WorldManager {
 
     init() {
         this.setupWorldEvents();
-        this.loadWorldData();
         this.setupRealTimeUpdates();
     }
 
@@ -33,21 +32,15 @@ class WorldManager {
         }
     }
 
-    async loadWorldData() {
-        try {
-            const response = await fetch('/api/world/data');
-            if (response.ok) {
-                const data = await response.json();
-                this.ownedWorlds = data.owned_worlds || [];
-                this.availableWorlds = data.available_worlds || [];
-                this.updateWorldUI();
-            }
-        } catch (error) {
-            console.error('Error loading world data:', error);
-            if (window.enhancedUI) {
-                window.enhancedUI.showNotification('Lỗi tải dữ liệu thế giới', 'error');
-            }
-        }
+    loadWorldData() {
+        // Thế giới sở hữu đến qua mục 'worlds' của /api/sync; sau thao tác chỉ cần đồng bộ sớm
+        window.tuTienSync.refresh();
+    }
+
+    applyWorldData(data) {
+        if (!data) return;
+        this.ownedWorlds = data.owned_worlds || [];
+        this.updateWorldUI();
     }
 
     updateWorldUI() {
@@ -400,10 +393,10 @@ class WorldManager {
     }
 
     setupRealTimeUpdates() {
-        // Update world data every 60 seconds
-        setInterval(() => {
-            this.loadWorldData();
-        }, 60000);
+        // Chỉ theo dõi khi trang đang hiển thị danh sách thế giới
+        if (document.getElementById('ownedWorldsList') || document.getElementById('availableWorldsList')) {
+            window.tuTienSync.subscribe('worlds', {}, data => this.applyWorldData(data));
+        }
     }
 }
 
@@ -0,0 +1,225 @@
+"""
+Unified client sync
+
+Mỗi tab trước đây chạy nhiều vòng setInterval riêng (tin nhắn cộng đồng 10 giây, dữ liệu
+thế giới/bang hội mỗi phút...), mỗi vòng gọi một endpoint khác. Giờ client chỉ gọi một
+`POST /api/sync` với các mục (section) nó đang theo dõi và phiên bản đã có:
+
+    {"sections": {"messages": {"params": {"channel": "general"}, "version": "1a.3f"},
+                  "user": {"version": null}}}
+
+và chỉ nhận lại những mục đã đổi. Phiên bản lấy từ bộ đếm thay đổi phía server:
+
+- ChangeCounters móc vào commit của SQLAlchemy (giống principal cache): mỗi model được
+  theo dõi ánh xạ một dòng thay đổi sang các khóa tài nguyên, vd. ChatMessage ->
+  ('messages', 'general', ''); commit thì các bộ đếm tương ứng tăng, rollback thì bỏ
+- UPDATE/DELETE hàng loạt tăng "generation" của cả loại tài nguyên
+- bộ đếm nằm trong cache dùng chung, khởi tạo ngẫu nhiên nên cache bị xóa/evict không bao
+  giờ làm client tưởng dữ liệu chưa đổi; với cache riêng từng worker, phiên bản còn gắn với
+  mốc thời gian SYNC_RESYNC_AFTER để dữ liệu không cũ quá mốc đó
+- mục không đổi chỉ tốn một lần đọc cache, không chạm CSDL
+"""
+import random
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+
+def changed_values(obj, attr):
+    """Current and pre-flush values of an attribute (both sides when e.g. ownership moved)"""
+    history = get_history(obj, attr)
+    values = list(history.added or history.unchanged or ()) + list(history.deleted or ())
+    return [value for value in values if value is not None]
+
+
+def was_modified(obj, *attrs):
+    return any(get_history(obj, attr).has_changes() for attr in attrs)
+
+
+class ChangeCounters:
+    """Per-resource change counters bumped on commit, stored in the shared cache"""
+
+    PREFIX = 'sync:'
+    RESYNC_AFTER = 300
+
+    def __init__(self):
+        self.cache = None
+        self._trackers = {}  # model class -> (keys_fn, resource names)
+        self._lock = threading.Lock()
+        self._bump_lock = threading.Lock()
+        self.stats = {'bumps': 0, 'generation_bumps': 0}
+        self._listening = False
+
+    def init_app(self, app, cache=None):
+        self.cache = cache
+        self.RESYNC_AFTER = app.config.get('SYNC_RESYNC_AFTER', self.RESYNC_AFTER)
+        if not self._listening:
+            event.listen(Session, 'after_flush', self._after_flush)
+            event.listen(Session, 'do_orm_execute', self._on_execute)
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_rollback', self._after_rollback)
+            self._listening = True
+
+    def track(self, model, keys_fn, resources):
+        """Bump the keys returned by keys_fn(row) whenever a row of `model` is committed
+
+        `resources`: tên các loại tài nguyên keys_fn có thể trả về, để UPDATE/DELETE hàng
+        loạt trên model tăng generation của đúng các loại đó.
+        """
+        self._trackers[model] = (keys_fn, tuple(resources))
+
+    def versions(self, keys):
+        """Opaque version token for each resource key (None when there is no cache)"""
+        if self.cache is None or not keys:
+            return [None] * len(keys)
+        generation_keys = [self._generation_key(key[0]) for key in keys]
+        counter_keys = [self._counter_key(key) for key in keys]
+        all_keys = list(dict.fromkeys(generation_keys + counter_keys))
+        try:
+            values = dict(zip(all_keys, self.cache.get_many(*all_keys)))
+            for cache_key, value in values.items():
+                if value is None:
+                    values[cache_key] = self._initialize(cache_key)
+        except Exception:
+            return [None] * len(keys)
+
+        suffix = f'.{int(time.time() // self.RESYNC_AFTER):x}' if self.RESYNC_AFTER else ''
+        return [f'{values[generation]:x}.{values[counter]:x}{suffix}'
+                for generation, counter in zip(generation_keys, counter_keys)]
+
+    def bump(self, *keys):
+        for key in keys:
+            self._bump(self._counter_key(key))
+        with self._lock:
+            self.stats['bumps'] += len(keys)
+
+    def bump_generation(self, *resources):
+        for resource in resources:
+            self._bump(self._generation_key(resource))
+        with self._lock:
+            self.stats['generation_bumps'] += len(resources)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _counter_key(self, key):
+        return self.PREFIX + ':'.join(str(part) for part in key)
+
+    def _generation_key(self, resource):
+        return f'{self.PREFIX}generation:{resource}'
+
+    def _initialize(self, cache_key):
+        # Bắt đầu ngẫu nhiên: khóa bị evict rồi tạo lại sẽ không trùng phiên bản cũ của client
+        value = random.getrandbits(32)
+        if not self.cache.add(cache_key, value, timeout=0):
+            value = self.cache.get(cache_key) or value
+        return value
+
+    def _bump(self, cache_key):
+        if self.cache is None:
+            return
+        try:
+            # add() khởi tạo ngẫu nhiên nếu chưa có, inc() nguyên tử trên Redis/memcached: hai
+            # commit đồng thời luôn tăng hai lần. Lock phủ SimpleCache (inc là get + set) trong process.
+            backend = getattr(self.cache, 'cache', self.cache)  # Flask-Caching không bọc inc()
+            with self._bump_lock:
+                backend.add(cache_key, random.getrandbits(32), timeout=0)
+                backend.inc(cache_key)
+        except Exception:
+            pass
+
+    # --- SQLAlchemy session hooks ---
+
+    def _after_flush(self, session, flush_context):
+        keys = set()
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            tracker = self._trackers.get(type(obj))
+            if tracker is not None:
+                keys.update(tracker[0](obj))
+        if keys:
+            session.info.setdefault('sync_dirty', set()).update(keys)
+
+    def _on_execute(self, orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete:
+            mapper = orm_execute_state.bind_mapper
+            tracker = self._trackers.get(mapper.class_) if mapper is not None else None
+            if tracker is not None:
+                orm_execute_state.session.info.setdefault('sync_generations', set()).update(tracker[1])
+
+    def _after_commit(self, session):
+        dirty = session.info.pop('sync_dirty', None)
+        generations = session.info.pop('sync_generations', None)
+        if generations:
+            self.bump_generation(*generations)
+        if dirty:
+            self.bump(*dirty)
+
+    def _after_rollback(self, session):
+        session.info.pop('sync_dirty', None)
+        session.info.pop('sync_generations', None)
+
+
+class SyncHub:
+    """Named sync sections: a resource key per subscriber plus a loader for its data"""
+
+    INTERVAL = 15
+    MAX_INTERVAL = 60
+
+    def __init__(self, counters):
+        self.counters = counters
+        self.sections = {}  # name -> (resource_fn, loader)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'sections_checked': 0, 'sections_sent': 0}
+
+    def init_app(self, app):
+        self.INTERVAL = app.config.get('SYNC_INTERVAL', self.INTERVAL)
+        self.MAX_INTERVAL = app.config.get('SYNC_MAX_INTERVAL', self.MAX_INTERVAL)
+
+    def section(self, name, resource):
+        """Register a loader; resource(params) gives its counter key, or None if it does not apply"""
+        def decorator(loader):
+            self.sections[name] = (resource, loader)
+            return loader
+        return decorator
+
+    def sync(self, subscriptions):
+        """{name: {'version', 'data'}} for the subscribed sections whose version changed"""
+        wanted = []
+        for name, subscription in subscriptions.items():
+            if name not in self.sections or not isinstance(subscription, dict):
+                continue
+            params = subscription.get('params') or {}
+            key = self.sections[name][0](params)
+            wanted.append((name, params, key, subscription.get('version')))
+
+        # Đọc phiên bản TRƯỚC khi tải dữ liệu: thay đổi xảy ra trong lúc tải sẽ được gửi ở lần sau
+        versions = self.counters.versions([key for _, _, key, _ in wanted if key is not None])
+        versions = iter(versions)
+        changed = {}
+        for name, params, key, client_version in wanted:
+            # Mục không áp dụng (vd. chưa vào bang hội) có phiên bản cố định 'none'
+            version = next(versions) if key is not None else 'none'
+            if version is not None and version == client_version:
+                continue
+            data = self.sections[name][1](params) if key is not None else None
+            changed[name] = {'version': version, 'data': data}
+
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['sections_checked'] += len(wanted)
+            self.stats['sections_sent'] += len(changed)
+        return changed
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['counters'] = self.counters.get_stats()
+        return stats
+
+
+# Global instances
+change_counters = ChangeCounters()
+sync_hub = SyncHub(change_counters)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Test script for the semantic AI advice cache and request coalescing
+"""
+import sys
+import os
+import tempfile
+import threading
+import time
+import multiprocessing
+from advice_cache import AdviceCache, bucket, make_key
+from single_flight import SingleFlight
+from perplexity_helper import PerplexityManager
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_bucketing():
+    """Test nearby game states map to the same key"""
+    print("Testing feature bucketing...")
+    if bucket(1234) != 1000 or bucket(5600) != 6000 or bucket(7) != 7 or bucket(None) != 0:
+        print(f"❌ Bucket values wrong: {bucket(1234)}, {bucket(5600)}, {bucket(7)}")
+        return False
+
+    a = make_key('cultivation', {'level': 'Trúc Cơ', 'stones': bucket(1210), 'pills': bucket(3)})
+    b = make_key('cultivation', {'pills': bucket(3), 'stones': bucket(1190), 'level': 'Trúc Cơ'})
+    c = make_key('cultivation', {'level': 'Kim Đan', 'stones': bucket(1210), 'pills': bucket(3)})
+    if a != b or a == c:
+        print("❌ Canonical keys should ignore order and small differences only")
+        return False
+
+    print("✅ Similar states share a key")
+    return True
+
+def test_ttl_and_lru():
+    """Test expiry and LRU eviction in the memory tier"""
+    print("Testing TTL and LRU eviction...")
+    clock = FakeClock()
+    cache = AdviceCache(max_entries=2, ttl=60, clock=clock)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    cache.get('a')
+    cache.set('c', 'C')
+    if cache.get('b') is not None or cache.get('a') != 'A':
+        print("❌ Least recently used entry should be evicted")
+        return False
+
+    clock.now += 61
+    if cache.get('a') is not None:
+        print("❌ Expired entry returned")
+        return False
+
+    stats = cache.get_stats()
+    if stats['evictions'] != 1 or stats['hits'] != 2 or stats['misses'] != 2:
+        print(f"❌ Stats wrong: {stats}")
+        return False
+
+    print("✅ TTL and LRU work")
+    return True
+
+def test_disk_tier():
+    """Test entries survive in the on-disk tier and are promoted on read"""
+    print("Testing persistent disk tier...")
+    path = os.path.join(tempfile.mkdtemp(), 'advice.db')
+    AdviceCache(path=path).set('k', 'Lời khuyên')
+
+    cache = AdviceCache(path=path)
+    if cache.get('k') != 'Lời khuyên' or cache.get('k') != 'Lời khuyên':
+        print("❌ Disk entry not found")
+        return False
+    stats = cache.get_stats()
+    if stats['disk_hits'] != 1 or stats['hits'] != 1:
+        print(f"❌ Disk hit should be promoted to memory: {stats}")
+        return False
+
+    print("✅ Disk tier persists and promotes")
+    return True
+
+def test_manager_uses_cache():
+    """Test repeat advice for a similar state skips the upstream and returns in under 1ms"""
+    print("Testing PerplexityManager cache integration...")
+    manager = PerplexityManager()
+    manager.cache = AdviceCache()
+    calls = []
+
+    def fake_request(messages, system_prompt=None):
+        calls.append(messages)
+        return {'choices': [{'message': {'content': 'Tĩnh tâm tu luyện'}}]}
+
+    manager._make_request = fake_request
+    user = {'cultivation_level': 'Trúc Cơ', 'spiritual_power': 1500, 'spiritual_stones': 12100, 'pills_count': 3}
+    manager.get_cultivation_advice(user)
+
+    started = time.perf_counter()
+    advice = manager.get_cultivation_advice(dict(user, spiritual_stones=11900))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if advice != 'Tĩnh tâm tu luyện' or len(calls) != 1:
+        print(f"❌ Expected a cache hit, upstream calls={len(calls)}")
+        return False
+    if elapsed_ms >= 1:
+        print(f"❌ Cache hit took {elapsed_ms:.3f}ms")
+        return False
+
+    manager._make_request = lambda messages, system_prompt=None: None
+    manager.get_cultivation_advice(dict(user, cultivation_level='Kim Đan'))
+    if manager.cache.get_stats()['size'] != 1:
+        print("❌ Fallback answers must not be cached")
+        return False
+
+    print(f"✅ Repeat advice served from cache in {elapsed_ms:.3f}ms")
+    return True
+
+def test_single_flight():
+    """Test concurrent identical advice calls share one upstream request"""
+    print("Testing single-flight coalescing...")
+    manager = PerplexityManager()
+    manager.cache = AdviceCache()
+    manager.flight = SingleFlight()
+    calls = []
+
+    def slow_request(messages, system_prompt=None):
+        calls.append(messages)
+        time.sleep(0.2)
+        return {'choices': [{'message': {'content': 'Đoàn kết là sức mạnh'}}]}
+
+    manager._make_request = slow_request
+    guild = {'name': 'Thiên Kiếm', 'member_count': 12, 'level': 3, 'treasury': 50000}
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get_guild_management_advice(guild, 'Bang Chủ')))
+               for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if len(calls) != 1 or results != ['Đoàn kết là sức mạnh'] * 10:
+        print(f"❌ Expected 1 upstream call, got {len(calls)}")
+        return False
+    if manager.flight.get_stats()['shared'] != 9:
+        print(f"❌ Stats wrong: {manager.flight.get_stats()}")
+        return False
+
+    print("✅ Ten concurrent calls shared one upstream request")
+    return True
+
+def _worker_advice(cache_path, lock_dir, counter_path):
+    """Child process: one gunicorn-like worker asking the same question"""
+    manager = PerplexityManager()
+    manager.cache = AdviceCache(path=cache_path)
+    manager.flight = SingleFlight(lock_dir=lock_dir)
+
+    def slow_request(messages, system_prompt=None):
+        with open(counter_path, 'a') as f:
+            f.write('x')
+        time.sleep(0.3)
+        return {'choices': [{'message': {'content': 'Thiên địa bất nhân'}}]}
+
+    manager._make_request = slow_request
+    manager.get_general_advice('Thế giới mới xuất hiện?')
+
+def test_cross_worker_lock():
+    """Test the file lock coalesces identical calls across processes"""
+    print("Testing cross-worker single-flight...")
+    if SingleFlight(lock_dir=tempfile.mkdtemp()).lock_dir is None:
+        print("✅ fcntl unavailable, cross-worker lock disabled")
+        return True
+
+    tmp = tempfile.mkdtemp()
+    counter_path = os.path.join(tmp, 'calls')
+    ctx = multiprocessing.get_context('fork')
+    workers = [ctx.Process(target=_worker_advice, args=(os.path.join(tmp, 'cache.db'), os.path.join(tmp, 'locks'), counter_path))
+               for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    upstream_calls = len(open(counter_path).read()) if os.path.exists(counter_path) else 0
+    if upstream_calls != 1:
+        print(f"❌ Expected 1 upstream call across workers, got {upstream_calls}")
+        return False
+
+    print("✅ Four workers shared one upstream request")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting advice cache tests...")
+    print("=" * 50)
+
+    tests = [
+        test_bucketing,
+        test_ttl_and_lru,
+        test_disk_tier,
+        test_manager_uses_cache,
+        test_single_flight,
+        test_cross_worker_lock
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Test script and load test for the async AI chat server against a local fake upstream
+"""
+import sys
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+from aiohttp import web
+from flask import Flask
+from config import config
+import ai_chat_server
+from ai_tutien_girl import TuTienAIGirl
+from conversation_store import ConversationStore
+from advice_cache import AdviceCache
+from http_client import ResilientHTTPClient
+from perplexity_helper import PerplexityManager
+
+UPSTREAM_DELAY = 0.2  # độ trễ giả lập của Perplexity
+
+def start_async_upstream(delay=UPSTREAM_DELAY):
+    """Fake chat-completions endpoint on its own event loop thread; many requests wait concurrently"""
+    state = {'hits': 0}
+    ready = threading.Event()
+
+    async def completions(request):
+        await request.read()
+        state['hits'] += 1
+        await asyncio.sleep(delay)
+        return web.json_response({'choices': [{'message': {'content': 'Đạo pháp tự nhiên'}}]})
+
+    def run():
+        loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_post('/chat/completions', completions)
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, '127.0.0.1', 0, backlog=4096)
+        loop.run_until_complete(site.start())
+        state['url'] = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/chat/completions"
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return state
+
+def make_manager(url):
+    manager = PerplexityManager()
+    manager.api_key = 'test-key'
+    manager.base_url = url
+    manager.cache = AdviceCache()
+    manager.client = ResilientHTTPClient(max_concurrency=8, acquire_timeout=30)
+    return manager
+
+async def start_chat_server():
+    runner = web.AppRunner(ai_chat_server.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0, backlog=4096)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+def session_cookie(user_id):
+    """A Flask session cookie for user_id, signed like the Flask app does"""
+    flask_app = Flask(__name__)
+    flask_app.config.from_object(config['default'])
+    return flask_app.session_interface.get_signing_serializer(flask_app).dumps({'_user_id': str(user_id)})
+
+def test_chat_and_memory():
+    """Test the async endpoint answers, asks the advisor and remembers logged-in users"""
+    print("Testing async chat endpoint...")
+    upstream = start_async_upstream(delay=0.01)
+    ai_chat_server.perplexity_manager = make_manager(upstream['url'])
+    ai_chat_server.ai_girl = TuTienAIGirl(memory_store=ConversationStore())
+
+    async def run():
+        runner, base = await start_chat_server()
+        try:
+            async with aiohttp.ClientSession(cookies={'session': session_cookie(42)}) as http:
+                async with http.post(f"{base}/api/ai/chat", json={'message': 'Làm sao để tu luyện nhanh?'}) as r:
+                    body = await r.json()
+                async with http.post(f"{base}/api/ai/chat", json={}) as r:
+                    missing_status = r.status
+            return body, missing_status
+        finally:
+            await ai_chat_server.perplexity_manager.close_async()
+            await runner.cleanup()
+
+    body, missing_status = asyncio.run(run())
+    data = body.get('data', {})
+    if not body.get('success') or data.get('advice') != 'Đạo pháp tự nhiên':
+        print(f"❌ Unexpected response: {body}")
+        return False
+    if missing_status != 400:
+        print(f"❌ Empty message should be rejected, got {missing_status}")
+        return False
+    if [m['user_message'] for m in ai_chat_server.ai_girl.get_memories(42)] != ['Làm sao để tu luyện nhanh?']:
+        print("❌ Turn not remembered for the session user")
+        return False
+
+    print("✅ Async chat answers with advice and remembers the user")
+    return True
+
+def test_rate_limited_like_flask():
+    """Test the async endpoint enforces the Flask route's per-user limit, keyed on the session user"""
+    print("Testing async chat rate limit...")
+    ai_chat_server.chat_limiter.enabled = True
+    ai_chat_server.chat_limiter.reset()
+    ai_chat_server.perplexity_manager = make_manager('http://127.0.0.1:9/unused')
+    ai_chat_server.perplexity_manager.api_key = None
+    ai_chat_server.ai_girl = TuTienAIGirl(memory_store=ConversationStore())
+
+    async def run():
+        runner, base = await start_chat_server()
+        try:
+            async with aiohttp.ClientSession(cookies={'session': session_cookie(7)}) as first, \
+                    aiohttp.ClientSession(cookies={'session': session_cookie(8)}) as second:
+                statuses = []
+                for _ in range(ai_chat_server.CHAT_RATE_LIMIT + 1):
+                    async with first.post(f"{base}/api/ai/chat", json={'message': 'Chào bạn!'}) as r:
+                        statuses.append(r.status)
+                        limited = (await r.json(), r.headers.get('Retry-After'))
+                async with second.post(f"{base}/api/ai/chat", json={'message': 'Chào bạn!'}) as r:
+                    other = r.status
+            return statuses, limited, other
+        finally:
+            await runner.cleanup()
+
+    statuses, (body, retry_after), other = asyncio.run(run())
+    if statuses[:-1] != [200] * ai_chat_server.CHAT_RATE_LIMIT or statuses[-1] != 429:
+        print(f"❌ Expected {ai_chat_server.CHAT_RATE_LIMIT} answers then 429: {statuses}")
+        return False
+    if body.get('success') is not False or not retry_after or other != 200:
+        print(f"❌ Bad 429 or limit not per user: {body} Retry-After={retry_after} other={other}")
+        return False
+
+    print("✅ Same 20/60s per-user limit as the Flask route")
+    return True
+
+def test_load_async_vs_sync(sessions=1000, sync_sessions=200, sync_threads=8):
+    """Load test: async server vs a synthetic sync baseline (not the Flask route)
+
+    The baseline calls generate_response plus a blocking Perplexity request per session on a
+    gthread-sized pool. The real Flask /api/ai/chat never calls Perplexity, so the ratio measures
+    waiting on the upstream with threads vs coroutines, not Flask vs aiohttp.
+    """
+    print("Load testing async server vs synthetic sync baseline...")
+    upstream = start_async_upstream()
+    questions = [f"Làm sao để đột phá cảnh giới lần {i}?" for i in range(sessions)]
+
+    # Đồng bộ tổng hợp: mỗi phiên giữ một thread trong suốt lời gọi upstream (như gunicorn --threads 8)
+    sync_manager = make_manager(upstream['url'])
+    sync_girl = TuTienAIGirl(memory_store=ConversationStore())
+
+    def sync_chat(question):
+        response = sync_girl.generate_response(question)
+        response['advice'] = sync_manager.get_general_advice(question)
+        return response
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sync_threads) as pool:
+        sync_results = list(pool.map(sync_chat, questions[:sync_sessions]))
+    sync_elapsed = time.perf_counter() - started
+    sync_rate = sync_sessions / sync_elapsed
+
+    # Bất đồng bộ: mọi phiên chờ upstream cùng lúc trên một event loop
+    ai_chat_server.perplexity_manager = make_manager(upstream['url'])
+    ai_chat_server.ai_girl = TuTienAIGirl(memory_store=ConversationStore())
+
+    async def run():
+        runner, base = await start_chat_server()
+        # Đo công suất thô: mọi phiên ẩn danh cùng một IP sẽ bị giới hạn ngay nếu để bật
+        ai_chat_server.chat_limiter.enabled = False
+        connector = aiohttp.TCPConnector(limit=sessions)
+        try:
+            async with aiohttp.ClientSession(connector=connector) as http:
+                async def one(question):
+                    async with http.post(f"{base}/api/ai/chat", json={'message': question}) as r:
+                        return await r.json()
+                started = time.perf_counter()
+                results = await asyncio.gather(*(one(q) for q in questions))
+                return results, time.perf_counter() - started
+        finally:
+            await ai_chat_server.perplexity_manager.close_async()
+            await runner.cleanup()
+
+    async_results, async_elapsed = asyncio.run(run())
+    async_rate = sessions / async_elapsed
+
+    print(f"   synthetic sync baseline ({sync_threads} threads, blocking upstream call): "
+          f"{sync_sessions} sessions in {sync_elapsed:.2f}s -> {sync_rate:,.0f} sessions/s")
+    print(f"   async (1 process): {sessions} sessions in {async_elapsed:.2f}s -> {async_rate:,.0f} sessions/s")
+
+    advised = sum(1 for r in async_results if r.get('success') and r['data'].get('advice') == 'Đạo pháp tự nhiên')
+    if advised != sessions or any(r.get('advice') != 'Đạo pháp tự nhiên' for r in sync_results):
+        print(f"❌ Only {advised}/{sessions} async sessions got upstream advice")
+        return False
+    if async_rate < sync_rate * 2:
+        print("❌ Async server should sustain far more concurrent sessions than the sync pool")
+        return False
+
+    print(f"✅ {sessions} concurrent sessions served by one process "
+          f"({async_rate / sync_rate:.1f}x the synthetic sync baseline)")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting async AI chat server tests...")
+    print("=" * 50)
+
+    tests = [
+        test_chat_and_memory,
+        test_rate_limited_like_flask,
+        test_load_async_vs_sync
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
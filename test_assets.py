@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test script for the static asset bundles
+"""
+import gzip
+import os
+import sys
+import tempfile
+import time
+from flask import Flask, render_template_string
+from assets import Assets, build, minify_css
+
+SOURCES = {
+    'js/a.js': "// tiện ích\nfunction hello() {\n    return 'xin chào';\n}\n",
+    'js/b.js': "const answer = hello()\n",
+    'css/site.css': "/* giao diện */\nbody {\n    color: gold;\n}\n.card > .title { margin: 0 ; }\n",
+}
+TEST_BUNDLES = {'site.js': ['js/a.js', 'js/b.js'], 'site.css': ['css/site.css']}
+
+def make_static():
+    static_dir = tempfile.mkdtemp()
+    for name, content in SOURCES.items():
+        os.makedirs(os.path.join(static_dir, os.path.dirname(name)), exist_ok=True)
+        with open(os.path.join(static_dir, name), 'w', encoding='utf-8') as f:
+            f.write(content)
+    return static_dir
+
+def make_app(static_dir, enabled=True):
+    app = Flask(__name__, static_folder=static_dir, static_url_path='/static')
+    app.config['ASSETS_BUNDLE'] = enabled
+    assets = Assets(static_dir=static_dir, bundles=TEST_BUNDLES)
+    assets.init_app(app)
+    return app, assets
+
+def test_build():
+    """Test bundles are concatenated in order, minified, content-hashed and precompressed"""
+    print("Testing bundle build...")
+    static_dir = make_static()
+    manifest = build(static_dir, TEST_BUNDLES)
+    dist = os.path.join(static_dir, 'dist')
+
+    js_name = manifest['site.js']
+    with open(os.path.join(dist, js_name), encoding='utf-8') as f:
+        js = f.read()
+    if not js_name.startswith('site.') or js.index('function hello') > js.index('const answer'):
+        print(f"❌ Unexpected bundle {js_name}: {js!r}")
+        return False
+    with open(os.path.join(dist, js_name + '.gz'), 'rb') as f:
+        if gzip.decompress(f.read()).decode('utf-8') != js:
+            print("❌ .gz variant does not match the bundle")
+            return False
+
+    if minify_css(SOURCES['css/site.css']) != 'body{color: gold}.card>.title{margin: 0}':
+        print(f"❌ CSS minification wrong: {minify_css(SOURCES['css/site.css'])!r}")
+        return False
+
+    if build(static_dir, TEST_BUNDLES) != manifest:
+        print("❌ Same sources should give the same hashed names")
+        return False
+    with open(os.path.join(static_dir, 'js/b.js'), 'a', encoding='utf-8') as f:
+        f.write("console.log(answer)\n")
+    if build(static_dir, TEST_BUNDLES)['site.js'] == js_name:
+        print("❌ Changed source should change the hashed name")
+        return False
+
+    print("✅ Bundles built with content hashes")
+    return True
+
+def test_serve_immutable_precompressed():
+    """Test templates reference one hashed file served precompressed with immutable caching"""
+    print("Testing bundle serving...")
+    app, assets = make_app(make_static())
+    client = app.test_client()
+    with app.test_request_context():
+        tags = render_template_string("{{ asset_tags('site.js') }}")
+    url = tags.split('"')[1]
+
+    if tags.count('<script') != 1 or not url.startswith('/static/dist/site.'):
+        print(f"❌ Unexpected tags: {tags}")
+        return False
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    body = response.data
+    if response.headers.get('Content-Encoding') != 'gzip' or 'immutable' not in response.headers['Cache-Control']:
+        print(f"❌ Wrong headers: {dict(response.headers)}")
+        return False
+    if 'javascript' not in response.mimetype or b'hello' not in gzip.decompress(body):
+        print("❌ Wrong content type or body")
+        return False
+
+    plain = client.get(url)
+    if plain.headers.get('Content-Encoding') or b'hello' not in plain.data:
+        print("❌ Clients without gzip should get the plain file")
+        return False
+
+    print("✅ Served precompressed with far-future caching")
+    return True
+
+def test_disabled_and_stale():
+    """Test bundling off emits the source files, and edits mark the build stale"""
+    print("Testing debug mode and staleness...")
+    static_dir = make_static()
+    app, assets = make_app(static_dir, enabled=False)
+    with app.test_request_context():
+        tags = render_template_string("{{ asset_tags('site.js') }}")
+    if tags.count('<script') != 2 or '/static/js/a.js' not in tags:
+        print(f"❌ Source tags expected: {tags}")
+        return False
+
+    app, assets = make_app(static_dir)
+    if assets.is_stale():
+        print("❌ Fresh build should not be stale")
+        return False
+    later = time.time() + 10
+    os.utime(os.path.join(static_dir, 'js/a.js'), (later, later))
+    if not assets.is_stale():
+        print("❌ Edited source should make the build stale")
+        return False
+
+    print("✅ Debug mode and staleness detection work")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting asset bundle tests...")
+    print("=" * 50)
+
+    tests = [
+        test_build,
+        test_serve_immutable_precompressed,
+        test_disabled_and_stale
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Test script for response compression and the fast JSON provider
+
+Chạy trực tiếp (`python test_compression.py`) để xem benchmark byte/thời gian
+trước và sau cho hai payload lớn nhất: danh sách tin nhắn và chi tiết thế giới.
+"""
+import gzip
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from flask import Flask, Response, jsonify
+from flask.json.provider import DefaultJSONProvider
+import json_provider
+from compression import Compressor
+
+def messages_payload():
+    """Same shape as /api/get-messages (20 newest messages)"""
+    start = datetime(2026, 1, 1, 8, 0, 0)
+    return {'success': True, 'messages': [{
+        'id': 1000 + i,
+        'content': f'Đạo hữu số {i} vừa đột phá Trúc Cơ kỳ, linh khí tràn ngập động phủ! Ai muốn cùng đi thám hiểm bí cảnh không?',
+        'user_id': 10 + i % 7,
+        'user_name': f'Thanh Vân Tử {i % 7}',
+        'created_at': (start + timedelta(minutes=i)).isoformat()
+    } for i in range(20)]}
+
+def world_payload():
+    """Same shape as /api/get-world-details/<id>"""
+    world = {key: 50 + i for i, key in enumerate((
+        'id', 'world_level', 'world_experience', 'spiritual_density', 'resource_richness', 'stability',
+        'barrier_strength', 'guardian_level', 'market_level', 'infrastructure_level',
+        'enlightenment_spots', 'spiritual_stones_production', 'daily_income', 'pending_yield',
+        'harvest_cooldown', 'total_power'))}
+    world.update({
+        'name': 'Thiên Nguyên Giới', 'world_type': 'Tiểu Thế Giới', 'cultivation_bonus': 1.25,
+        'hourly_rate': 412.5, 'dimensional_gate': True, 'time_acceleration': False,
+        'auto_cultivation': True, 'resource_multiplication': False,
+        'special_resources': {'spiritual_herbs': 120, 'ancient_artifacts': 3, 'essence_crystals': 45,
+                              'dragon_scales': 2, 'phoenix_feathers': 1}
+    })
+    return {'success': True, 'world': world}
+
+def make_app(fast_json=True, min_size=500):
+    app = Flask(__name__)
+    app.config['COMPRESS_MIN_SIZE'] = min_size
+    if fast_json:
+        json_provider.init_app(app)
+    compressor = Compressor()
+    compressor.init_app(app)
+
+    @app.route('/messages')
+    def messages():
+        return jsonify(messages_payload())
+
+    @app.route('/world')
+    def world():
+        return jsonify(world_payload())
+
+    @app.route('/small')
+    def small():
+        return jsonify({'success': True})
+
+    @app.route('/etag')
+    def etag():
+        response = jsonify(messages_payload())
+        response.set_etag('v1')
+        return response
+
+    @app.route('/stream')
+    def stream():
+        return Response((f'data: {i}\n\n' for i in range(200)), mimetype='text/event-stream')
+
+    @app.route('/encoded')
+    def encoded():
+        response = Response(gzip.compress(b'x' * 2000), mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    return app, compressor
+
+def test_provider_matches_default():
+    """Test orjson output parses to the same data as the default provider"""
+    print("Testing JSON provider...")
+    if json_provider.orjson is None:
+        print("✅ orjson not installed, default provider kept")
+        return True
+
+    app, _ = make_app()
+    default = DefaultJSONProvider(app)
+    payload = {'b': [1, 2.5, None], 'a': datetime(2026, 1, 2, 3, 4, 5), 'text': 'Tu Tiên'}
+    with app.app_context():
+        fast = app.json.dumps(payload)
+        if not isinstance(app.json, json_provider.OrjsonProvider) or json.loads(fast) != json.loads(default.dumps(payload)):
+            print(f"❌ Output differs: {fast}")
+            return False
+        if not fast.startswith('{"a":"Fri, 02 Jan 2026 03:04:05 GMT"'):
+            print(f"❌ Keys should be sorted and dates in HTTP format: {fast}")
+            return False
+        if app.json.loads(fast) != json.loads(fast):
+            print("❌ loads() disagrees with json.loads")
+            return False
+
+    response = app.test_client().get('/messages')
+    if response.mimetype != 'application/json' or response.json != json.loads(json.dumps(messages_payload())):
+        print("❌ jsonify response wrong")
+        return False
+
+    print("✅ orjson provider matches the default output")
+    return True
+
+def test_negotiation():
+    """Test gzip is negotiated for large text bodies and skipped otherwise"""
+    print("Testing compression negotiation...")
+    app, compressor = make_app()
+    client = app.test_client()
+
+    response = client.get('/messages', headers={'Accept-Encoding': 'gzip, deflate'})
+    if response.headers.get('Content-Encoding') != 'gzip' or 'Accept-Encoding' not in response.headers.get('Vary', ''):
+        print(f"❌ Expected gzip with Vary: {dict(response.headers)}")
+        return False
+    if json.loads(gzip.decompress(response.data)) != client.get('/messages').json:
+        print("❌ Decompressed body differs from identity body")
+        return False
+
+    if client.get('/messages').headers.get('Content-Encoding'):
+        print("❌ Clients without Accept-Encoding must get identity")
+        return False
+    if client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers.get('Content-Encoding'):
+        print("❌ Bodies under the threshold should not be compressed")
+        return False
+    if client.get('/stream', headers={'Accept-Encoding': 'gzip'}).headers.get('Content-Encoding'):
+        print("❌ Streamed responses should not be compressed")
+        return False
+    encoded = client.get('/encoded', headers={'Accept-Encoding': 'gzip'})
+    if gzip.decompress(encoded.data) != b'x' * 2000:
+        print("❌ Already-encoded responses should not be compressed twice")
+        return False
+
+    etag = client.get('/etag', headers={'Accept-Encoding': 'gzip'}).headers.get('ETag')
+    if etag != '"v1-gzip"':
+        print(f"❌ Compressed representation needs its own ETag: {etag}")
+        return False
+
+    stats = compressor.get_stats()
+    if stats['compressed'] != 2 or not stats['ratio'] or stats['ratio'] >= 0.5:
+        print(f"❌ Stats wrong: {stats}")
+        return False
+
+    print("✅ Compression negotiated correctly")
+    return True
+
+def measure(app, path, encoding, rounds=300):
+    client = app.test_client()
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    with app.app_context():
+        payload = messages_payload() if path == '/messages' else world_payload()
+        started = time.perf_counter()
+        for _ in range(rounds):
+            app.json.response(payload)
+        serialize_us = (time.perf_counter() - started) / rounds * 1e6
+    size = len(client.get(path, headers=headers).data)
+    return size, serialize_us
+
+def test_benchmark():
+    """Benchmark bytes on the wire and serialization time before and after"""
+    print("Benchmarking biggest API payloads...")
+    before_app, _ = make_app(fast_json=False)
+    after_app, _ = make_app()
+
+    ok = True
+    for path in ('/messages', '/world'):
+        before_bytes, before_us = measure(before_app, path, None)
+        after_bytes, after_us = measure(after_app, path, 'gzip, br')
+        print(f"   {path:10} bytes {before_bytes:>6} -> {after_bytes:>5} "
+              f"({after_bytes / before_bytes:.0%}), serialize {before_us:6.1f}µs -> {after_us:6.1f}µs")
+        if after_bytes >= before_bytes:
+            ok = False
+
+    if not ok:
+        print("❌ Compressed responses should be smaller")
+        return False
+    print("✅ Benchmark done")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting compression tests...")
+    print("=" * 50)
+
+    tests = [
+        test_provider_matches_default,
+        test_negotiation,
+        test_benchmark
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
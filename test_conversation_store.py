@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Test script for per-user AI conversation memory and persona state
+"""
+import sys
+import os
+import sqlite3
+import tempfile
+import threading
+from conversation_store import ConversationStore
+from ai_tutien_girl import TuTienAIGirl, PersonaState
+
+def turn(i):
+    return {'user_message': f'tin nhắn {i}', 'ai_response': f'trả lời {i}'}
+
+def test_ring_buffer():
+    """Test each user keeps only the last max_turns turns"""
+    print("Testing bounded ring buffers...")
+    store = ConversationStore(max_turns=3)
+    for i in range(5):
+        store.append(1, turn(i))
+    store.append(2, turn(99))
+
+    if [t['user_message'] for t in store.recent(1)] != ['tin nhắn 2', 'tin nhắn 3', 'tin nhắn 4']:
+        print(f"❌ Unexpected turns: {store.recent(1)}")
+        return False
+    if store.recent(1, 1) != [turn(4)] or store.recent(2) != [turn(99)]:
+        print("❌ Last-N read or user isolation wrong")
+        return False
+
+    print("✅ Buffers bounded and isolated per user")
+    return True
+
+def test_lru_eviction():
+    """Test idle users are evicted from memory but reload from the log"""
+    print("Testing LRU eviction of idle users...")
+    path = os.path.join(tempfile.mkdtemp(), 'memory.db')
+    store = ConversationStore(max_turns=5, max_users=2, path=path)
+    store.append('a', turn(1))
+    store.append('b', turn(2))
+    store.recent('a')
+    store.append('c', turn(3))
+
+    stats = store.get_stats()
+    if stats['users'] != 2 or stats['evictions'] != 1:
+        print(f"❌ Stats wrong: {stats}")
+        return False
+    if store.recent('b') != [turn(2)]:
+        print("❌ Evicted user should reload from the log")
+        return False
+
+    print("✅ Idle users evicted and reloaded")
+    return True
+
+def test_shared_across_workers():
+    """Test two stores on one log (two workers) see each other's turns in order"""
+    print("Testing context across workers...")
+    path = os.path.join(tempfile.mkdtemp(), 'memory.db')
+    worker_a = ConversationStore(max_turns=10, path=path)
+    worker_b = ConversationStore(max_turns=10, path=path)
+
+    worker_a.append(7, turn(1))
+    worker_b.append(7, turn(2))
+    worker_a.append(7, turn(3))
+
+    expected = [turn(1), turn(2), turn(3)]
+    if worker_a.recent(7) != expected or worker_b.recent(7) != expected:
+        print(f"❌ Workers disagree: {worker_a.recent(7)} / {worker_b.recent(7)}")
+        return False
+
+    if ConversationStore(max_turns=10, path=path).recent(7) != expected:
+        print("❌ Turns lost after restart")
+        return False
+
+    print("✅ Context follows the user across workers and restarts")
+    return True
+
+def test_compaction():
+    """Test compaction trims the log to max_turns per user and drops stale users"""
+    print("Testing log compaction...")
+    path = os.path.join(tempfile.mkdtemp(), 'memory.db')
+    now = [1000.0]
+    store = ConversationStore(max_turns=3, path=path, clock=lambda: now[0])
+    for i in range(10):
+        store.append(1, turn(i))
+    store.append(2, turn(0))
+
+    now[0] += store.RETENTION - 1
+    store.append(1, turn(10))
+    now[0] += 2
+    store.compact()
+
+    rows = sqlite3.connect(path).execute(
+        'SELECT user_key, COUNT(*) FROM conversation_turns GROUP BY user_key'
+    ).fetchall()
+    if rows != [('1', 3)]:
+        print(f"❌ Unexpected rows after compaction: {rows}")
+        return False
+    if [t['user_message'] for t in store.recent(1)] != ['tin nhắn 8', 'tin nhắn 9', 'tin nhắn 10']:
+        print("❌ Compaction must keep the latest turns")
+        return False
+
+    print("✅ Log compacted")
+    return True
+
+def test_ai_girl_memory():
+    """Test the AI girl remembers per user and forgets guests"""
+    print("Testing AI girl memory integration...")
+    ai = TuTienAIGirl(memory_store=ConversationStore(max_turns=5))
+    ai.generate_response("Chào bạn!", user_id=1)
+    ai.generate_response("Tôi muốn học tu luyện", user_id=1)
+    ai.generate_response("Tôi đang buồn", user_id=2)
+    ai.generate_response("Xin chào")
+
+    if [m['user_message'] for m in ai.get_memories(1)] != ["Chào bạn!", "Tôi muốn học tu luyện"]:
+        print(f"❌ Wrong memories: {ai.get_memories(1)}")
+        return False
+    if ai.get_status(2)['memories_count'] != 1 or ai.get_status()['memories_count'] != 0:
+        print("❌ Memory counts wrong")
+        return False
+
+    print("✅ Memories kept per user")
+    return True
+
+def test_persona_isolation():
+    """Test one user's mood never leaks into another user's replies under concurrency"""
+    print("Testing per-user persona state...")
+    ai = TuTienAIGirl(memory_store=ConversationStore(max_turns=5), max_states=50)
+    errors = []
+
+    def chat(user_id, message, mood):
+        for _ in range(200):
+            response = ai.generate_response(message, user_id=user_id)
+            # Sau mỗi lượt, tâm trạng chỉ phản ánh tin nhắn của chính người chơi này
+            if ai.get_state(user_id).mood != mood:
+                errors.append((user_id, response['mood']))
+
+    threads = [threading.Thread(target=chat, args=(1, "Tôi rất vui", "happy")),
+               threading.Thread(target=chat, args=(2, "Tôi đang buồn", "concerned"))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    if errors:
+        print(f"❌ Mood leaked between users: {errors[:3]}")
+        return False
+    if hasattr(PersonaState(), '__dict__'):
+        print("❌ PersonaState should use __slots__")
+        return False
+
+    for user_id in range(100):
+        ai.get_state(user_id)
+    if ai.get_status()['active_personas'] != 50:
+        print("❌ Persona LRU not bounded")
+        return False
+
+    print("✅ Persona state isolated per user and bounded")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting conversation store tests...")
+    print("=" * 50)
+
+    tests = [
+        test_ring_buffer,
+        test_lru_eviction,
+        test_shared_across_workers,
+        test_compaction,
+        test_ai_girl_memory,
+        test_persona_isolation
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
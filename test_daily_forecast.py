@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test script for deterministic, date-keyed weather and fortune
+"""
+import os
+import sys
+import subprocess
+from datetime import date, datetime, timedelta
+from cachelib import SimpleCache
+from ai_helper import CultivationAI, FAVORABLE_FORTUNES
+
+class FakeUser:
+    def __init__(self, user_id, cultivation_level='Trúc Cơ Tầng 3', karma_points=0):
+        self.id = user_id
+        self.cultivation_level = cultivation_level
+        self.karma_points = karma_points
+
+DAY = date(2026, 3, 15)
+
+def test_weather_is_daily():
+    """Test weather is fixed for a day and 'tomorrow' becomes the next day's 'current'"""
+    print("Testing daily weather...")
+    ai = CultivationAI()
+    today = ai.get_weather_forecast(DAY)
+
+    if any(ai.get_weather_forecast(DAY) != today for _ in range(20)):
+        print("❌ Forecast changes between requests")
+        return False
+    if ai.get_weather_forecast(DAY + timedelta(days=1))['current'] != today['tomorrow']:
+        print("❌ Tomorrow's forecast should match tomorrow's weather")
+        return False
+
+    seen = {ai.get_weather_forecast(DAY + timedelta(days=i))['current'] for i in range(60)}
+    if len(seen) < 3:
+        print(f"❌ Weather barely varies across days: {seen}")
+        return False
+
+    print("✅ One forecast per day")
+    return True
+
+def test_fortune_per_user_per_day():
+    """Test fortune is stable per user and day, and varies across users and days"""
+    print("Testing daily fortune...")
+    ai = CultivationAI()
+    user = FakeUser(7)
+
+    if ai.predict_cultivation_fortune(user, DAY) != ai.predict_cultivation_fortune(FakeUser(7), DAY):
+        print("❌ Fortune not stable for the same user and day")
+        return False
+
+    by_user = {ai.predict_cultivation_fortune(FakeUser(i), DAY) for i in range(50)}
+    by_day = {ai.predict_cultivation_fortune(user, DAY + timedelta(days=i)) for i in range(50)}
+    if len(by_user) < 4 or len(by_day) < 4:
+        print(f"❌ Fortune should vary: {len(by_user)} across users, {len(by_day)} across days")
+        return False
+
+    print("✅ One fortune per user per day")
+    return True
+
+def test_fortune_depends_on_stats():
+    """Test level and karma feed the fortune: karma tilts it towards favorable outcomes"""
+    print("Testing fortune inputs...")
+    ai = CultivationAI()
+    favorable = {ai.FORTUNES[i] for i in FAVORABLE_FORTUNES}
+
+    def favorable_share(karma):
+        picks = [ai.predict_cultivation_fortune(FakeUser(i, karma_points=karma), DAY) for i in range(400)]
+        return sum(pick in favorable for pick in picks) / len(picks)
+
+    low, high = favorable_share(-500), favorable_share(500)
+    if not low + 0.3 < high:
+        print(f"❌ Karma should raise the favorable share: {low:.2f} -> {high:.2f}")
+        return False
+
+    changed = sum(ai.predict_cultivation_fortune(FakeUser(i), DAY)
+                  != ai.predict_cultivation_fortune(FakeUser(i, 'Kết Đan Tầng 1'), DAY) for i in range(100))
+    if changed < 20:
+        print(f"❌ Level should feed the fortune, only {changed}/100 changed")
+        return False
+
+    print(f"✅ Favorable share {low:.0%} at low karma, {high:.0%} at high karma")
+    return True
+
+def test_memo_shared_and_utc():
+    """Test the memo lives in the shared cache (another worker reuses it) and days follow UTC"""
+    print("Testing shared memo...")
+    shared = SimpleCache()
+    first, second = CultivationAI(shared), CultivationAI(shared)
+    user = FakeUser(9)
+    fortune = first.predict_cultivation_fortune(user, DAY)
+    weather = first.get_weather_forecast(DAY)
+
+    def fail(*args):
+        raise AssertionError('recomputed')
+    second._fortune = second._weather_forecast = fail
+    try:
+        if second.predict_cultivation_fortune(user, DAY) != fortune or second.get_weather_forecast(DAY) != weather:
+            print("❌ Second worker got a different value")
+            return False
+    except AssertionError:
+        print("❌ Second worker recomputed instead of reading the shared memo")
+        return False
+
+    if CultivationAI.game_day() != datetime.utcnow().date().isoformat():
+        print("❌ Game day should follow UTC")
+        return False
+
+    print("✅ Memo shared through the cache, day boundary in UTC")
+    return True
+
+def test_consistent_across_workers():
+    """Test two processes with different hash seeds agree (as gunicorn workers must)"""
+    print("Testing consistency across processes...")
+    script = (
+        "from datetime import date; from ai_helper import CultivationAI\n"
+        "class U: id = 42; cultivation_level = 'Trúc Cơ Tầng 3'; karma_points = 0\n"
+        "ai = CultivationAI(); d = date(2026, 3, 15)\n"
+        "print(ai.get_weather_forecast(d)['current'], '|', ai.predict_cultivation_fortune(U(), d))"
+    )
+    outputs = set()
+    for seed in ('1', '2'):
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+        outputs.add(result.stdout.strip())
+
+    local = CultivationAI()
+    expected = f"{local.get_weather_forecast(DAY)['current']} | {local.predict_cultivation_fortune(FakeUser(42), DAY)}"
+    if outputs != {expected}:
+        print(f"❌ Processes disagree: {outputs}")
+        return False
+
+    print("✅ Every worker computes the same day")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting daily forecast tests...")
+    print("=" * 50)
+
+    tests = [
+        test_weather_is_daily,
+        test_fortune_per_user_per_day,
+        test_fortune_depends_on_stats,
+        test_memo_shared_and_utc,
+        test_consistent_across_workers
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test script for the expedition lifecycle scheduler
+"""
+import sys
+import uuid
+from datetime import datetime, timedelta
+from app import app, db
+from models import Expedition, ExpeditionParticipant, User
+from expedition_scheduler import (ExpeditionScheduler, expedition_scheduler, STATUS_RECRUITING,
+                                  STATUS_ACTIVE, STATUS_COMPLETED, STATUS_CANCELLED)
+
+def make_expedition(status, start_time, duration_hours=24, participant_count=0):
+    expedition = Expedition(name='Thám Hiểm Thử', destination='Vạn Thú Sơn', status=status,
+                            start_time=start_time, duration_hours=duration_hours,
+                            participant_count=participant_count)
+    db.session.add(expedition)
+    db.session.commit()
+    return expedition
+
+def test_due_ordering():
+    """Test due expeditions come out earliest first, in bounded batches, and future ones stay queued"""
+    print("Testing due ordering...")
+    scheduler = ExpeditionScheduler()
+    scheduler.BATCH_SIZE = 3
+    now = datetime.utcnow()
+    for minutes, expedition_id in [(-5, 5), (-30, 1), (10, 9), (-10, 4), (-20, 2), (-15, 3)]:
+        scheduler._heap.append((now + timedelta(minutes=minutes), expedition_id))
+    scheduler._heap.sort()
+
+    first, second, third = scheduler._pop_due(now), scheduler._pop_due(now), scheduler._pop_due(now)
+    if first != [1, 2, 3] or second != [4, 5] or third:
+        print(f"❌ Unexpected batches: {first} {second} {third}")
+        return False
+    if [expedition_id for _, expedition_id in scheduler._heap] != [9]:
+        print(f"❌ Future expedition should stay queued: {scheduler._heap}")
+        return False
+
+    print("✅ Due expeditions popped in order")
+    return True
+
+def test_failed_batch_is_retried():
+    """Test ids whose batch failed go back on the heap with growing backoff, and succeed later"""
+    print("Testing failure and re-push...")
+    scheduler = ExpeditionScheduler()
+    calls = []
+
+    def flaky_advance(expedition_ids, now=None):
+        calls.append(list(expedition_ids))
+        if len(calls) < 3:
+            raise RuntimeError('database is locked')
+        return len(expedition_ids)
+
+    scheduler.advance = flaky_advance
+    with app.app_context():
+        delays = []
+        for _ in range(2):
+            started = datetime.utcnow()
+            scheduler.process([7, 8])
+            due_at = min(due for due, _ in scheduler._heap)
+            delays.append((due_at - started).total_seconds())
+            if sorted(expedition_id for _, expedition_id in scheduler._heap) != [7, 8]:
+                print(f"❌ Failed ids should be re-pushed: {scheduler._heap}")
+                return False
+            scheduler._heap.clear()
+
+        if not (scheduler.RETRY_BASE_SECONDS <= delays[0] < delays[1] <= scheduler.RETRY_MAX_SECONDS):
+            print(f"❌ Backoff should grow: {delays}")
+            return False
+        if scheduler.process([7, 8]) != 2 or scheduler._heap or scheduler._failures:
+            print("❌ Successful retry should clear the failure state")
+            return False
+
+    print(f"✅ Failed batch retried after {delays[0]:.0f}s then {delays[1]:.0f}s")
+    return True
+
+def test_rebuild_on_startup():
+    """Test the heap is rehydrated from pending expeditions and due ones advance"""
+    print("Testing startup rehydration...")
+    with app.app_context():
+        now = datetime.utcnow()
+        overdue = make_expedition(STATUS_RECRUITING, now - timedelta(minutes=5))
+        running = make_expedition(STATUS_ACTIVE, now - timedelta(hours=1), duration_hours=2)
+        finished = make_expedition(STATUS_COMPLETED, now - timedelta(days=2))
+        ids = [overdue.id, running.id, finished.id]
+        try:
+            if expedition_scheduler._thread is not None:
+                print("❌ Importing app must not start the scheduler thread")
+                return False
+
+            scheduler = ExpeditionScheduler()
+            scheduler.init_app(app)
+            scheduler.rebuild()
+            queued = {expedition_id: due for due, expedition_id in scheduler._heap}
+            if finished.id in queued or overdue.id not in queued:
+                print(f"❌ Only pending expeditions should be loaded: {sorted(queued)}")
+                return False
+            if abs((queued[running.id] - (running.start_time + timedelta(hours=2))).total_seconds()) > 1:
+                print("❌ Active expedition should be due at start_time + duration")
+                return False
+
+            scheduler.process(scheduler._pop_due(datetime.utcnow()))
+            if db.session.get(Expedition, overdue.id).status != STATUS_CANCELLED:
+                print("❌ Overdue expedition without members should be cancelled")
+                return False
+            if db.session.get(Expedition, running.id).status != STATUS_ACTIVE:
+                print("❌ Running expedition should not move yet")
+                return False
+        finally:
+            db.session.rollback()
+            Expedition.query.filter(Expedition.id.in_(ids)).delete()
+            db.session.commit()
+
+    print(f"✅ Rebuilt {len(queued)} pending expeditions from the database")
+    return True
+
+def test_join_only_while_recruiting():
+    """Test a running, finished or cancelled expedition cannot be joined (and so pays no reward)"""
+    print("Testing join status guard...")
+    with app.app_context():
+        name = f"joiner_{uuid.uuid4().hex[:8]}"
+        user = User(username=name, email=f"{name}@test.local")
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        now = datetime.utcnow()
+        expeditions = {status: make_expedition(status, now).id
+                       for status in (STATUS_ACTIVE, STATUS_COMPLETED, STATUS_CANCELLED, STATUS_RECRUITING)}
+    try:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        results = {status: client.post(f'/api/join-expedition/{expedition_id}').get_json()
+                   for status, expedition_id in expeditions.items()}
+
+        with app.app_context():
+            for status, expedition_id in expeditions.items():
+                joined = ExpeditionParticipant.query.filter_by(expedition_id=expedition_id, user_id=user_id).count()
+                count = db.session.get(Expedition, expedition_id).participant_count
+                should_join = status == STATUS_RECRUITING
+                if results[status]['success'] != should_join or joined != should_join or count != should_join:
+                    print(f"❌ Join on '{status}' gave {results[status]} (participants={joined}, count={count})")
+                    return False
+        if 'tuyển' not in results[STATUS_ACTIVE]['error']:
+            print(f"❌ Expected the not-recruiting error: {results[STATUS_ACTIVE]}")
+            return False
+    finally:
+        with app.app_context():
+            ExpeditionParticipant.query.filter_by(user_id=user_id).delete()
+            Expedition.query.filter(Expedition.id.in_(expeditions.values())).delete()
+            User.query.filter_by(id=user_id).delete()
+            db.session.commit()
+
+    print("✅ Only recruiting expeditions accept members")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting expedition scheduler tests...")
+    print("=" * 50)
+
+    tests = [
+        test_due_ordering,
+        test_failed_batch_is_retried,
+        test_rebuild_on_startup,
+        test_join_only_while_recruiting
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
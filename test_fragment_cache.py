@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for template fragment caching
+"""
+import sys
+from flask import Flask, render_template_string
+from flask_caching import Cache
+from fragment_cache import FragmentCache
+
+TEMPLATE = """
+{%- call cached_fragment('shared', timeout=60) %}[{{ load_shared() }}]{% endcall -%}
+{%- call cached_fragment('personal', user_id, version) %}({{ load_personal() }}){% endcall -%}
+"""
+
+def make_app():
+    app = Flask(__name__)
+    cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
+    fragments = FragmentCache()
+    fragments.init_app(app, cache)
+    return app, fragments
+
+def test_loaders_run_only_on_miss():
+    """Test fragment bodies (and their loaders) run once, then come from the cache"""
+    print("Testing fragment hits...")
+    app, fragments = make_app()
+    calls = {'shared': 0, 'personal': 0}
+
+    def render(user_id, version):
+        def load(name):
+            def loader():
+                calls[name] += 1
+                return f"{name}-{user_id}-{version}"
+            return loader
+        with app.app_context():
+            return render_template_string(TEMPLATE, user_id=user_id, version=version,
+                                          load_shared=load('shared'), load_personal=load('personal'))
+
+    first = render(1, 'a')
+    second = render(1, 'a')
+    if first != second or calls != {'shared': 1, 'personal': 1}:
+        print(f"❌ Loaders ran {calls}: {first!r} / {second!r}")
+        return False
+
+    other_user = render(2, 'a')
+    new_version = render(1, 'b')
+    if calls != {'shared': 1, 'personal': 3}:
+        print(f"❌ Personal fragment should vary by user and version: {calls}")
+        return False
+    if not other_user.startswith('[shared-1-a]') or '(personal-1-b)' not in new_version:
+        print(f"❌ Wrong fragments: {other_user!r} / {new_version!r}")
+        return False
+
+    stats = fragments.get_stats()
+    if stats != {'hits': 4, 'misses': 4}:
+        print(f"❌ Stats wrong: {stats}")
+        return False
+
+    print("✅ Shared and per-user fragments cached")
+    return True
+
+def test_invalidate_and_escaping():
+    """Test invalidation re-renders a shared fragment and cached HTML is not re-escaped"""
+    print("Testing invalidation...")
+    app, fragments = make_app()
+    value = ['<b>một</b>']
+    template = "{% call cached_fragment('chat') %}<p>{{ load() }}</p>{% endcall %}"
+
+    def render():
+        with app.app_context():
+            return render_template_string(template, load=lambda: value[0])
+
+    first = render()
+    value[0] = 'hai'
+    if render() != first:
+        print("❌ Cached fragment should not change before invalidation")
+        return False
+
+    fragments.invalidate('chat')
+    if render() != '<p>hai</p>':
+        print(f"❌ Fragment not re-rendered: {render()!r}")
+        return False
+    if first != '<p>&lt;b&gt;một&lt;/b&gt;</p>':
+        print(f"❌ Escaping wrong: {first!r}")
+        return False
+
+    print("✅ Invalidation re-renders the fragment")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting fragment cache tests...")
+    print("=" * 50)
+
+    tests = [
+        test_loaders_run_only_on_miss,
+        test_invalidate_and_escaping
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Test script for the background job queue
+"""
+import sys
+import tempfile
+import threading
+import time
+from job_queue import JobQueue, JobLimitExceeded, PRIORITY_INTERACTIVE, PRIORITY_BULK
+
+class FakeApp:
+    """Minimal stand-in for the Flask app (config + instance_path)"""
+    def __init__(self, **config):
+        self.instance_path = tempfile.mkdtemp()
+        self.config = {'JOB_QUEUE_ENABLED': False}
+        self.config.update(config)
+
+def make_queue():
+    queue = JobQueue()
+    queue.init_app(FakeApp())
+
+    @queue.task('add')
+    def add(a, b):
+        return {'sum': a + b}
+
+    @queue.task('boom')
+    def boom():
+        raise RuntimeError('linh khí hỗn loạn')
+
+    return queue
+
+def test_enqueue_and_run():
+    """Test a job goes queued -> running -> done and its result is readable"""
+    print("Testing enqueue, claim and run...")
+    queue = make_queue()
+    job_id = queue.enqueue('add', {'a': 2, 'b': 3}, user_id=1)
+    if queue.get(job_id)['status'] != 'queued':
+        print("❌ New job should be queued")
+        return False
+
+    queue.run_job(queue.claim())
+    job = queue.get(job_id, user_id=1)
+    if job['status'] != 'done' or job['result'] != {'sum': 5}:
+        print(f"❌ Unexpected job state: {job}")
+        return False
+    if queue.get(job_id, user_id=2) is not None:
+        print("❌ Other users must not see the job")
+        return False
+
+    failed_id = queue.enqueue('boom', user_id=1)
+    queue.run_job(queue.claim())
+    job = queue.get(failed_id)
+    if job['status'] != 'failed' or 'linh khí' not in job['error']:
+        print(f"❌ Failure not recorded: {job}")
+        return False
+
+    print("✅ Jobs run and store results")
+    return True
+
+def test_priority_lanes():
+    """Test interactive jobs are claimed before bulk and interactive-only workers skip bulk"""
+    print("Testing priority lanes...")
+    queue = make_queue()
+    bulk_id = queue.enqueue('add', {'a': 1, 'b': 1}, priority=PRIORITY_BULK)
+    interactive_id = queue.enqueue('add', {'a': 1, 'b': 2}, priority=PRIORITY_INTERACTIVE)
+
+    if queue.claim()['id'] != interactive_id:
+        print("❌ Interactive job should be claimed first")
+        return False
+    if queue.claim(max_priority=PRIORITY_INTERACTIVE) is not None:
+        print("❌ Interactive-only worker picked up a bulk job")
+        return False
+    if queue.claim(max_priority=PRIORITY_BULK)['id'] != bulk_id:
+        print("❌ Bulk worker should take the bulk job")
+        return False
+
+    print("✅ Priority lanes respected")
+    return True
+
+def test_limits_and_dedupe():
+    """Test the per-user active job limit and dedupe keys"""
+    print("Testing per-user limit and dedupe...")
+    queue = make_queue()
+    for i in range(queue.MAX_ACTIVE_PER_USER):
+        queue.enqueue('add', {'a': i, 'b': 0}, user_id=7)
+    try:
+        queue.enqueue('add', {'a': 9, 'b': 9}, user_id=7)
+        print("❌ Limit not enforced")
+        return False
+    except JobLimitExceeded:
+        pass
+
+    first = queue.enqueue('add', {'a': 1, 'b': 1}, user_id=8, dedupe_key='war:1')
+    second = queue.enqueue('add', {'a': 1, 'b': 1}, user_id=8, dedupe_key='war:1')
+    if first != second:
+        print("❌ Identical active jobs should be deduplicated")
+        return False
+
+    if not queue.cancel(first, user_id=8) or queue.get(first)['status'] != 'cancelled':
+        print("❌ Queued job should be cancellable")
+        return False
+
+    print("✅ Limit and dedupe work")
+    return True
+
+def test_result_expiry():
+    """Test finished results expire and are purged"""
+    print("Testing result TTL...")
+    queue = make_queue()
+    queue.RESULT_TTL = 0.1
+    job_id = queue.enqueue('add', {'a': 1, 'b': 1})
+    queue.run_job(queue.claim())
+    time.sleep(0.15)
+    if queue.get(job_id) is not None:
+        print("❌ Expired result still visible")
+        return False
+    queue.maintenance()
+    if queue.get_stats().get('done'):
+        print("❌ Expired job not purged")
+        return False
+
+    print("✅ Results expire")
+    return True
+
+def test_partial_progress():
+    """Test a running task can publish a partial result that pollers see"""
+    print("Testing partial progress...")
+    queue = make_queue()
+    seen = []
+
+    @queue.task('chant')
+    def chant(words):
+        text = ''
+        for word in words:
+            text += word
+            queue.report_progress({'advice': text})
+            seen.append(queue.get(job_id).get('partial'))
+        return {'advice': text}
+
+    job_id = queue.enqueue('chant', {'words': ['Thiên ', 'địa ', 'huyền ', 'hoàng']})
+    queue.run_job(queue.claim())
+    job = queue.get(job_id)
+    if seen[1] != {'advice': 'Thiên địa '} or job['result'] != {'advice': 'Thiên địa huyền hoàng'} or 'partial' in job:
+        print(f"❌ Unexpected progress: {seen} -> {job}")
+        return False
+
+    print("✅ Partial results visible while running")
+    return True
+
+def test_ai_advice_enqueued_by_default():
+    """Test AI advice routes hand back a job id without the client opting in, and importing app starts no workers"""
+    print("Testing AI advice routes use the queue...")
+    import uuid
+    from app import app, db
+    from models import User
+    from job_queue import job_queue
+
+    if job_queue._threads:
+        print("❌ Importing app must not start job workers")
+        return False
+
+    with app.app_context():
+        name = f"jobs_{uuid.uuid4().hex[:8]}"
+        user = User(username=name, email=f"{name}@test.local")
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        try:
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+            response = client.post('/api/ai/general', json={'question': 'Đạo là gì?'})
+            if response.status_code != 202:
+                print(f"❌ Expected 202 with a job id, got {response.status_code}")
+                return False
+            job_id = response.get_json()['job_id']
+
+            row = job_queue.claim()
+            while row is not None and row['id'] != job_id:
+                job_queue.run_job(row)
+                row = job_queue.claim()
+            job_queue.run_job(row)
+
+            job = client.get(response.get_json()['status_url']).get_json()['job']
+            if job['status'] != 'done' or not job['result']['advice']:
+                print(f"❌ Job should finish with advice: {job}")
+                return False
+
+            inline = client.post('/api/ai/general?async=0', json={'question': 'Đạo là gì?'})
+            if inline.status_code != 200 or 'advice' not in inline.get_json():
+                print(f"❌ ?async=0 should answer inline, got {inline.status_code}")
+                return False
+
+            streamed = client.post('/api/ai/general', json={'question': 'Đạo là gì?'},
+                                   headers={'Accept': 'text/event-stream'})
+            if streamed.status_code != 200 or not streamed.mimetype == 'text/event-stream':
+                print(f"❌ SSE clients should be streamed, not queued: {streamed.status_code} {streamed.mimetype}")
+                return False
+            streamed.get_data()
+        finally:
+            db.session.delete(db.session.get(User, user_id))
+            db.session.commit()
+
+    print("✅ AI advice queued by default")
+    return True
+
+def test_workers():
+    """Test background workers drain the queue from several threads"""
+    print("Testing worker threads...")
+    app = FakeApp(JOB_QUEUE_ENABLED=True, JOB_INTERACTIVE_WORKERS=2, JOB_BULK_WORKERS=1)
+    app.app_context = _NullContext
+    queue = JobQueue()
+    queue.POLL_INTERVAL = 0.05
+    done = []
+    lock = threading.Lock()
+
+    @queue.task('slow')
+    def slow(n):
+        time.sleep(0.1)
+        with lock:
+            done.append(n)
+        return n
+
+    queue.init_app(app)
+    queue.start()
+    ids = [queue.enqueue('slow', {'n': n}, priority=n % 2) for n in range(6)]
+
+    deadline = time.time() + 5
+    while time.time() < deadline and any(queue.get(i)['status'] != 'done' for i in ids):
+        time.sleep(0.05)
+    queue.stop()
+
+    if sorted(done) != list(range(6)):
+        print(f"❌ Not every job ran exactly once: {done}")
+        return False
+
+    print("✅ Workers ran every job once")
+    return True
+
+class _NullContext:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting job queue tests...")
+    print("=" * 50)
+
+    tests = [
+        test_enqueue_and_run,
+        test_priority_lanes,
+        test_limits_and_dedupe,
+        test_result_expiry,
+        test_partial_progress,
+        test_ai_advice_enqueued_by_default,
+        test_workers
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test script and micro-benchmark for the compiled keyword matcher
+"""
+import sys
+import time
+import unicodedata
+from keyword_matcher import fold_diacritics
+from ai_tutien_girl import TuTienAIGirl
+
+CHAT_CORPUS = [
+    "Chào bạn!",
+    "Tôi muốn học tu luyện",
+    "Tôi đang buồn vì không đột phá được cảnh giới",
+    "Giúp tôi với! Bang hội bị tấn công",
+    "Làm sao để có thêm linh lực?",
+    "Hôm nay trời đẹp quá, tôi thấy rất vui",
+    "toi dang lo lang ve chuyen dan duoc",
+    "Pháp bảo này có tốt không?",
+    "Cứu! Thú yêu đang đuổi theo",
+    "Cảm ơn bạn nhiều lắm",
+    "Tôi ghét phải chờ đợi khi luyện đan, thật khó chịu",
+    "hello, có ai ở đây không",
+    "Hướng dẫn tôi cách nào để gia nhập bang hội",
+    "Ngày mai chúng ta sẽ tiến công thế giới mới",
+]
+
+def legacy_analyze(message):
+    """The previous implementation: one any()/sum() substring scan per keyword list"""
+    kw = TuTienAIGirl.MESSAGE_KEYWORDS
+    message_lower = message.lower()
+    positive_count = sum(1 for word in kw["positive"] if word in message_lower)
+    negative_count = sum(1 for word in kw["negative"] if word in message_lower)
+    return {
+        "is_cultivation_question": any(k in message_lower for k in kw["cultivation"]),
+        "is_help_request": any(k in message_lower for k in kw["help"]),
+        "is_emotional": any(k in message_lower for k in kw["emotion"]),
+        "is_greeting": any(k in message_lower for k in kw["greeting"]),
+        "sentiment": "positive" if positive_count > negative_count else "negative" if negative_count > positive_count else "neutral",
+        "urgency": "high" if any(w in message.lower() for w in kw["urgent"]) else "medium" if "?" in message or "!" in message else "low"
+    }
+
+def test_fold_diacritics():
+    """Test Vietnamese diacritics are stripped, including đ"""
+    print("Testing diacritic folding...")
+    if fold_diacritics("Tu Luyện Đan Dược") != "tu luyen dan duoc":
+        print(f"❌ Unexpected fold: {fold_diacritics('Tu Luyện Đan Dược')}")
+        return False
+    print("✅ Diacritics folded")
+    return True
+
+def test_classification():
+    """Test intent, sentiment and urgency come out of one scan"""
+    print("Testing message classification...")
+    ai = TuTienAIGirl()
+    expected = {
+        "Chào bạn!": ("greeting", "neutral", "medium"),
+        "Tôi muốn học tu luyện": ("cultivation_advice", "neutral", "low"),
+        "Tôi đang buồn vì không đột phá được cảnh giới": ("cultivation_advice", "negative", "low"),
+        "Giúp tôi với! Bang hội bị tấn công": ("helpful_guidance", "neutral", "high"),
+        "Hôm nay trời đẹp quá, tôi thấy rất vui": ("emotional_support", "positive", "low"),
+        "Cứu! Thú yêu đang đuổi theo": ("urgent_help", "positive", "high"),
+        # "nhiều" từng bị nhận nhầm là lời chào vì chứa "hi"
+        "Cảm ơn bạn nhiều lắm": ("general_chat", "neutral", "low"),
+    }
+    for message, (response_type, sentiment, urgency) in expected.items():
+        analysis = ai.analyze_message(message)
+        got = (ai.determine_response_type(analysis), analysis["sentiment"], analysis["urgency"])
+        if got != (response_type, sentiment, urgency):
+            print(f"❌ '{message}': {got}")
+            return False
+    print("✅ Messages classified correctly")
+    return True
+
+def test_normalization():
+    """Test decomposed Unicode, unaccented typing and word boundaries"""
+    print("Testing Vietnamese normalization...")
+    ai = TuTienAIGirl()
+
+    decomposed = unicodedata.normalize('NFD', "Tôi muốn học tu luyện")
+    if not ai.analyze_message(decomposed)["is_cultivation_question"]:
+        print("❌ NFD input not matched")
+        return False
+
+    analysis = ai.analyze_message("toi dang lo lang ve chuyen dan duoc")
+    if not (analysis["is_emotional"] and analysis["is_cultivation_question"] and analysis["sentiment"] == "negative"):
+        print(f"❌ Unaccented input not matched: {analysis}")
+        return False
+
+    # "ngày" không phải "ngay", "thích" không chứa lời chào "hi"
+    analysis = ai.analyze_message("Ngày mai tôi thích đi săn")
+    if analysis["urgency"] != "low" or analysis["is_greeting"]:
+        print(f"❌ False positives: {analysis}")
+        return False
+
+    # "sợ hãi" vẫn được tính cho nhóm tiêu cực ("sợ")
+    if ai.analyze_sentiment("Tôi sợ hãi") != "negative":
+        print("❌ Nested keyword not credited")
+        return False
+
+    print("✅ Normalization and word boundaries work")
+    return True
+
+def test_benchmark():
+    """Micro-benchmark: messages classified per second, old scans vs compiled matcher"""
+    print("Benchmarking message analysis...")
+    ai = TuTienAIGirl()
+    corpus = CHAT_CORPUS * 500
+
+    def rate(analyze):
+        best = float('inf')
+        for _ in range(3):
+            started = time.perf_counter()
+            for message in corpus:
+                analyze(message)
+            best = min(best, time.perf_counter() - started)
+        return len(corpus) / best
+
+    legacy_rate = rate(legacy_analyze)
+    compiled_rate = rate(ai.analyze_message)
+
+    print(f"   old keyword scans: {legacy_rate:,.0f} msg/s")
+    print(f"   compiled matcher:  {compiled_rate:,.0f} msg/s ({compiled_rate / legacy_rate:.2f}x)")
+    print("✅ Benchmark finished")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting keyword matcher tests...")
+    print("=" * 50)
+
+    tests = [
+        test_fold_diacritics,
+        test_classification,
+        test_normalization,
+        test_benchmark
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
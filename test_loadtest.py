@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test script for the load-testing harness and synthetic world generator
+"""
+import sys
+from app import app, db
+from models import User, Guild, World
+from rate_limit import rate_limiter
+import loadtest
+
+def test_seed_and_clear():
+    """Test seeding bulk-inserts a consistent world and clear removes all of it"""
+    print("Testing synthetic seeding...")
+    with app.app_context():
+        try:
+            counts = loadtest.seed(users=60, guilds=4, worlds=30, expeditions=8, messages=200)
+            prefix = User.username.like(f'{loadtest.PREFIX}%')
+            if counts['users'] != 60 or User.query.filter(prefix).count() != 60:
+                print(f"❌ Expected 60 synthetic users: {counts}")
+                return False
+
+            leaders = db.session.query(Guild.leader_id, Guild.id).filter(Guild.name.like(f'{loadtest.PREFIX}%')).all()
+            if len(leaders) != 4 or any(db.session.get(User, leader).guild_id != guild for leader, guild in leaders):
+                print("❌ Every guild leader should be a member of their guild")
+                return False
+            members = User.query.filter(prefix, User.guild_id.isnot(None)).count()
+            if not 30 <= members <= 60:
+                print(f"❌ Unrealistic guild membership: {members}/60")
+                return False
+            if not db.session.get(User, leaders[0][0]).check_password(loadtest.PASSWORD):
+                print("❌ Synthetic players should log in with the shared password")
+                return False
+        finally:
+            deleted = loadtest.clear()
+
+        if deleted['users'] != 60 or User.query.filter(User.username.like(f'{loadtest.PREFIX}%')).count():
+            print(f"❌ Clear left synthetic rows behind: {deleted}")
+            return False
+        if World.query.filter(World.name.like(f'{loadtest.PREFIX}%')).count() or deleted['messages'] != 200:
+            print(f"❌ Clear should remove worlds and messages: {deleted}")
+            return False
+
+    print(f"✅ Seeded and cleared in {counts['seconds']}s")
+    return True
+
+def test_replay_report():
+    """Test virtual players log in and replay the route mix into a per-route report"""
+    print("Testing load replay...")
+    with app.app_context():
+        loadtest.seed(users=3, guilds=1, worlds=3, expeditions=2, messages=30)
+        usernames = loadtest.seeded_usernames(3)
+    try:
+        server, url = loadtest.serve_in_thread()
+        try:
+            report = loadtest.LoadRunner(url, usernames, duration=1.5).run()
+        finally:
+            server.shutdown()
+    finally:
+        with app.app_context():
+            loadtest.clear()
+
+    if report['login_failures'] or report['players'] != 3:
+        print(f"❌ Players failed to log in: {report['login_failures']}")
+        return False
+    for route, stats in report['routes'].items():
+        if not stats['requests'] or stats['errors'] or set(stats['statuses']) - {'200', '429'}:
+            print(f"❌ Route {route} unexpected stats: {stats}")
+            return False
+        if not stats['p50_ms'] <= stats['p95_ms'] <= stats['max_ms']:
+            print(f"❌ Percentiles out of order for {route}: {stats}")
+            return False
+
+    table = loadtest.format_report(report)
+    comparison = loadtest.compare_reports(report, report)
+    if any(route not in table for route in loadtest.ROUTES) or '+0%' not in comparison:
+        print(f"❌ Unexpected report output:\n{table}\n{comparison}")
+        return False
+
+    print(f"✅ Replayed {report['total_requests']} requests")
+    return True
+
+def test_sync_payload():
+    """Test the replayed /api/sync body is accepted and carrying versions returns only changes"""
+    print("Testing sync payload...")
+    with app.app_context():
+        loadtest.seed(users=1, guilds=1, worlds=2, expeditions=1, messages=5)
+        username = loadtest.seeded_usernames(1)[0]
+    # Id người chơi được dùng lại sau clear(): không để cửa sổ giới hạn của bài replay ảnh hưởng
+    enabled, rate_limiter.enabled = rate_limiter.enabled, False
+    try:
+        client = app.test_client()
+        client.post('/auth', data={'action': 'login', 'username': username, 'password': loadtest.PASSWORD})
+        first = client.post('/api/sync', json=loadtest.sync_body({})).get_json()
+        if not first['success'] or set(first['sections']) != set(loadtest.SYNC_SECTIONS):
+            print(f"❌ First sync should return every section: {first}")
+            return False
+        versions = {name: update['version'] for name, update in first['sections'].items()}
+        second = client.post('/api/sync', json=loadtest.sync_body(versions)).get_json()
+        if second['sections']:
+            print(f"❌ Unchanged sections resent: {sorted(second['sections'])}")
+            return False
+    finally:
+        rate_limiter.enabled = enabled
+        with app.app_context():
+            loadtest.clear()
+
+    print(f"✅ Synced {len(first['sections'])} sections, then nothing to resend")
+    return True
+
+def test_parse_mix():
+    """Test the --mix option parsing"""
+    print("Testing route mix parsing...")
+    if loadtest.parse_mix('cultivate=3,rankings') != {'cultivate': 3.0, 'rankings': 1.0}:
+        print("❌ Mix parsed incorrectly")
+        return False
+    try:
+        loadtest.parse_mix('teleport=1')
+    except ValueError:
+        print("✅ Route mix parsed")
+        return True
+    print("❌ Unknown routes should be rejected")
+    return False
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting load harness tests...")
+    print("=" * 50)
+
+    tests = [
+        test_seed_and_clear,
+        test_replay_report,
+        test_sync_payload,
+        test_parse_mix
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
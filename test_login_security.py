@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Test script for the password hashing policy and login throttling
+"""
+import sys
+import threading
+import time
+import uuid
+from cachelib import SimpleCache
+from werkzeug.security import generate_password_hash
+from login_security import PasswordPolicy, LoginThrottle, MAX_PASSWORD_LENGTH
+
+def test_hash_policy_and_rehash():
+    """Test hashes follow the configured method and weaker hashes are flagged for rehash"""
+    print("Testing hash policy...")
+    policy = PasswordPolicy('pbkdf2:sha256:1000')
+    password_hash = policy.hash('linh thạch')
+
+    if not password_hash.startswith('pbkdf2:sha256:1000$') or not policy.verify(password_hash, 'linh thạch'):
+        print(f"❌ Hash not made with the policy method: {password_hash[:30]}")
+        return False
+    if policy.verify(password_hash, 'sai') or policy.verify(password_hash, 'x' * 5000):
+        print("❌ Wrong or oversized password accepted")
+        return False
+    if policy.needs_rehash(password_hash):
+        print("❌ Current hash should not need a rehash")
+        return False
+    if not policy.needs_rehash(generate_password_hash('linh thạch', method='pbkdf2:sha256:500')):
+        print("❌ Lower-cost hash should need a rehash")
+        return False
+
+    stats = policy.get_stats()
+    if stats['hashes'] != 1 or stats['verifications'] != 2 or stats['method'] != 'pbkdf2:sha256:1000':
+        print(f"❌ Hash metrics wrong: {stats}")
+        return False
+
+    print(f"✅ Policy enforced ({stats['avg_hash_ms']} ms per hash)")
+    return True
+
+def test_throttle_per_username():
+    """Test repeated failures on one username are blocked, then released after the window"""
+    print("Testing per-username throttling...")
+    now = [1000.0]
+    throttle = LoginThrottle(SimpleCache(), clock=lambda: now[0])
+    throttle.MAX_FAILURES_PER_USER = 3
+    throttle.WINDOW = 60
+
+    for i in range(3):
+        if throttle.check(f'10.0.0.{i}', 'DaoHuu'):
+            print("❌ Blocked too early")
+            return False
+        throttle.record_failure(f'10.0.0.{i}', 'DaoHuu')
+        now[0] += 1
+
+    retry_after = throttle.check('10.0.0.9', 'daohuu')
+    if not 55 <= retry_after <= 60:
+        print(f"❌ Username should be blocked from any IP, retry_after={retry_after}")
+        return False
+    if throttle.check('10.0.0.9', 'someone_else'):
+        print("❌ Other usernames should not be affected")
+        return False
+
+    now[0] += 60
+    if throttle.check('10.0.0.9', 'DaoHuu'):
+        print("❌ Window should have slid past the failures")
+        return False
+
+    throttle.record_failure('10.0.0.1', 'DaoHuu')
+    throttle.reset('DaoHuu')
+    if throttle.check('10.0.0.9', 'DaoHuu') or any(throttle.cache.get_many(
+            *(throttle._bucket_key('login_fail:user:daohuu', b) for b in throttle._bucket_indexes(now[0])))):
+        print("❌ Successful login should reset the username window")
+        return False
+
+    print("✅ Username window blocks and slides")
+    return True
+
+def test_throttle_per_ip():
+    """Test one IP spraying many usernames is blocked"""
+    print("Testing per-IP throttling...")
+    throttle = LoginThrottle(SimpleCache())
+    throttle.MAX_FAILURES_PER_IP = 10
+
+    for i in range(10):
+        throttle.record_failure('203.0.113.5', f'user{i}')
+
+    if not throttle.check('203.0.113.5', 'user99'):
+        print("❌ IP should be blocked")
+        return False
+    if throttle.check('203.0.113.6', 'user99'):
+        print("❌ Other IPs should not be blocked")
+        return False
+    if throttle.get_stats() != {'allowed': 1, 'blocked': 1, 'failures': 10}:
+        print(f"❌ Stats wrong: {throttle.get_stats()}")
+        return False
+
+    print("✅ IP window blocks credential spraying")
+    return True
+
+def test_oversized_password_rejected_at_registration():
+    """Test a password too long to ever verify cannot be hashed or registered"""
+    print("Testing password length cap on registration...")
+    try:
+        PasswordPolicy('pbkdf2:sha256:1000').hash('x' * (MAX_PASSWORD_LENGTH + 1))
+        print("❌ hash() should reject oversized passwords")
+        return False
+    except ValueError:
+        pass
+
+    from app import app
+    from models import User
+    name = f"longpw_{uuid.uuid4().hex[:8]}"
+    with app.app_context():
+        client = app.test_client()
+        client.post('/auth', data={'action': 'register', 'username': name, 'email': f'{name}@test.local',
+                                   'password': 'x' * (MAX_PASSWORD_LENGTH + 1)})
+        if User.query.filter_by(username=name).first() is not None:
+            print("❌ Account with an oversized password was created")
+            return False
+
+    print("✅ Oversized password refused")
+    return True
+
+class SlowCache(SimpleCache):
+    """SimpleCache whose get/set yield to other threads, to widen read-modify-write races"""
+
+    def get(self, key):
+        value = super().get(key)
+        time.sleep(0.001)
+        return value
+
+    def set(self, key, value, timeout=None):
+        time.sleep(0.001)
+        return super().set(key, value, timeout)
+
+def test_concurrent_failures_all_counted():
+    """Test a parallel burst of failures is counted in full"""
+    print("Testing concurrent failure counting...")
+    throttle = LoginThrottle(SlowCache())
+    throttle.MAX_FAILURES_PER_IP = 1000
+
+    def burst():
+        for i in range(20):
+            throttle.record_failure('198.51.100.7', f'user{i}')
+
+    threads = [threading.Thread(target=burst) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    key = 'login_fail:ip:198.51.100.7'
+    counted = sum(int(c or 0) for c in throttle.cache.get_many(
+        *(throttle._bucket_key(key, b) for b in throttle._bucket_indexes(time.time()))))
+    if counted != 200:
+        print(f"❌ Lost failures: counted {counted} of 200")
+        return False
+
+    print("✅ All 200 concurrent failures counted")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting login security tests...")
+    print("=" * 50)
+
+    tests = [
+        test_hash_policy_and_rehash,
+        test_throttle_per_username,
+        test_throttle_per_ip,
+        test_oversized_password_rejected_at_registration,
+        test_concurrent_failures_all_counted
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
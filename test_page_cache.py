@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for the user-class aware page cache
+"""
+import os
+import sys
+import tempfile
+from flask import Flask, flash, render_template_string
+from flask_caching import Cache
+from flask_login import LoginManager, UserMixin, current_user
+from page_cache import PageCache
+
+PAGE = """<nav>{% if current_user.is_authenticated %}{{ page_hole('nav_user.html') }}{% else %}Đăng Nhập{% endif %}</nav>{% for message in get_flashed_messages() %}<p>{{ message }}</p>{% endfor %}<main>{{ body }}</main>"""
+
+class FakeUser(UserMixin):
+    def __init__(self, user_id, is_admin=False):
+        self.id = user_id
+        self.username = f'user{user_id}'
+        self.is_admin = is_admin
+
+def make_app():
+    templates = tempfile.mkdtemp()
+    with open(os.path.join(templates, 'nav_user.html'), 'w') as f:
+        f.write('<b>{{ current_user.username }}</b>')
+
+    app = Flask(__name__, template_folder=templates)
+    app.secret_key = 'test'
+    cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: FakeUser(int(user_id), is_admin=user_id == '99'))
+
+    pages = PageCache()
+    pages.init_app(app, cache)
+    renders = []
+
+    @app.route('/')
+    @pages.cached(timeout=60)
+    def index():
+        renders.append(current_user.get_id())
+        return render_template_string(PAGE, body=f'render {len(renders)}')
+
+    @app.route('/flash')
+    def set_flash():
+        flash('Đã đăng xuất')
+        return 'ok'
+
+    return app, pages, renders
+
+def client_for(app, user_id=None):
+    client = app.test_client()
+    if user_id is not None:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+    return client
+
+def test_vary_by_user_class():
+    """Test anonymous, logged-in and admin visitors each get their own cached page"""
+    print("Testing user-class vary...")
+    app, pages, renders = make_app()
+
+    anon = [client_for(app).get('/').get_data(as_text=True) for _ in range(3)]
+    user_a = client_for(app, 1).get('/').get_data(as_text=True)
+    user_b = client_for(app, 2).get('/').get_data(as_text=True)
+    admin = client_for(app, 99).get('/').get_data(as_text=True)
+
+    if len(renders) != 3:
+        print(f"❌ Expected one render per user class, got {renders}")
+        return False
+    if 'Đăng Nhập' not in anon[2] or 'user1' in anon[2]:
+        print("❌ Anonymous page leaked a user's navbar")
+        return False
+    if '<b>user1</b>' not in user_a or '<b>user2</b>' not in user_b or 'user1' in user_b:
+        print(f"❌ Personal hole not filled per request: {user_b}")
+        return False
+    if 'render 2' not in user_b or 'render 3' not in admin:
+        print("❌ Admins should have their own cached page")
+        return False
+
+    print("✅ One cached page per user class, holes filled per viewer")
+    return True
+
+def test_flash_bypass_and_purge():
+    """Test flashed messages bypass the cache and purge forces a re-render"""
+    print("Testing flash bypass and purge...")
+    app, pages, renders = make_app()
+    client = client_for(app)
+
+    client.get('/')
+    client.get('/flash')
+    response = client.get('/')
+    if response.headers.get('X-Page-Cache') is not None or 'Đã đăng xuất' not in response.get_data(as_text=True):
+        print("❌ Request with a pending flash should bypass the cache")
+        return False
+    if client.get('/').headers.get('X-Page-Cache') != 'HIT':
+        print("❌ Next request should hit again")
+        return False
+
+    pages.purge('/')
+    if client.get('/').headers.get('X-Page-Cache') != 'MISS' or len(renders) != 3:
+        print("❌ Purge should force a re-render")
+        return False
+
+    pages.purge_all()
+    client.get('/?page=2')
+    if client.get('/?page=2').headers.get('X-Page-Cache') != 'HIT' or len(renders) != 4:
+        print(f"❌ Query strings should be cached separately: {len(renders)} renders")
+        return False
+
+    stats = pages.get_stats()
+    if stats['bypassed'] != 1 or stats['misses'] != 3:
+        print(f"❌ Stats wrong: {stats}")
+        return False
+
+    print("✅ Flash bypass and purge work")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting page cache tests...")
+    print("=" * 50)
+
+    tests = [
+        test_vary_by_user_class,
+        test_flash_bypass_and_purge
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
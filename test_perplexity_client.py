@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Test script for the resilient Perplexity HTTP client against a local fake upstream
+"""
+import sys
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http_client import ResilientHTTPClient, CircuitBreaker, RetryBudget, UpstreamUnavailable
+from advice_cache import AdviceCache
+
+class FakeUpstream(BaseHTTPRequestHandler):
+    """Fake chat-completions endpoint; behaviour is driven by the server's script"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            server.clients.add(self.client_address)
+            mode = server.script.pop(0) if server.script else server.default
+
+        if mode == 'stream':
+            self.stream_chunks()
+            return
+        if mode == 'slow':
+            time.sleep(1.0)
+        if mode == 'truncated':
+            # Chunked body hỏng -> requests.ChunkedEncodingError phía client
+            self.send_response(200)
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write(b"zz\r\nnot a chunk")
+            self.close_connection = True
+            return
+        status = 500 if mode == 'error' else 200
+        body = json.dumps({'choices': [{'message': {'content': 'Đạo pháp tự nhiên'}}]}).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def stream_chunks(self):
+        """SSE chat-completions stream: one word every 50ms"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write_chunk(data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            for i in range(20):
+                event = {'choices': [{'delta': {'content': f'từ{i} '}}]}
+                write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+                self.server.chunks_sent += 1
+                time.sleep(0.05)
+            write_chunk(b"data: [DONE]\n\n")
+            write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.cancelled = True
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+def start_fake_upstream(default='ok', script=None):
+    """Start the fake upstream on a free local port"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeUpstream)
+    server.lock = threading.Lock()
+    server.hits = 0
+    server.clients = set()
+    server.chunks_sent = 0
+    server.cancelled = False
+    server.default = default
+    server.script = list(script or [])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/chat/completions"
+
+def test_pooled_success():
+    """Test successful calls reuse one keep-alive connection"""
+    print("Testing pooled keep-alive requests...")
+    server, url = start_fake_upstream()
+    client = ResilientHTTPClient()
+    try:
+        for _ in range(5):
+            data = client.post_json(url, {'messages': []})
+        if data['choices'][0]['message']['content'] != 'Đạo pháp tự nhiên':
+            print("❌ Unexpected response body")
+            return False
+        if len(server.clients) != 1:
+            print(f"❌ Expected 1 pooled connection, got {len(server.clients)}")
+            return False
+    finally:
+        server.shutdown()
+    print("✅ Requests share one pooled connection")
+    return True
+
+def test_retry_then_success():
+    """Test a transient 500 is retried with backoff"""
+    print("Testing jittered retry...")
+    server, url = start_fake_upstream(script=['error'])
+    client = ResilientHTTPClient(backoff_base=0.01)
+    try:
+        client.post_json(url, {})
+        if server.hits != 2 or client.stats['retries'] != 1:
+            print(f"❌ Expected one retry, hits={server.hits} stats={client.stats}")
+            return False
+    finally:
+        server.shutdown()
+    print("✅ Transient failure retried")
+    return True
+
+def test_read_timeout():
+    """Test a hung upstream is cut off by the read timeout"""
+    print("Testing read timeout...")
+    server, url = start_fake_upstream(default='slow')
+    client = ResilientHTTPClient(read_timeout=0.2, max_retries=0)
+    try:
+        started = time.monotonic()
+        try:
+            client.post_json(url, {})
+            print("❌ Slow upstream should time out")
+            return False
+        except UpstreamUnavailable:
+            pass
+        if time.monotonic() - started > 0.8:
+            print("❌ Timeout took too long")
+            return False
+    finally:
+        server.shutdown()
+    print("✅ Hung upstream times out")
+    return True
+
+def test_circuit_breaker():
+    """Test the breaker opens, fails fast and recovers via a half-open probe"""
+    print("Testing circuit breaker...")
+    server, url = start_fake_upstream(default='error')
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.3)
+    client = ResilientHTTPClient(max_retries=0, breaker=breaker)
+    try:
+        for _ in range(5):
+            try:
+                client.post_json(url, {})
+            except UpstreamUnavailable:
+                pass
+        if server.hits != 3 or breaker.state != CircuitBreaker.OPEN:
+            print(f"❌ Breaker should open after 3 failures, hits={server.hits} state={breaker.state}")
+            return False
+
+        server.default = 'ok'
+        time.sleep(0.35)
+        client.post_json(url, {})
+        if breaker.state != CircuitBreaker.CLOSED:
+            print(f"❌ Breaker should close after probe, state={breaker.state}")
+            return False
+    finally:
+        server.shutdown()
+    print("✅ Breaker opens, short-circuits and recovers")
+    return True
+
+def test_probe_never_sticks():
+    """Test a half-open probe rejected for lack of a slot or hit by an unexpected error does not wedge the breaker"""
+    print("Testing half-open probe release...")
+    server, url = start_fake_upstream(default='error')
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    client = ResilientHTTPClient(max_retries=0, max_concurrency=1, acquire_timeout=0.05, breaker=breaker)
+    def call():
+        try:
+            client.post_json(url, {})
+        except UpstreamUnavailable:
+            pass
+
+    try:
+        call()
+        time.sleep(0.15)
+
+        # Mọi slot đang bận: request bị từ chối không được tiêu lượt probe
+        client._slots.acquire()
+        try:
+            call()
+        finally:
+            client._slots.release()
+        server.default = 'ok'
+        call()
+        if client.stats['rejected'] != 1 or breaker.state != CircuitBreaker.CLOSED:
+            print(f"❌ Probe after a slot timeout should close the circuit, state={breaker.state}")
+            return False
+
+        # Lỗi ngoài ConnectionError/Timeout/HTTPError vẫn kết thúc probe
+        server.default = 'error'
+        call()
+        time.sleep(0.15)
+        server.default = 'truncated'
+        call()
+        if breaker.state != CircuitBreaker.OPEN:
+            print(f"❌ A broken response should reopen the circuit, state={breaker.state}")
+            return False
+
+        server.default = 'ok'
+        time.sleep(0.15)
+        call()
+        if breaker.state != CircuitBreaker.CLOSED or client.stats['short_circuited']:
+            print(f"❌ Next probe should close the circuit, state={breaker.state}")
+            return False
+    finally:
+        server.shutdown()
+    print("✅ Probe released on every exit path")
+    return True
+
+def test_bounded_concurrency_and_budget():
+    """Test saturated pools reject fast and the retry budget caps retries"""
+    print("Testing concurrency limit and retry budget...")
+    server, url = start_fake_upstream(default='slow')
+    client = ResilientHTTPClient(max_concurrency=2, acquire_timeout=0.05)
+    results = []
+
+    def call():
+        try:
+            client.post_json(url, {})
+            results.append('ok')
+        except UpstreamUnavailable:
+            results.append('rejected')
+
+    try:
+        threads = [threading.Thread(target=call) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if results.count('ok') != 2 or client.stats['rejected'] != 4:
+            print(f"❌ Expected 2 ok / 4 rejected, got {results}")
+            return False
+    finally:
+        server.shutdown()
+
+    budget = RetryBudget(ratio=0.1, min_tokens=1)
+    budget.record_attempt()
+    if not budget.try_spend() or budget.try_spend():
+        print("❌ Retry budget should allow exactly one retry")
+        return False
+
+    print("✅ Concurrency bounded and retries budgeted")
+    return True
+
+def make_streaming_manager(url):
+    """PerplexityManager pointed at the fake upstream with an isolated cache"""
+    from perplexity_helper import PerplexityManager
+    manager = PerplexityManager()
+    manager.api_key = 'test-key'
+    manager.base_url = url
+    manager.cache = AdviceCache()
+    return manager
+
+def test_streaming_first_token():
+    """Test advice streams chunk by chunk and the full answer is cached"""
+    print("Testing streamed advice...")
+    server, url = start_fake_upstream(default='stream')
+    manager = make_streaming_manager(url)
+    try:
+        started = time.monotonic()
+        chunks = manager.get_general_advice('Làm sao đột phá?', stream=True)
+        first = next(chunks)
+        first_token = time.monotonic() - started
+        rest = list(chunks)
+        total = time.monotonic() - started
+
+        if first != 'từ0 ' or len(rest) != 19:
+            print(f"❌ Unexpected chunks: {first!r} + {len(rest)}")
+            return False
+        if first_token > total / 4:
+            print(f"❌ First token too late: {first_token:.3f}s of {total:.3f}s")
+            return False
+        if list(manager.get_general_advice('Làm sao đột phá?', stream=True)) != [first + ''.join(rest)]:
+            print("❌ Completed stream should be cached and replayed as one chunk")
+            return False
+    finally:
+        server.shutdown()
+    print(f"✅ First chunk after {first_token * 1000:.0f}ms, full answer after {total * 1000:.0f}ms")
+    return True
+
+def test_stream_cancellation():
+    """Test closing the stream early aborts the upstream response"""
+    print("Testing stream cancellation...")
+    server, url = start_fake_upstream(default='stream')
+    manager = make_streaming_manager(url)
+    try:
+        chunks = manager.get_general_advice('Hủy giữa chừng', stream=True)
+        next(chunks)
+        chunks.close()
+        time.sleep(0.4)
+        if server.chunks_sent >= 20 or not server.cancelled:
+            print(f"❌ Upstream kept streaming: sent={server.chunks_sent}")
+            return False
+        if manager.cache.get_stats()['size'] != 0:
+            print("❌ Partial answers must not be cached")
+            return False
+    finally:
+        server.shutdown()
+    print(f"✅ Upstream stopped after {server.chunks_sent} chunks")
+    return True
+
+def test_stream_single_flight():
+    """Test concurrent identical streamed questions share one upstream stream, even if the first caller leaves"""
+    print("Testing streamed single-flight...")
+    server, url = start_fake_upstream(default='stream')
+    manager = make_streaming_manager(url)
+    try:
+        results = []
+
+        def ask():
+            results.append(list(manager.get_general_advice('Cùng hỏi một câu', stream=True)))
+
+        threads = [threading.Thread(target=ask) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if server.hits != 1 or len(results) != 5 or any(len(''.join(r).split()) != 20 for r in results):
+            print(f"❌ Expected one upstream stream for 5 callers, hits={server.hits}")
+            return False
+
+        # Người hỏi đầu bỏ đi giữa chừng: người chờ vẫn nhận đủ câu trả lời
+        leader = manager.get_general_advice('Người đầu bỏ đi', stream=True)
+        next(leader)
+        follower = []
+        thread = threading.Thread(target=lambda: follower.extend(manager.get_general_advice('Người đầu bỏ đi', stream=True)))
+        thread.start()
+        time.sleep(0.1)
+        leader.close()
+        thread.join()
+        if server.hits != 2 or len(''.join(follower).split()) != 20 or server.cancelled:
+            print(f"❌ Follower should get the whole answer, hits={server.hits} chunks={len(follower)}")
+            return False
+        if manager.cache.get_stats()['size'] != 2:
+            print("❌ Completed shared streams should be cached")
+            return False
+    finally:
+        server.shutdown()
+    print("✅ Concurrent streams shared one upstream call")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting Perplexity client tests...")
+    print("=" * 50)
+
+    tests = [
+        test_pooled_success,
+        test_retry_then_success,
+        test_read_timeout,
+        test_circuit_breaker,
+        test_probe_never_sticks,
+        test_bounded_concurrency_and_budget,
+        test_streaming_first_token,
+        test_stream_cancellation,
+        test_stream_single_flight
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
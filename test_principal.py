@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Test script for the cached current_user principal
+"""
+import sys
+import uuid
+from sqlalchemy import event, update
+from app import app, db
+from models import User, Achievement, ChatMessage
+from principal import principal_cache, UserPrincipal
+
+def count_queries():
+    """Counter of SQL statements sent to the engine"""
+    counter = {'n': 0, 'statements': []}
+    def before_cursor_execute(conn, cursor, statement, *args):
+        counter['n'] += 1
+        counter['statements'].append(statement)
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return counter, lambda: event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+def make_user():
+    name = f"principal_{uuid.uuid4().hex[:8]}"
+    user = User(username=name, email=f"{name}@test.local", spiritual_power=100)
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def delete_user(user_id):
+    db.session.rollback()
+    user = db.session.get(User, user_id)
+    if user:
+        Achievement.query.filter_by(user_id=user_id).delete()
+        db.session.delete(user)
+        db.session.commit()
+
+def test_cached_load():
+    """Test a repeat load answers from the cache without touching the database"""
+    print("Testing cached principal load...")
+    with app.app_context():
+        user_id = make_user()
+        try:
+            principal_cache.load(user_id)
+            counter, stop = count_queries()
+            try:
+                principal = principal_cache.load(user_id)
+                power = principal.spiritual_power
+            finally:
+                stop()
+
+            if counter['n'] != 0 or power != 100:
+                print(f"❌ Cached load ran {counter['n']} queries (power={power})")
+                return False
+            if hasattr(principal, '__dict__') or principal.is_loaded:
+                print("❌ Principal should be a __slots__ object with the row not yet loaded")
+                return False
+            if principal.email != db.session.get(User, user_id).email or not principal.is_loaded:
+                print("❌ Other attributes should come from the lazily loaded row")
+                return False
+        finally:
+            delete_user(user_id)
+
+    print("✅ Repeat loads served from the cache")
+    return True
+
+def test_invalidation():
+    """Test commits touching the user (single or bulk) refresh the cached principal"""
+    print("Testing invalidation on commit...")
+    with app.app_context():
+        user_id = make_user()
+        try:
+            principal = principal_cache.load(user_id)
+            principal.spiritual_power += 50
+            db.session.rollback()
+            if principal_cache.load(user_id).spiritual_power != 100:
+                print("❌ Rolled back change should not reach the cache")
+                return False
+
+            principal = principal_cache.load(user_id)
+            principal.spiritual_power += 50
+            db.session.commit()
+            if principal_cache.load(user_id).spiritual_power != 150:
+                print("❌ Committed change not visible")
+                return False
+
+            db.session.execute(update(User).where(User.id == user_id).values(spiritual_power=7))
+            db.session.commit()
+            if principal_cache.load(user_id).spiritual_power != 7:
+                print("❌ Bulk UPDATE should invalidate every principal")
+                return False
+
+            fresh = principal_cache.load(user_id, fresh=True)
+            if not isinstance(fresh, UserPrincipal) or not fresh.is_loaded:
+                print("❌ fresh=True should load the full row")
+                return False
+        finally:
+            delete_user(user_id)
+
+        if principal_cache.load(user_id) is not None:
+            print("❌ Deleted user should not load")
+            return False
+
+    print("✅ Cache invalidated on commit")
+    return True
+
+def test_login_flow():
+    """Test logged-in pages still work with the principal as current_user"""
+    print("Testing logged-in requests...")
+    with app.app_context():
+        user_id = make_user()
+    try:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+        for path in ('/dashboard', '/profile'):
+            response = client.get(path)
+            if response.status_code != 200:
+                print(f"❌ {path} returned {response.status_code}")
+                return False
+
+        response = client.post('/api/cultivate')
+        gained = response.get_json()['power_gained']
+        with app.app_context():
+            if principal_cache.load(user_id).spiritual_power != 100 + gained:
+                print("❌ Cultivation result not reflected in current_user")
+                return False
+    finally:
+        with app.app_context():
+            delete_user(user_id)
+
+    print("✅ Pages and writes work through the principal")
+    return True
+
+def test_read_only_posts_use_cached_principal():
+    """Test POST views marked read_only (chat, AI advice) do not reload the user row"""
+    print("Testing read-only POST views...")
+    with app.app_context():
+        user_id = make_user()
+    try:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+        client.get('/dashboard')  # nạp principal vào cache
+        with app.app_context():
+            counter, stop = count_queries()
+            try:
+                response = client.post('/api/send-message', json={'content': 'Chào đạo hữu', 'channel': 'general'})
+            finally:
+                stop()
+        user_reads = [s for s in counter['statements'] if s.lstrip().upper().startswith('SELECT') and 'FROM user' in s]
+        if not response.get_json()['success'] or user_reads:
+            print(f"❌ Read-only POST reloaded the user: {user_reads}")
+            return False
+    finally:
+        with app.app_context():
+            ChatMessage.query.filter_by(user_id=user_id).delete()
+            db.session.commit()
+            delete_user(user_id)
+
+    print("✅ Read-only POST served from the cached principal")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting principal cache tests...")
+    print("=" * 50)
+
+    tests = [
+        test_cached_load,
+        test_invalidation,
+        test_login_flow,
+        test_read_only_posts_use_cached_principal
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-route, per-user rate limiter
+"""
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from cachelib import SimpleCache
+from flask import Flask, session
+from rate_limit import RateLimiter
+
+def test_sliding_window():
+    """Test the in-memory window allows `rate` calls per period and then slides"""
+    print("Testing in-memory sliding window...")
+    now = [100.0]
+    limiter = RateLimiter(clock=lambda: now[0])
+
+    for _ in range(3):
+        if limiter.hit('cultivate', 'u:1', 3, 60):
+            print("❌ Blocked within the limit")
+            return False
+        now[0] += 10
+
+    retry_after = limiter.hit('cultivate', 'u:1', 3, 60)
+    if retry_after != 30:
+        print(f"❌ Expected retry after 30s, got {retry_after}")
+        return False
+    if limiter.hit('cultivate', 'u:2', 3, 60) or limiter.hit('explore', 'u:1', 3, 60):
+        print("❌ Limits should be per user and per route")
+        return False
+
+    now[0] += 30
+    if limiter.hit('cultivate', 'u:1', 3, 60):
+        print("❌ Window should have slid")
+        return False
+
+    print("✅ Sliding window enforced")
+    return True
+
+def test_token_bucket():
+    """Test the shared-cache token bucket refills at rate/per"""
+    print("Testing shared-cache token bucket...")
+    now = [1000.0]
+    limiter = RateLimiter(backend='cache', cache=SimpleCache(), clock=lambda: now[0])
+
+    allowed = sum(1 for _ in range(10) if not limiter.hit('harvest', 'u:1', 5, 10))
+    if allowed != 5:
+        print(f"❌ Burst should allow 5 calls, allowed {allowed}")
+        return False
+
+    retry_after = limiter.hit('harvest', 'u:1', 5, 10)
+    if abs(retry_after - 2.0) > 1e-6:
+        print(f"❌ One token refills every 2s, got {retry_after}")
+        return False
+
+    now[0] += 2
+    if limiter.hit('harvest', 'u:1', 5, 10):
+        print("❌ Refilled token should be usable")
+        return False
+
+    print("✅ Token bucket enforced")
+    return True
+
+def test_decorator_rejects_before_view():
+    """Test the decorator answers 429 with Retry-After without running the view"""
+    print("Testing decorator...")
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    limiter = RateLimiter()
+    calls = []
+
+    @app.route('/login/<int:user_id>')
+    def login(user_id):
+        session['_user_id'] = str(user_id)
+        return 'ok'
+
+    @app.route('/act', methods=['POST'])
+    @limiter.limit(2, per=60)
+    def act():
+        calls.append(1)
+        return {'success': True}
+
+    client = app.test_client()
+    client.get('/login/1')
+    codes = [client.post('/act').status_code for _ in range(3)]
+    response = client.post('/act')
+
+    if codes != [200, 200, 429] or len(calls) != 2:
+        print(f"❌ Unexpected codes {codes}, view ran {len(calls)} times")
+        return False
+    if response.headers.get('Retry-After') != '60' or response.get_json()['success'] is not False:
+        print(f"❌ Bad 429 response: {response.headers}")
+        return False
+
+    other = app.test_client()
+    other.get('/login/2')
+    if other.post('/act').status_code != 200:
+        print("❌ Another user should have their own limit")
+        return False
+
+    stats = limiter.get_stats()
+    if stats['act'] != {'allowed': 3, 'limited': 2}:
+        print(f"❌ Stats wrong: {stats}")
+        return False
+
+    print("✅ Over-limit calls rejected before the view runs")
+    return True
+
+def test_reused_user_id_gets_fresh_window():
+    """Test a new account that inherits a deleted account's id does not inherit its window"""
+    print("Testing reused user ids...")
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    limiter = RateLimiter()
+
+    @app.route('/login/<int:user_id>/<int:created>')
+    def login(user_id, created):
+        session['_user_id'] = str(user_id)
+        limiter.remember_account(SimpleNamespace(id=user_id, created_at=datetime.fromtimestamp(created)))
+        return 'ok'
+
+    @app.route('/act', methods=['POST'])
+    @limiter.limit(1, per=60)
+    def act():
+        return {'success': True}
+
+    old_account, new_account = app.test_client(), app.test_client()
+    old_account.get('/login/7/1000000')
+    old_account.post('/act')
+    if old_account.post('/act').status_code != 429:
+        print("❌ First account should be limited")
+        return False
+    new_account.get('/login/7/2000000')
+    if new_account.post('/act').status_code != 200:
+        print("❌ Account reusing the id inherited the old window")
+        return False
+
+    limiter.reset()
+    if old_account.post('/act').status_code != 200 or limiter.get_stats()['tracked_windows'] != 1:
+        print("❌ reset() should drop every window")
+        return False
+
+    print("✅ Windows keyed per account, not per reusable id")
+    return True
+
+def test_rejection_cost():
+    """Benchmark: a rejected call costs microseconds"""
+    print("Benchmarking rejection cost...")
+    limiter = RateLimiter()
+    limiter.hit('cultivate', 'u:1', 1, 60)
+
+    rounds = 100000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        limiter.hit('cultivate', 'u:1', 1, 60)
+    per_call = (time.perf_counter() - started) / rounds * 1e6
+
+    print(f"   {per_call:.2f} µs per rejected call")
+    if per_call > 100:
+        print("❌ Rejection should be far cheaper than a request with a commit")
+        return False
+
+    print("✅ Rejections are cheap")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting rate limiter tests...")
+    print("=" * 50)
+
+    tests = [
+        test_sliding_window,
+        test_token_bucket,
+        test_decorator_rejects_before_view,
+        test_reused_user_id_gets_fresh_window,
+        test_rejection_cost
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Test script for the unified /api/sync endpoint and its change counters
+"""
+import sys
+import uuid
+from sqlalchemy import event, update
+from app import app, db
+from models import User, Guild, ChatMessage, Expedition, Achievement
+from sync import change_counters
+from rate_limit import rate_limiter
+
+SECTIONS = ('user', 'messages', 'guild', 'worlds', 'expeditions')
+
+def make_user(guild_id=None):
+    name = f"sync_{uuid.uuid4().hex[:8]}"
+    user = User(username=name, email=f"{name}@test.local", guild_id=guild_id)
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def make_guild(leader_id):
+    guild = Guild(name=f"Bang {uuid.uuid4().hex[:8]}", leader_id=leader_id)
+    db.session.add(guild)
+    db.session.commit()
+    db.session.get(User, leader_id).guild_id = guild.id
+    db.session.commit()
+    return guild.id
+
+def cleanup(user_ids, guild_id=None):
+    db.session.rollback()
+    ChatMessage.query.filter(ChatMessage.user_id.in_(user_ids)).delete()
+    Achievement.query.filter(Achievement.user_id.in_(user_ids)).delete()
+    User.query.filter(User.id.in_(user_ids)).update({'guild_id': None})
+    if guild_id:
+        Guild.query.filter_by(id=guild_id).delete()
+    User.query.filter(User.id.in_(user_ids)).delete()
+    db.session.commit()
+
+class Tab:
+    """One browser tab: holds the versions it has seen, like static/js/sync.js"""
+
+    def __init__(self, user_id):
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        # Id người chơi thử được cấp lại sau khi xóa: bắt đầu với cửa sổ giới hạn trống
+        rate_limiter.reset()
+        self.subscriptions = {name: {'params': {}, 'version': None} for name in SECTIONS}
+        self.subscriptions['messages']['params'] = {'channel': 'general'}
+
+    def sync(self):
+        # App context riêng như một request thật (g và db.session không dùng chung với test)
+        with app.app_context():
+            response = self.client.post('/api/sync', json={'sections': self.subscriptions})
+        sections = response.get_json()['sections']
+        for name, section in sections.items():
+            self.subscriptions[name]['version'] = section['version']
+        return sections
+
+def count_queries():
+    counter = {'n': 0}
+    def before_cursor_execute(*args):
+        counter['n'] += 1
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return counter, lambda: event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+def test_unchanged_sync_is_free():
+    """Test the first sync returns every section and a repeat sync returns nothing without SQL"""
+    print("Testing unchanged sync...")
+    with app.app_context():
+        user_id = make_user()
+        try:
+            tab = Tab(user_id)
+            first = tab.sync()
+            if set(first) != set(SECTIONS) or first['guild'] != {'version': 'none', 'data': None}:
+                print(f"❌ First sync should return every section: {first}")
+                return False
+
+            tab.sync()  # load_user đã có principal trong cache
+            counter, stop = count_queries()
+            try:
+                second = tab.sync()
+            finally:
+                stop()
+            if second or counter['n'] != 0:
+                print(f"❌ Unchanged sync returned {list(second)} with {counter['n']} queries")
+                return False
+        finally:
+            cleanup([user_id])
+
+    print("✅ Unchanged sections cost no database queries")
+    return True
+
+def test_changes_reach_only_their_section():
+    """Test commits bump exactly the counters of the sections they affect"""
+    print("Testing change counters...")
+    with app.app_context():
+        leader_id = make_user()
+        guild_id = make_guild(leader_id)
+        member_id = make_user(guild_id)
+        try:
+            tab = Tab(leader_id)
+            tab.sync()
+
+            db.session.add(ChatMessage(user_id=member_id, content='Xin chào đạo hữu', channel='general'))
+            db.session.commit()
+            changed = tab.sync()
+            if list(changed) != ['messages'] or changed['messages']['data'][0]['content'] != 'Xin chào đạo hữu':
+                print(f"❌ New message should only change 'messages': {list(changed)}")
+                return False
+
+            db.session.get(User, member_id).dao_name = 'Thanh Vân Tử'
+            db.session.commit()
+            changed = tab.sync()
+            names = [member['dao_name'] for member in changed.get('guild', {}).get('data', {}).get('members', [])]
+            if list(changed) != ['guild'] or 'Thanh Vân Tử' not in names:
+                print(f"❌ Member rename should only change 'guild': {list(changed)}")
+                return False
+
+            db.session.get(User, member_id).spiritual_power = 999
+            db.session.commit()
+            db.session.get(User, leader_id).spiritual_power = 555
+            db.session.rollback()
+            if tab.sync():
+                print("❌ Fields the guild does not show, and rolled back changes, should not bump anything")
+                return False
+
+            db.session.get(User, leader_id).spiritual_stones = 4321
+            db.session.commit()
+            changed = tab.sync()
+            if list(changed) != ['user'] or changed['user']['data']['spiritual_stones'] != 4321:
+                print(f"❌ Own resources should change 'user': {changed}")
+                return False
+        finally:
+            cleanup([leader_id, member_id], guild_id)
+
+    print("✅ Each commit reaches only the sections it affects")
+    return True
+
+def test_bulk_update_bumps_generation():
+    """Test an UPDATE statement (e.g. the expedition scheduler) invalidates the whole resource"""
+    print("Testing bulk updates...")
+    with app.app_context():
+        user_id = make_user()
+        try:
+            tab = Tab(user_id)
+            tab.sync()
+            before = change_counters.get_stats()['generation_bumps']
+            db.session.execute(update(Expedition).where(Expedition.id == -1).values(status='Hoàn Thành'))
+            db.session.commit()
+            changed = tab.sync()
+            if list(changed) != ['expeditions'] or change_counters.get_stats()['generation_bumps'] != before + 1:
+                print(f"❌ Bulk UPDATE should change 'expeditions': {list(changed)}")
+                return False
+
+            with app.app_context():
+                response = tab.client.post('/api/sync', json={'sections': 'user'})
+            if response.status_code != 400:
+                print(f"❌ Malformed request should be rejected, got {response.status_code}")
+                return False
+        finally:
+            cleanup([user_id])
+
+    print("✅ Bulk updates invalidate the resource type")
+    return True
+
+def test_concurrent_bumps_are_atomic():
+    """Test concurrent commits never collapse into one counter bump"""
+    print("Testing concurrent bumps...")
+    import threading
+    import time
+    from cachelib import SimpleCache
+
+    class SlowCache(SimpleCache):
+        """Widens the get -> set window so a non-atomic increment loses updates"""
+        def get(self, key):
+            value = super().get(key)
+            time.sleep(0.0005)
+            return value
+
+    key = ('messages', 'race', '')
+    cache_key = change_counters._counter_key(key)
+    shared_cache = change_counters.cache
+    change_counters.cache = SlowCache()
+    try:
+        change_counters.versions([key])
+        before = change_counters.cache.get(cache_key)
+
+        def bump_many():
+            for _ in range(50):
+                change_counters.bump(key)
+
+        threads = [threading.Thread(target=bump_many) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        after = change_counters.cache.get(cache_key)
+    finally:
+        change_counters.cache = shared_cache
+
+    if after - before != 400:
+        print(f"❌ Expected 400 bumps, counter moved by {after - before}")
+        return False
+
+    print("✅ 400 concurrent bumps all counted")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting client sync tests...")
+    print("=" * 50)
+
+    tests = [
+        test_unchanged_sync_is_free,
+        test_changes_reach_only_their_section,
+        test_bulk_update_bumps_generation,
+        test_concurrent_bumps_are_atomic
+    ]
+
+    passed = 0
+    for test in tests:
+        if test():
+            passed += 1
+        print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
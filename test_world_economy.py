@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Test script for time-based world production accrual
+"""
+import sys
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app import app, db
+from models import World, User
+from world_economy import WorldEconomy
+
+def make_world(**overrides):
+    """Create a transient World with explicit economic stats"""
+    values = dict(
+        name='Test World',
+        spiritual_stones_production=240,
+        daily_income=0,
+        time_flow_rate=1.0,
+        market_level=0,
+        resource_multiplication=False,
+        pending_yield=0.0,
+        created_at=datetime.utcnow()
+    )
+    values.update(overrides)
+    return World(**values)
+
+def test_accrual_rate():
+    """Test hourly rate derived from production and multipliers"""
+    print("Testing accrual rate...")
+    world = make_world()
+    if world.compute_accrual_rate() != 10.0:
+        print(f"❌ Base rate wrong: {world.compute_accrual_rate()}")
+        return False
+
+    world = make_world(resource_multiplication=True, time_flow_rate=2.0)
+    if world.compute_accrual_rate() != 40.0:
+        print(f"❌ Multiplied rate wrong: {world.compute_accrual_rate()}")
+        return False
+
+    print("✅ Accrual rate computed correctly")
+    return True
+
+def test_pending_yield_and_settle():
+    """Test lazy pending computation, settlement and offline cap"""
+    print("Testing pending yield and settlement...")
+    now = datetime.utcnow()
+    world = make_world(last_settled_at=now - timedelta(hours=5))
+    world.refresh_accrual_rate()
+
+    if abs(world.get_pending_yield(now) - 50.0) > 1e-6:
+        print(f"❌ Pending yield wrong: {world.get_pending_yield(now)}")
+        return False
+
+    world.settle(now)
+    if world.last_settled_at != now or abs(world.get_pending_yield(now) - 50.0) > 1e-6:
+        print("❌ Settlement lost accrued yield")
+        return False
+
+    world = make_world(last_settled_at=now - timedelta(days=30))
+    world.refresh_accrual_rate()
+    if world.get_pending_yield(now) != 10.0 * World.MAX_ACCRUAL_HOURS:
+        print(f"❌ Offline cap not applied: {world.get_pending_yield(now)}")
+        return False
+
+    print("✅ Pending yield settles and caps correctly")
+    return True
+
+def test_harvest_cooldown():
+    """Test harvest cooldown window"""
+    print("Testing harvest cooldown...")
+    now = datetime.utcnow()
+    world = make_world(last_harvested=now - timedelta(seconds=60))
+    remaining = world.harvest_cooldown_remaining(now)
+    if remaining != World.HARVEST_COOLDOWN_SECONDS - 60:
+        print(f"❌ Cooldown wrong: {remaining}")
+        return False
+
+    if make_world().harvest_cooldown_remaining(now) != 0:
+        print("❌ Fresh world should have no cooldown")
+        return False
+
+    print("✅ Harvest cooldown works")
+    return True
+
+def make_owned_world(stones=1000):
+    """Persist a user and a world they own, last settled 10 hours ago at 10 stones/hour"""
+    name = f"economy_{uuid.uuid4().hex[:8]}"
+    user = User(username=name, email=f"{name}@test.local", spiritual_stones=stones)
+    user.set_password('secret')
+    db.session.add(user)
+    db.session.commit()
+    world = make_world(name=f"Giới {name}", owner_id=user.id, accrual_rate=10.0,
+                       last_settled_at=datetime.utcnow() - timedelta(hours=10))
+    db.session.add(world)
+    db.session.commit()
+    return user.id, world.id
+
+def harvest_elsewhere(user_id, world_id, amount):
+    """Another request's harvest committing on its own connection"""
+    now = datetime.utcnow()
+    with db.engine.begin() as conn:
+        conn.execute(update(World).where(World.id == world_id).values(
+            last_harvested=now, last_settled_at=now, pending_yield=0.0))
+        conn.execute(update(User).where(User.id == user_id).values(
+            spiritual_stones=User.spiritual_stones + amount))
+    return now
+
+def delete_owned_world(user_id, world_id):
+    db.session.rollback()
+    World.query.filter_by(id=world_id).delete()
+    User.query.filter_by(id=user_id).delete()
+    db.session.commit()
+
+def test_concurrent_harvest_pays_once():
+    """Test a harvest racing another one on the same world is refused, so the yield is paid once"""
+    print("Testing concurrent harvest...")
+    original = World.get_pending_yield
+    with app.app_context():
+        user_id, world_id = make_owned_world()
+        try:
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+
+            calls = []
+            def racing_pending_yield(self, now=None):
+                # Lượt click kia thu hoạch xong ngay sau khi lượt này đã qua kiểm tra hồi chiêu
+                pending = original(self, now)
+                if not calls:
+                    calls.append(harvest_elsewhere(user_id, world_id, int(pending)))
+                return pending
+
+            World.get_pending_yield = racing_pending_yield
+            with app.app_context():
+                response = client.post(f'/api/harvest-world/{world_id}').get_json()
+            World.get_pending_yield = original
+
+            db.session.expire_all()
+            stones = db.session.get(User, user_id).spiritual_stones
+            if response['success'] or stones != 1100:
+                print(f"❌ Harvest paid twice: {response} stones={stones}")
+                return False
+
+            with app.app_context():
+                again = client.post(f'/api/harvest-world/{world_id}').get_json()
+            if again['success']:
+                print(f"❌ Cooldown should still apply: {again}")
+                return False
+
+            world = db.session.get(World, world_id)
+            world.last_harvested = datetime.utcnow() - timedelta(seconds=World.HARVEST_COOLDOWN_SECONDS + 60)
+            world.last_settled_at = datetime.utcnow() - timedelta(hours=2)
+            db.session.commit()
+            with app.app_context():
+                later = client.post(f'/api/harvest-world/{world_id}').get_json()
+            db.session.expire_all()
+            stones = db.session.get(User, user_id).spiritual_stones
+            if not later['success'] or stones != 1100 + later['resources']['spiritual_stones'] or stones < 1119:
+                print(f"❌ Harvest after the cooldown should pay: {later} stones={stones}")
+                return False
+        finally:
+            World.get_pending_yield = original
+            delete_owned_world(user_id, world_id)
+
+    print("✅ Racing harvest refused, yield paid once")
+    return True
+
+def test_dormant_settlement_skips_harvested_worlds():
+    """Test the nightly settlement does not write back yield that was harvested after it read the row"""
+    print("Testing dormant settlement guard...")
+    original = World.get_pending_yield
+    with app.app_context():
+        user_id, world_id = make_owned_world()
+        db.session.get(World, world_id).last_settled_at = datetime.utcnow() - timedelta(hours=48)
+        db.session.commit()
+        try:
+            harvested_at = []
+            def racing_pending_yield(self, now=None):
+                if self.id == world_id and not harvested_at:
+                    harvested_at.append(harvest_elsewhere(user_id, world_id, 480))
+                return original(self, now)
+
+            World.get_pending_yield = racing_pending_yield
+            WorldEconomy.settle_dormant_worlds(db)
+            World.get_pending_yield = original
+
+            db.session.expire_all()
+            world = db.session.get(World, world_id)
+            if world.pending_yield != 0.0 or world.last_settled_at != harvested_at[0]:
+                print(f"❌ Harvested yield written back as pending: {world.pending_yield}")
+                return False
+        finally:
+            World.get_pending_yield = original
+            delete_owned_world(user_id, world_id)
+
+    print("✅ Settlement skipped the freshly harvested world")
+    return True
+
+def main():
+    """Run all tests"""
+    print("🚀 Starting world economy tests...")
+    print("=" * 50)
+
+    tests = [
+        test_accrual_rate,
+        test_pending_yield_and_settle,
+        test_harvest_cooldown,
+        test_concurrent_harvest_pays_once,
+        test_dormant_settlement_skips_harvested_worlds
+    ]
+
+    passed = 0
+    with app.app_context():
+        for test in tests:
+            if test():
+                passed += 1
+            print("-" * 30)
+
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,141 @@
+"""
+World conquest contention control
+
+Hai người chơi có thể cùng "thắng" một thế giới nếu kiểm tra owner_id và gán
+owner_id ở hai bước riêng. Module này gom các lượt chinh phục theo từng thế giới
+vào một hàng đợi ngắn trong worker, và chốt quyền sở hữu bằng:
+
+- PostgreSQL: SELECT ... FOR UPDATE SKIP LOCKED (worker khác đang giữ hàng thì bỏ qua)
+- SQLite / khác: UPDATE có điều kiện ... WHERE owner_id IS NULL (rowcount quyết định người thắng)
+
+Chỉ các lượt cùng nhắm vào một thế giới mới phải chờ nhau; mọi request khác không bị ảnh hưởng.
+Chi phí được kiểm tra lại và trừ sau khi đã chốt quyền sở hữu, trên hàng User vừa đọc lại
+(khóa hàng trên PostgreSQL; trên SQLite giao dịch đã giữ khóa ghi) nên số dư không thể âm.
+
+Cờ is_contested chỉ là gợi ý hiển thị: hàng đợi nằm trong từng worker nên nó chỉ đếm các
+lượt cùng chờ trong một process, không thấy lượt đến từ worker khác.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import update
+
+logger = logging.getLogger(__name__)
+
+
+class ConquestSlot:
+    """Result of entering a world's attempt queue (contended counts waiters in this worker only)"""
+    __slots__ = ('acquired', 'contended')
+
+    def __init__(self, acquired, contended):
+        self.acquired = acquired
+        self.contended = contended
+
+
+class ConquestQueue:
+    """Short per-world attempt queue, local to one worker process"""
+
+    def __init__(self, max_waiters=3, wait_timeout=2.0):
+        self.max_waiters = max_waiters
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._entries = {}  # world_id -> {'lock': Lock, 'count': int}
+
+    @contextmanager
+    def slot(self, world_id):
+        """Wait for this world's turn; yields a ConquestSlot (acquired=False if full or timed out)"""
+        with self._lock:
+            entry = self._entries.setdefault(world_id, {'lock': threading.Lock(), 'count': 0})
+            if entry['count'] > self.max_waiters:
+                full = True
+            else:
+                full = False
+                entry['count'] += 1
+            contended = entry['count'] > 1
+
+        if full:
+            yield ConquestSlot(False, True)
+            return
+
+        acquired = entry['lock'].acquire(timeout=self.wait_timeout)
+        try:
+            yield ConquestSlot(acquired, contended)
+        finally:
+            if acquired:
+                entry['lock'].release()
+            with self._lock:
+                entry['count'] -= 1
+                if entry['count'] == 0:
+                    self._entries.pop(world_id, None)
+
+    def pending(self, world_id):
+        """Number of in-flight attempts for a world in this worker"""
+        with self._lock:
+            entry = self._entries.get(world_id)
+            return entry['count'] if entry else 0
+
+
+class ConquestManager:
+    """Race-free ownership claims for unowned worlds"""
+
+    @staticmethod
+    def mark_contested(db, world_id):
+        """Flag an unowned world as contested while several attempts are in flight"""
+        from models import World
+
+        result = db.session.execute(
+            update(World)
+            .where(World.id == world_id, World.owner_id.is_(None), World.is_contested.isnot(True))
+            .values(is_contested=True)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount:
+            logger.info("World %s became contested", world_id)
+
+    @staticmethod
+    def claim_world(db, world_id, user_id, now=None):
+        """Atomically take ownership of an unowned world; returns the locked World or None if lost"""
+        from models import World
+
+        now = now or datetime.utcnow()
+
+        if db.engine.dialect.name == 'postgresql':
+            world = World.query.filter(
+                World.id == world_id,
+                World.owner_id.is_(None)
+            ).with_for_update(skip_locked=True).first()
+            if world is None:
+                return None
+            was_contested = world.is_contested
+            world.owner_id = user_id
+            world.is_contested = False
+            world.last_attacked = now
+        else:
+            was_contested = db.session.query(World.is_contested).filter(World.id == world_id).scalar()
+            result = db.session.execute(
+                update(World)
+                .where(World.id == world_id, World.owner_id.is_(None))
+                .values(owner_id=user_id, is_contested=False, last_attacked=now)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                return None
+            world = db.session.get(World, world_id)
+            db.session.refresh(world)
+
+        if was_contested:
+            logger.info("World %s contest resolved in favour of user %s", world_id, user_id)
+        return world
+
+    @staticmethod
+    def lock_user(db, user_id):
+        """Reload the conqueror's row with current balances, row-locked where supported; call after claim_world"""
+        from models import User
+
+        return db.session.get(User, user_id, with_for_update=True, populate_existing=True)
+
+
+# Global queue instance
+conquest_queue = ConquestQueue()
@@ -0,0 +1,82 @@
+"""
+World production accrual utilities
+
+Sản lượng thế giới được tính theo thời gian: mỗi thế giới lưu accrual_rate và
+last_settled_at, sản lượng chờ được tính khi đọc và chốt khi ghi. Script này chạy
+hàng đêm (cron / Render cron job) để chốt sản lượng cho các thế giới lâu không
+được thu hoạch, tránh để khoảng thời gian chưa chốt kéo dài vô hạn.
+
+    python world_economy.py
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, or_, update
+
+
+class WorldEconomy:
+    """Batch settlement for offline world production"""
+
+    DEFAULT_CHUNK_SIZE = 500
+    DEFAULT_DORMANT_HOURS = 24
+
+    @staticmethod
+    def settle_dormant_worlds(db, chunk_size=DEFAULT_CHUNK_SIZE, dormant_hours=DEFAULT_DORMANT_HOURS, now=None):
+        """Settle every owned world not settled within `dormant_hours`, in chunked bulk UPDATEs
+
+        Mỗi hàng chỉ được ghi nếu last_settled_at vẫn là giá trị đã đọc: một lần thu hoạch commit
+        giữa SELECT và UPDATE làm hàng đó bị bỏ qua (nó vừa được chốt), thay vì ghi đè phần đã thu
+        trở lại pending_yield. Trả về số thế giới thực sự được chốt.
+        """
+        from models import World
+
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(hours=dormant_hours)
+        settled = 0
+        last_id = 0
+        statement = (
+            update(World.__table__)
+            .where(World.__table__.c.id == bindparam('b_id'),
+                   World.__table__.c.last_settled_at.is_not_distinct_from(bindparam('b_old_settled')))
+            .values(accrual_rate=bindparam('b_rate'), pending_yield=bindparam('b_pending'),
+                    last_settled_at=bindparam('b_settled'))
+        )
+
+        while True:
+            # Keyset pagination so each chunk is an indexed range scan
+            worlds = World.query.filter(
+                World.id > last_id,
+                World.owner_id.isnot(None),
+                or_(World.last_settled_at.is_(None), World.last_settled_at < cutoff)
+            ).order_by(World.id).limit(chunk_size).all()
+
+            if not worlds:
+                break
+
+            params = []
+            for world in worlds:
+                rate = world.accrual_rate if world.accrual_rate is not None else world.compute_accrual_rate()
+                params.append({
+                    'b_id': world.id,
+                    'b_old_settled': world.last_settled_at,
+                    'b_rate': rate,
+                    'b_pending': world.get_pending_yield(now),
+                    'b_settled': now
+                })
+
+            # executemany của một UPDATE có điều kiện (giống bulk_update_mappings nhưng kèm điều kiện)
+            result = db.session.connection().execute(statement, params)
+            db.session.commit()
+            # Drop the loaded chunk so memory stays flat over large tables
+            db.session.expunge_all()
+
+            settled += result.rowcount
+            last_id = params[-1]['b_id']
+
+        return settled
+
+
+if __name__ == "__main__":
+    from app import app, db
+
+    with app.app_context():
+        count = WorldEconomy.settle_dormant_worlds(db)
+        print(f"Settled {count} dormant worlds")